@@ -1,18 +1,16 @@
 from radarchart import starchart
-from artists_categorize import bulk_categorize_artists, sync_artists_to_supabase
-import csv
+from audio_dna import ingest_with_audio_dna, refine_provisional_artists
 import os
+import uuid
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import Client
+from db_client import get_client, is_missing_column_error
 from compare import run_matching_engine
 
 load_dotenv()
 
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_KEY")
-
 # Global Supabase Client
-supabase: Client = create_client(url, key)
+supabase: Client = get_client()
 resolved_user_id = None
 
 
@@ -38,42 +36,13 @@ def add_playlist(user_id):
     filter_input = input("🔍 Filter for electronic artists only? (y/n, default: n): ").strip().lower()
     filter_choice = filter_input == 'y' # Default to False unless 'y' is explicitly entered
 
-    electronic_artists = {}
-    artist_requests = []
     try:
-        with open(target_csv_file, mode='r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                raw_artists = row.get("Artist Name(s)", "")
-                csv_genres_raw = row.get("Genres", "")
-                track_artists = [a.strip() for a in raw_artists.split(';') if a.strip()]
-                
-                csv_genres_list = []
-                if csv_genres_raw:
-                    csv_genres_list = [g.strip().lower().replace(" ", "-") for g in csv_genres_raw.split(',') if g.strip()]
-                
-                for artist_name in track_artists:
-                    # Normalize for tracking to avoid duplicates with different casing
-                    norm_name = artist_name.lower().strip()
-                    if norm_name in electronic_artists:
-                        electronic_artists[norm_name]["count"] += 1
-                        continue
-                    
-                    electronic_artists[norm_name] = {"original_name": artist_name, "count": 1}
-                    artist_requests.append((artist_name, csv_genres_list, filter_choice))
-
-        if artist_requests:
-            print(f"🧵 Fetching genres for {len(artist_requests)} unique artists concurrently...")
-            bulk_results = bulk_categorize_artists(artist_requests, supabase)
-            
-            final_artists = {}
-            for name, categorized in bulk_results.items():
-                norm_name = name.lower().strip()
-                if norm_name in electronic_artists:
-                    categorized["count"] = electronic_artists[norm_name]["count"]
-                    final_artists[name] = categorized
-
-            sync_artists_to_supabase(final_artists, supabase, user_id=user_id)
+        # Streams the export: known artists resolve chunk by chunk while the rest of the file
+        # is read. Artists new to us get a provisional DNA from the export's audio features,
+        # so the profile is usable as soon as this returns; Last.fm tags refine it in the background
+        refine = ingest_with_audio_dna(target_csv_file, supabase, user_id=user_id, filter_electronic=filter_choice)
+        if refine:
+            print("🎧 Refining new artists with Last.fm tags in the background...")
     except Exception as e:
         print(f"❌ Critical Error during sync: {e}")
 
@@ -81,7 +50,13 @@ def reset_user_taste(user_id):
     answer = input("Are you sure you want to reset your taste? (y/n): ").strip().lower()
     if answer == "y":
         supabase.table("user_lib").delete().eq("user_id", user_id).execute()
-        supabase.table("users").update({"sonic_dna": None}).eq("id", user_id).execute()
+        try:
+            # A new dna_version makes any in-flight compare-and-set DNA write lose to the reset
+            supabase.table("users").update({"sonic_dna": None, "dna_aggregate": None, "dna_version": uuid.uuid4().hex}).eq("id", user_id).execute()
+        except Exception as e:
+            if not is_missing_column_error(e):
+                raise
+            supabase.table("users").update({"sonic_dna": None}).eq("id", user_id).execute()
         print(f"🧹 Taste reset for user {user_id}")
     else:
         print("❌ Taste not reset")
@@ -158,6 +133,12 @@ def recalculate_system_dna(user_id):
     
     confirm = input("\nProceed? (y/n): ").strip().lower()
     if confirm == 'y':
+        # 0. Retry Last.fm for artists still on provisional audio DNA
+        try:
+            refine_provisional_artists(supabase)
+        except Exception as e:
+            if not is_missing_column_error(e):
+                raise
         # 1. Update all artists in the 'artists' table
         VibeClassifier.recalculate_all_artist_dna()
         # 2. Update the current user's aggregate DNA based on those new artist values
@@ -0,0 +1,459 @@
+import os
+import json
+import shutil
+import threading
+import numpy as np
+from scipy import sparse
+from supabase import Client
+from db_client import get_client, is_missing_column_error
+from classifier import GenreManager, CATEGORIES, snapshot_source
+
+ARTIST_STORE_DIR = os.environ.get("ARTIST_STORE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "artist_store")
+ARTIST_STORE_PAGE_SIZE = int(os.environ.get("ARTIST_STORE_PAGE_SIZE", 1000))
+ARTIST_STORE_BATCH = 500
+
+STATE_SELECT = "id, content_hash, sonic_dna"
+VOTES_SELECT = "id, artist_genres(genre_id, vote_count)"
+
+# Never counted as subgenres, matching VibeClassifier.subgenre_shares
+GENERIC_SUBGENRES = {"electronic", "rave"}
+
+ARRAYS = ("artist_ids", "hashes", "dna", "has_dna", "votes_data", "votes_indices", "votes_indptr", "genre_ids")
+
+
+def _dna_row(dna):
+    """(7 floats, has_dna) for a stored sonic_dna value; only complete 7-axis dicts count."""
+    if dna and isinstance(dna, dict) and all(cat in dna for cat in CATEGORIES):
+        return [float(dna.get(cat, 0.0) or 0.0) for cat in CATEGORIES], True
+    return [0.0] * len(CATEGORIES), False
+
+
+def _writer_alive(directory_name):
+    """Whether the process that wrote a v{version}-{pid} directory is still running."""
+    try:
+        pid = int(directory_name.rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class ArtistDNAStore:
+    """
+    Columnar copy of every artist's DNA and genre votes, for aggregation without joins:
+      - artist id -> row index
+      - dna:   N x 7 float32, plus a has_dna flag per row
+      - votes: N x G CSR of artist_genres vote counts over the store's genre-id vocabulary
+    Persisted as .npy files that are memory-mapped on load. Each save goes to a new
+    version directory and CURRENT is swapped to point at it, so a reader never sees a
+    half-written store. refresh() only re-reads the vote joins of artists whose
+    content_hash changed, but each save still rewrites the whole store (see _save).
+
+    DNA is kept as float32 for size; sums run in float64, but a mean that lands exactly
+    on a rounding tie can come out 0.01 away from calculate_dna on the JSON values.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, supabase_client=None):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls(supabase_client)
+        return cls._instance
+
+    def __init__(self, supabase_client=None, path=None):
+        if supabase_client is None:
+            supabase_client = get_client()
+        self.supabase: Client = supabase_client
+        self.path = path or ARTIST_STORE_DIR
+        self.source = snapshot_source()
+        self._write_lock = threading.Lock()   # one refresh at a time
+        self._state_lock = threading.RLock()  # readers see all arrays from the same version
+        self._shares_cache = None
+        self._written = set()                 # version directories this store saved
+        if not self._load():
+            self._set_arrays(
+                artist_ids=np.empty(0, dtype=str), hashes=np.empty(0, dtype=str),
+                dna=np.zeros((0, len(CATEGORIES)), dtype=np.float32), has_dna=np.zeros(0, dtype=bool),
+                votes=sparse.csr_matrix((0, 0), dtype=np.int32), genre_ids=np.empty(0, dtype=str), version=0,
+            )
+
+    def __len__(self):
+        return len(self.artist_ids)
+
+    # --- persistence ---
+
+    def _set_arrays(self, artist_ids, hashes, dna, has_dna, votes, genre_ids, version):
+        index = {artist_id: row for row, artist_id in enumerate(artist_ids.tolist())}
+        genre_index = {genre_id: col for col, genre_id in enumerate(genre_ids.tolist())}
+        with self._state_lock:
+            self.artist_ids = artist_ids
+            self.hashes = hashes
+            self.dna = dna
+            self.has_dna = has_dna
+            self.votes = votes
+            self.genre_ids = genre_ids
+            self.version = version
+            self.index = index
+            self.genre_index = genre_index
+            self._shares_cache = None
+
+    def _load(self):
+        if self.source is None:
+            return False
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as f:
+                current = f.read().strip()
+            directory = os.path.join(self.path, current)
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+            if meta.get("source") != self.source:
+                return False
+            arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r", allow_pickle=False) for name in ARRAYS}
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"⚠️ Ignoring unreadable artist store in {self.path}: {e}")
+            return False
+
+        votes = sparse.csr_matrix(
+            (arrays["votes_data"], arrays["votes_indices"], arrays["votes_indptr"]),
+            shape=(len(arrays["artist_ids"]), len(arrays["genre_ids"])),
+        )
+        self._set_arrays(arrays["artist_ids"], arrays["hashes"], arrays["dna"], arrays["has_dna"], votes, arrays["genre_ids"], meta["version"])
+        return True
+
+    def _save(self):
+        """
+        Writes the current arrays as a new version directory and points CURRENT at it.
+        Not incremental: every save is a full snapshot (about 40 bytes per artist plus
+        the votes), which is why _refresh only saves when some row actually changed.
+        """
+        if self.source is None:
+            return
+        name = f"v{self.version}-{os.getpid()}"
+        directory = os.path.join(self.path, name)
+        os.makedirs(directory, exist_ok=True)
+        self._written.add(name)
+        arrays = {
+            "artist_ids": self.artist_ids, "hashes": self.hashes, "dna": self.dna, "has_dna": self.has_dna,
+            "votes_data": self.votes.data, "votes_indices": self.votes.indices, "votes_indptr": self.votes.indptr,
+            "genre_ids": self.genre_ids,
+        }
+        for array_name, array in arrays.items():
+            np.save(os.path.join(directory, f"{array_name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"version": self.version, "source": self.source, "artists": len(self.artist_ids)}, f)
+
+        tmp_path = os.path.join(self.path, f"CURRENT.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(name)
+        os.replace(tmp_path, os.path.join(self.path, "CURRENT"))
+        self._collect_garbage()
+
+    def _collect_garbage(self):
+        """
+        Drops version directories nobody can be writing: ones this store wrote itself and
+        left behind, and ones whose writer process has exited. A directory another live
+        process wrote is left alone, since it may still be mid-save. Open memory maps keep
+        their (unlinked) files alive.
+        """
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as f:
+                current = f.read().strip()
+        except OSError:
+            return
+        for entry in os.listdir(self.path):
+            if entry == current or not entry.startswith("v") or not os.path.isdir(os.path.join(self.path, entry)):
+                continue
+            if entry in self._written:
+                self._written.discard(entry)
+            elif _writer_alive(entry):
+                continue
+            shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+    # --- refresh ---
+
+    def _fetch_states(self, values=None, column="id"):
+        """
+        str(id) -> (content_hash, sonic_dna, id, name_slug) for artists whose `column` is in
+        `values`, or for every artist (paged by id) when values is None.
+        """
+        columns = f"{STATE_SELECT}, name_slug"
+        states = {}
+
+        def run(build):
+            nonlocal columns
+            try:
+                return build(columns).execute().data or []
+            except Exception as e:
+                if not is_missing_column_error(e):
+                    raise
+                # No content_hash column yet: every artist's votes get re-read
+                columns = "id, sonic_dna, name_slug"
+                return build(columns).execute().data or []
+
+        def add(rows):
+            for row in rows:
+                states[str(row["id"])] = (row.get("content_hash") or "", row.get("sonic_dna"), row["id"], row.get("name_slug"))
+
+        if values is not None:
+            values = list(dict.fromkeys(values))
+            for i in range(0, len(values), ARTIST_STORE_BATCH):
+                batch = values[i:i+ARTIST_STORE_BATCH]
+                add(run(lambda cols: self.supabase.table("artists").select(cols).in_(column, batch)))
+            return states
+
+        last_id = None
+        while True:
+            def page_query(cols):
+                query = self.supabase.table("artists").select(cols).order("id").limit(ARTIST_STORE_PAGE_SIZE)
+                return query.gt("id", last_id) if last_id is not None else query
+            page = run(page_query)
+            add(page)
+            if len(page) < ARTIST_STORE_PAGE_SIZE:
+                return states
+            last_id = page[-1]["id"]
+
+    def _fetch_votes(self, ids):
+        """id -> {genre id: vote count} from artist_genres, batched."""
+        votes = {}
+        for i in range(0, len(ids), ARTIST_STORE_BATCH):
+            batch = ids[i:i+ARTIST_STORE_BATCH]
+            res = self.supabase.table("artists").select(VOTES_SELECT).in_("id", batch).execute()
+            for row in res.data or []:
+                votes[str(row["id"])] = {
+                    str(ag["genre_id"]): ag.get("vote_count", 5)
+                    for ag in row.get("artist_genres") or [] if ag.get("genre_id") is not None
+                }
+        return votes
+
+    def refresh(self, ids=None):
+        """
+        Brings the store up to date for `ids` (or every artist when None). DNA comes from a
+        light id/content_hash/sonic_dna read; the artist_genres join is only fetched for
+        artists that are new or whose content_hash changed. A full refresh also clears
+        artists that no longer exist. Returns the number of rows that changed.
+        """
+        with self._write_lock:
+            return self._refresh(self._fetch_states(ids), full=ids is None)
+
+    def refresh_slugs(self, slugs):
+        """refresh() for artists by name_slug. Returns {slug: id} for the slugs that exist."""
+        with self._write_lock:
+            states = self._fetch_states(slugs, column="name_slug")
+            self._refresh(states, full=False)
+        return {name_slug: artist_id for _, _, artist_id, name_slug in states.values()}
+
+    def _row_votes(self, row):
+        """{genre id: vote count} currently stored for one row."""
+        start, end = self.votes.indptr[row], self.votes.indptr[row + 1]
+        return {str(self.genre_ids[col]): int(count) for col, count in zip(self.votes.indices[start:end], self.votes.data[start:end])}
+
+    def _refresh(self, states, full):
+        known = self.index
+        dna_changed = {}
+        needs_votes = []
+        for artist_id, (content_hash, sonic_dna, _, _) in states.items():
+            row = known.get(artist_id)
+            dna_values, has_dna = _dna_row(sonic_dna)
+            dna_dirty = row is None or bool(self.has_dna[row]) != has_dna or (has_dna and not np.allclose(self.dna[row], dna_values))
+            if dna_dirty:
+                dna_changed[artist_id] = (dna_values, has_dna)
+            # Without a hash (no column yet, or a row last synced before hashing) the DNA is
+            # the only change signal: every sync that rewrites votes recomputes it
+            if row is None or (content_hash and self.hashes[row] != content_hash) or (not content_hash and dna_dirty):
+                needs_votes.append(artist_id)
+        removed = [artist_id for artist_id in known if artist_id not in states] if full else []
+        removed = [artist_id for artist_id in removed if self.has_dna[known[artist_id]] or self.votes.indptr[known[artist_id] + 1] > self.votes.indptr[known[artist_id]]]
+
+        if not needs_votes and not dna_changed and not removed:
+            return 0
+        new_votes = self._fetch_votes([states[artist_id][2] for artist_id in needs_votes]) if needs_votes else {}
+        # Artists with no artist_genres rows still replace whatever votes they had
+        for artist_id in needs_votes:
+            new_votes.setdefault(artist_id, {})
+        # A new hash over the same votes only needs the hash recorded, not a new version
+        rehashed = {artist_id: states[artist_id][0] for artist_id in needs_votes}
+        for artist_id in needs_votes:
+            row = known.get(artist_id)
+            if row is not None and self._row_votes(row) == {genre_id: int(count) for genre_id, count in new_votes[artist_id].items()}:
+                del new_votes[artist_id]
+
+        if not new_votes and not dna_changed and not removed:
+            self._set_hashes(rehashed)
+            return 0
+        self._apply(states, dna_changed, new_votes, removed, rehashed)
+        try:
+            self._save()
+        except OSError as e:
+            # The in-memory store is already up to date; only the on-disk copy is stale
+            print(f"⚠️ Could not save artist store to {self.path}: {e}")
+        changed = len(set(dna_changed) | set(new_votes) | set(removed))
+        print(f"🗃️ Artist store: {changed} rows refreshed ({len(self.artist_ids)} artists, v{self.version}).")
+        return changed
+
+    def _set_hashes(self, rehashed):
+        """Records new content hashes for rows whose data didn't change (memory only)."""
+        if not rehashed:
+            return
+        hashes = np.asarray(self.hashes, dtype=object).copy()
+        for artist_id, content_hash in rehashed.items():
+            hashes[self.index[artist_id]] = content_hash
+        with self._state_lock:
+            self.hashes = hashes.astype(str)
+
+    def _apply(self, states, dna_changed, new_votes, removed, rehashed):
+        new_ids = [artist_id for artist_id in list(dna_changed) + list(new_votes) if artist_id not in self.index]
+        new_ids = list(dict.fromkeys(new_ids))
+        n_old = len(self.artist_ids)
+        n = n_old + len(new_ids)
+
+        artist_ids = np.concatenate([np.asarray(self.artist_ids), np.asarray(new_ids, dtype=str)]) if new_ids else np.array(self.artist_ids)
+        index = dict(self.index)
+        for offset, artist_id in enumerate(new_ids):
+            index[artist_id] = n_old + offset
+
+        hashes = np.concatenate([np.asarray(self.hashes, dtype=object), np.full(len(new_ids), "", dtype=object)])
+        for artist_id, content_hash in rehashed.items():
+            hashes[index[artist_id]] = content_hash
+        hashes = hashes.astype(str)
+
+        dna = np.zeros((n, len(CATEGORIES)), dtype=np.float32)
+        dna[:n_old] = self.dna
+        has_dna = np.zeros(n, dtype=bool)
+        has_dna[:n_old] = self.has_dna
+        for artist_id, (dna_values, flag) in dna_changed.items():
+            dna[index[artist_id]] = dna_values
+            has_dna[index[artist_id]] = flag
+
+        # Extend the genre vocabulary, then replace the changed rows of the vote matrix in one sparse sum
+        genre_ids = list(self.genre_ids.tolist())
+        genre_index = dict(self.genre_index)
+        rows, cols, vals = [], [], []
+        for artist_id, votes in new_votes.items():
+            for genre_id, count in votes.items():
+                col = genre_index.get(genre_id)
+                if col is None:
+                    col = len(genre_ids)
+                    genre_index[genre_id] = col
+                    genre_ids.append(genre_id)
+                rows.append(index[artist_id])
+                cols.append(col)
+                vals.append(count)
+        for artist_id in removed:
+            has_dna[index[artist_id]] = False
+
+        keep = np.ones(n, dtype=np.int32)
+        for artist_id in list(new_votes) + removed:
+            keep[index[artist_id]] = 0
+        old_votes = sparse.csr_matrix(self.votes, dtype=np.int32, copy=True)
+        old_votes.resize((n, len(genre_ids)))
+        replaced = sparse.csr_matrix((np.asarray(vals, dtype=np.int32), (rows, cols)), shape=(n, len(genre_ids)))
+        votes = (sparse.diags(keep, dtype=np.int32) @ old_votes + replaced).tocsr().astype(np.int32)
+        votes.eliminate_zeros()
+        votes.sort_indices()
+
+        self._set_arrays(artist_ids, hashes, dna, has_dna, votes, np.asarray(genre_ids, dtype=str), self.version + 1)
+
+    # --- aggregation ---
+
+    def rows_for(self, ids):
+        """Row index per artist id, -1 where the artist isn't in the store."""
+        get = self.index.get
+        return np.fromiter((get(str(artist_id), -1) for artist_id in ids), dtype=np.int64)
+
+    def _subgenre_shares(self):
+        """
+        N x C matrix over the current genre catalog: each artist's votes restricted to
+        electronic, non-generic genres and normalized to sum to 1 (subgenre_shares, batched).
+        """
+        manager = GenreManager.get_instance()
+        key = (manager.version, self.version)
+        if self._shares_cache is not None and self._shares_cache[0] == key:
+            return self._shares_cache[1], manager
+
+        catalog = {str(genre_id): idx for idx, genre_id in enumerate(manager.genre_ids) if genre_id is not None}
+        col_map = np.fromiter((catalog.get(genre_id, -1) for genre_id in self.genre_ids.tolist()), dtype=np.int64, count=len(self.genre_ids))
+        usable = col_map >= 0
+        usable[usable] = manager.electronic[col_map[usable]]
+        for slug in GENERIC_SUBGENRES:
+            idx = manager.slug_to_index.get(slug)
+            if idx is not None:
+                usable &= col_map != idx
+
+        coo = self.votes.tocoo()
+        mask = usable[coo.col]
+        shares = sparse.csr_matrix(
+            (coo.data[mask].astype(np.float64), (coo.row[mask], col_map[coo.col[mask]])),
+            shape=(len(self.artist_ids), len(manager.slugs)),
+        )
+        totals = np.asarray(shares.sum(axis=1)).ravel()
+        inverse = np.divide(1.0, totals, out=np.zeros_like(totals), where=totals > 0)
+        shares = (sparse.diags(inverse) @ shares).tocsr()
+        self._shares_cache = (key, shares)
+        return shares, manager
+
+    def aggregate_many(self, groups, require_positive=False):
+        """
+        Aggregates many artist groups at once. `groups` is a list of (artist ids, weights or
+        None for 1 each). Returns one dict per group:
+          sonic_dna         weighted mean DNA, like VibeClassifier.calculate_dna
+          dna_sum/dna_plays the running totals stored in users.dna_aggregate
+          subgenre_weights  unnormalized {slug: weight}, like accumulate_subgenre_weights
+        With require_positive, artists whose DNA is all zeros are left out of the DNA mean.
+        """
+        with self._state_lock:
+            return self._aggregate_many(groups, require_positive)
+
+    def _aggregate_many(self, groups, require_positive):
+        rows, cols, vals = [], [], []
+        for g, (ids, weights) in enumerate(groups):
+            idx = self.rows_for(ids)
+            w = np.ones(len(idx)) if weights is None else np.asarray(weights, dtype=np.float64)
+            found = idx >= 0
+            rows.append(np.full(int(found.sum()), g))
+            cols.append(idx[found])
+            vals.append(w[found])
+        n_groups = len(groups)
+        weight_matrix = sparse.csr_matrix(
+            (np.concatenate(vals) if vals else [], (np.concatenate(rows) if rows else [], np.concatenate(cols) if cols else [])),
+            shape=(n_groups, len(self.artist_ids)),
+        )
+
+        # Weighted gather-and-sum of DNA rows
+        dna_mask = np.asarray(self.has_dna, dtype=bool)
+        if require_positive:
+            dna_mask = dna_mask & (np.asarray(self.dna) > 0).any(axis=1)
+        dna_weights = weight_matrix @ sparse.diags(dna_mask.astype(np.float64))
+        totals = np.asarray(dna_weights.sum(axis=1)).ravel()
+        sums = np.asarray(dna_weights @ np.asarray(self.dna, dtype=np.float64))
+        means = np.divide(sums, totals[:, None], out=np.zeros_like(sums), where=totals[:, None] > 0)
+
+        shares, manager = self._subgenre_shares()
+        subgenre_sums = (weight_matrix @ shares).tocsr()
+
+        results = []
+        for g in range(n_groups):
+            start, end = subgenre_sums.indptr[g], subgenre_sums.indptr[g + 1]
+            results.append({
+                "sonic_dna": {cat: round(float(v), 2) for cat, v in zip(CATEGORIES, means[g])},
+                "dna_sum": {cat: float(v) for cat, v in zip(CATEGORIES, sums[g])},
+                "dna_plays": float(totals[g]),
+                "subgenre_weights": {
+                    manager.slugs[col]: float(val)
+                    for col, val in zip(subgenre_sums.indices[start:end], subgenre_sums.data[start:end]) if val > 0
+                },
+            })
+        return results
+
+    def aggregate(self, ids, weights=None, require_positive=False):
+        """Aggregate of one group of artists; see aggregate_many."""
+        return self.aggregate_many([(list(ids), weights)], require_positive)[0]
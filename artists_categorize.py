@@ -1,32 +1,104 @@
-import pylast
 import os
-import concurrent.futures
+import json
+import hashlib
+import asyncio
+import inspect
+import httpx
 from dotenv import load_dotenv
 from classifier import VibeClassifier, GenreManager
+from tag_cache import TagCache
+from rate_limiter import get_lastfm_limiter, is_throttle_error
+from lookup_batcher import get_lookup_batcher
+from db_client import is_missing_column_error
 
 load_dotenv()
 
 LASTFM_API_KEY = os.environ.get("LASTFM_API_KEY")
 LASTFM_API_SECRET = os.environ.get("LASTFM_API_SECRET")
 
-# Initialize the network
-network = pylast.LastFMNetwork(api_key=LASTFM_API_KEY, api_secret=LASTFM_API_SECRET)
+LASTFM_API_URL = "https://ws.audioscrobbler.com/2.0/"
+LASTFM_TIMEOUT = float(os.environ.get("LASTFM_TIMEOUT", 15))
+
+# Max concurrent Supabase requests per pipeline run
+DB_CONCURRENCY = int(os.environ.get("SUPABASE_CONCURRENCY", 8))
+
+# artists.dna_source: where an artist's DNA came from. "lastfm" and "csv" are final;
+# "audio" marks a provisional profile (audio features / CSV genres only) that is
+# re-fetched from Last.fm whenever the artist is categorized again, until tags arrive.
+PROVISIONAL_DNA_SOURCE = "audio"
 
 # Pre-initialize GenreManager to avoid thread-safety issues during bulk process
 GenreManager.get_instance()
 
-# Cache to prevent doing redundant Last.fm API calls
+# Cache to prevent doing redundant Last.fm API calls.
+# The dict is the per-process fast path; TagCache persists results across runs and processes.
 artist_genre_cache = {}
+tag_cache = TagCache.get_instance()
+lastfm_limiter = get_lastfm_limiter()
+
+def is_provisional(artist):
+    return bool(artist) and artist.get("dna_source") == PROVISIONAL_DNA_SOURCE
+
+def _has_dna(artist):
+    dna = artist.get("sonic_dna")
+    return bool(dna) and any(dna.values())
+
+def merge_refined_profile(refined, provisional, filter_electronic):
+    """
+    The Last.fm profile that replaces a provisional one, or None while Last.fm has no
+    tags for the artist (it then stays provisional). When the tags carry no DNA, the
+    provisional DNA is kept, as long as the artist isn't being filtered out.
+    """
+    if not refined or refined.get("dna_source") != "lastfm":
+        return None
+    if not _has_dna(refined) and _has_dna(provisional) and (refined["genre_votes"] or not filter_electronic):
+        refined["sonic_dna"] = provisional["sonic_dna"]
+    return refined
 
 def get_electronic_genres(genres):
     if not genres: return []
     manager = GenreManager.get_instance()
     return [genre for genre in genres if manager.is_electronic(genre)]
 
-import time
 import re
+from functools import lru_cache
 
 class ArtistCleaner:
+    # Common collaboration delimiters (A & B, A x B, A b2b B)
+    SPLIT_RE = re.compile(r'\s+&\s+|\s+x\s+|\s+b2b\s+|\s+X\s+|\s+B2B\s+')
+    PAREN_RE = re.compile(r'\((.*?)\)')
+    PAREN_STRIP_RE = re.compile(r'\s*\(.*?\)\s*')
+    # TBA/TBD in any case, or three or more question marks anywhere
+    TBA_RE = re.compile(r'TB[AD]|\?(?:.*?\?){2}', re.IGNORECASE | re.DOTALL)
+
+    @staticmethod
+    @lru_cache(maxsize=65536)
+    def clean_name(artist_name):
+        """
+        Classifies and splits one lineup entry. Returns (names, is_tba), where names is
+        the tuple of artists it contributes. Cached, since the same names recur across
+        every festival's lineup.
+        """
+        if ArtistCleaner.TBA_RE.search(artist_name):
+            return (), True
+
+        match = ArtistCleaner.PAREN_RE.search(artist_name)
+        if match:
+            # If inner contains split chars, keep only the inner artists (e.g. SUBJOHNICS (A & B))
+            parts = ArtistCleaner.SPLIT_RE.split(match.group(1))
+            if len(parts) > 1:
+                return tuple(p.strip() for p in parts if p.strip()), False
+            # If inner is just a tag (e.g. Goldie (UK)), strip it and split the remainder
+            base_name = ArtistCleaner.PAREN_STRIP_RE.sub('', artist_name).strip()
+            if not base_name:
+                return (), False
+            artist_name = base_name
+
+        parts = ArtistCleaner.SPLIT_RE.split(artist_name)
+        if len(parts) == 1:
+            return (artist_name.strip(),), False
+        return tuple(p.strip() for p in parts if p.strip()), False
+
     @staticmethod
     def clean_lineup(artists_list):
         """
@@ -38,59 +110,66 @@ class ArtistCleaner:
         """
         cleaned_artists = set()
         tba_flag = False
-        
-        # Regex for splitting common collaboration delimiters
-        split_pattern = r'\s+&\s+|\s+x\s+|\s+b2b\s+|\s+X\s+|\s+B2B\s+'
-        
+        clean_name = ArtistCleaner.clean_name
+
         for artist_name in artists_list:
             if not artist_name: continue
-            
-            upper_name = artist_name.upper()
-            
-            # 1. TBA/TBD Detection
-            if "TBA" in upper_name or "TBD" in upper_name or artist_name.count("?") >= 3:
+            names, is_tba = clean_name(artist_name)
+            if is_tba:
                 tba_flag = True
                 continue
-                
-            # 2. Parentheses Handling
-            match = re.search(r'\((.*?)\)', artist_name)
-            if match:
-                inner_content = match.group(1)
-                # If inner contains split chars, extract and split the inner part (e.g. SUBJOHNICS (A & B))
-                if re.search(split_pattern, inner_content):
-                    sub_artists = re.split(split_pattern, inner_content)
-                    for sa in sub_artists:
-                        if sa.strip(): cleaned_artists.add(sa.strip())
-                else:
-                    # If inner is just a tag (e.g. Goldie (UK)), strip it and try to split the remainder
-                    base_name = re.sub(r'\s*\(.*?\)\s*', '', artist_name).strip()
-                    if base_name:
-                        if re.search(split_pattern, base_name):
-                            sub_artists = re.split(split_pattern, base_name)
-                            for sa in sub_artists:
-                                if sa.strip(): cleaned_artists.add(sa.strip())
-                        else:
-                            cleaned_artists.add(base_name)
-            else:
-                # 3. Standard splitting (e.g. A & B)
-                if re.search(split_pattern, artist_name):
-                    sub_artists = re.split(split_pattern, artist_name)
-                    for sa in sub_artists:
-                        if sa.strip(): cleaned_artists.add(sa.strip())
-                else:
-                    cleaned_artists.add(artist_name.strip())
-                    
+            cleaned_artists.update(names)
+
         return list(cleaned_artists), tba_flag
 
-def get_artist_genres(artist_name):
+    @staticmethod
+    def clean_lineups(lineups):
+        """Batch form of clean_lineup: one (cleaned_list, tba_triggered) per lineup, sharing the name cache."""
+        return [ArtistCleaner.clean_lineup(artists_list) for artists_list in lineups]
+
+class LastFMError(Exception):
+    """Error payload returned by the Last.fm REST API ({"error": code, "message": ...})."""
+    def __init__(self, code, message):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+async def _fetch_top_tags(http, name_to_fetch):
+    params = {
+        "method": "artist.gettoptags",
+        "artist": name_to_fetch,
+        "api_key": LASTFM_API_KEY,
+        "format": "json"
+    }
+    resp = await http.get(LASTFM_API_URL, params=params)
+    try:
+        data = resp.json()
+    except ValueError:
+        resp.raise_for_status()
+        raise
+    # Last.fm reports errors in the JSON body, often alongside a 4xx status
+    if "error" in data:
+        raise LastFMError(data["error"], data.get("message", ""))
+    resp.raise_for_status()
+
+    tags = (data.get("toptags") or {}).get("tag") or []
+    if isinstance(tags, dict):
+        tags = [tags]
+    return [tag["name"].lower().replace(" ", "-") for tag in tags[:50] if tag.get("name")]
+
+async def get_artist_genres_async(artist_name, http=None):
     """Returns all genres for an artist from Last.fm, with heavy persistence for accuracy."""
     if artist_name in artist_genre_cache:
         return artist_genre_cache[artist_name]
-        
-    def fetch_genres(name_to_fetch):
-        artist = network.get_artist(name_to_fetch)
-        top_tags = artist.get_top_tags(limit=50)
-        return [tag.item.get_name().lower().replace(" ", "-") for tag in top_tags]
+
+    cached = await asyncio.to_thread(tag_cache.get, artist_name)
+    if cached is not None:
+        artist_genre_cache[artist_name] = cached
+        return cached
+
+    if http is None:
+        async with httpx.AsyncClient(timeout=LASTFM_TIMEOUT) as own_http:
+            return await get_artist_genres_async(artist_name, own_http)
 
     names_to_try = [artist_name]
     # Try an ascii-normalized name if different
@@ -100,60 +179,92 @@ def get_artist_genres(artist_name):
         names_to_try.append(normalized)
 
     retries = 5 # Reduced from 10 to not hang the scraper on actual connection errors
+    confirmed_missing = False
     for name_variant in names_to_try:
         for attempt in range(retries):
             try:
-                genres = fetch_genres(name_variant)
+                # Every Last.fm call shares one process-wide token bucket / concurrency window
+                async with lastfm_limiter.async_slot():
+                    genres = await _fetch_top_tags(http, name_variant)
+                lastfm_limiter.on_success()
                 # Successful fetch
                 artist_genre_cache[artist_name] = genres
+                await asyncio.to_thread(tag_cache.set, artist_name, genres, True)
                 return genres
                 
-            except pylast.WSError as ws:
+            except LastFMError as ws:
                 err_str = str(ws).lower()
                 # "could not be found" wasn't caught by "not found" in a strict contiguous check
                 if "not found" in err_str or "no such artist" in err_str or "could not be found" in err_str:
                     print(f"ℹ️ Last.fm: Artist '{name_variant}' not found.")
+                    confirmed_missing = True
                     break # Break retry loop, move to next normalization variant if exists
                 
-                # Rate limits or internal Last.fm errors: Wait and retry
+                if is_throttle_error(ws):
+                    # Rate limits: the limiter pauses the whole pool, next acquire waits it out
+                    lastfm_limiter.on_throttle()
+                    continue
+
+                # Internal Last.fm errors: Wait and retry
                 wait_time = (attempt + 1) * 2
                 print(f"⚠️ Last.fm API Error ({ws}). Waiting {wait_time}s to retry '{name_variant}'...")
-                time.sleep(wait_time)
+                await asyncio.sleep(wait_time)
                 
             except Exception as e:
                 # Network timeouts, SSL issues, etc.
                 wait_time = (attempt + 1) * 2
                 print(f"⚠️ Network issue for '{name_variant}' (Attempt {attempt+1}/{retries}): {e}. Retrying in {wait_time}s...")
-                time.sleep(wait_time)
+                await asyncio.sleep(wait_time)
 
     # If we fall through (all variants failed or were not found)
     print(f"❌ '{artist_name}' could not be resolved on Last.fm. Storing empty genres to pass to database anyways.")
     artist_genre_cache[artist_name] = []
-    # Cache it as empty so we don't spam Last.fm on future passes
+    # Cache it as empty so we don't spam Last.fm on future passes.
+    # Only a real "not found" is persisted (with the short negative TTL); transient
+    # network failures stay in-process so the next run tries again.
+    if confirmed_missing:
+        await asyncio.to_thread(tag_cache.set, artist_name, [], False)
     return []
 
-def categorize_artist(artist_name, fallback_genres=None, filter_electronic=True, existing_data=None, supabase_client=None):
+def get_artist_genres(artist_name):
+    """Blocking wrapper around get_artist_genres_async."""
+    return asyncio.run(get_artist_genres_async(artist_name))
+
+async def _execute(query):
+    """
+    Runs a PostgREST query from either a sync or an async Supabase client.
+    Async clients are awaited directly; sync ones are pushed to a worker thread
+    so the event loop never blocks on the network.
+    """
+    if inspect.iscoroutinefunction(query.execute):
+        return await query.execute()
+    return await asyncio.to_thread(query.execute)
+
+def _hydrate_existing_artist(row):
+    """Flattens the nested artist_genres(vote_count, genres(slug)) join into 'genres' and 'genre_votes'."""
+    ag_list = row.get("artist_genres") or []
+    row['genres'] = [ag['genres']['slug'] for ag in ag_list if ag.get('genres') and ag['genres'].get('slug')]
+    
+    gv = {}
+    for ag in ag_list:
+        g = ag.get('genres')
+        if g and g.get('slug'):
+            gv[g['slug']] = ag.get('vote_count', 5)
+    row['genre_votes'] = gv
+    return row
+
+async def categorize_artist_async(artist_name, fallback_genres=None, filter_electronic=True, existing_data=None, supabase_client=None, http=None):
     """
     Fetches genres, categorizes them, and builds the artist metadata dict.
     Calculates unified vote scoring across both CSV and Last.fm inputs.
     """ 
-    manager = GenreManager.get_instance()
-    
     if not existing_data and supabase_client:
         slug = artist_name.lower().replace(" ", "-")
         try:
-            res = supabase_client.table("artists").select("*, artist_genres(vote_count, genres(slug))").eq("name_slug", slug).execute()
-            if res.data:
-                existing_data = res.data[0]
-                ag_list = existing_data.get("artist_genres") or []
-                existing_data['genres'] = [ag['genres']['slug'] for ag in ag_list if ag.get('genres') and ag['genres'].get('slug')]
-                
-                gv = {}
-                for ag in ag_list:
-                    g = ag.get('genres')
-                    if g and g.get('slug'):
-                        gv[g['slug']] = ag.get('vote_count', 5)
-                existing_data['genre_votes'] = gv
+            # Coalesced with other in-flight single-artist lookups into one in_() query
+            row = await get_lookup_batcher(supabase_client).lookup_async(slug)
+            if row:
+                existing_data = _hydrate_existing_artist(row)
         except Exception:
             pass
 
@@ -165,21 +276,38 @@ def categorize_artist(artist_name, fallback_genres=None, filter_electronic=True,
             if not electronic_matches:
                 genres = []
                 
-        return {
+        profile = {
             "name": existing_data.get('name', artist_name),
             "genres": genres,
             "genre_votes": existing_data.get('genre_votes', {}),
             "sonic_dna": existing_data.get('sonic_dna', {})
         }
+        if existing_data.get("dna_source"):
+            profile["dna_source"] = existing_data["dna_source"]
+        return profile
+
+    # 1. Fetch both Last.fm and CSV data unconditionally
+    lastfm_genres = await get_artist_genres_async(artist_name, http)
+    profile = build_artist_profile(artist_name, fallback_genres, lastfm_genres, filter_electronic)
+    profile["dna_source"] = "lastfm" if lastfm_genres else "csv"
+    return profile
+
+def categorize_artist(artist_name, fallback_genres=None, filter_electronic=True, existing_data=None, supabase_client=None):
+    """Blocking wrapper around categorize_artist_async."""
+    return asyncio.run(categorize_artist_async(artist_name, fallback_genres, filter_electronic, existing_data, supabase_client))
+
+def build_artist_profile(artist_name, fallback_genres, lastfm_genres, filter_electronic=True):
+    """
+    Pure scoring step of categorize_artist: merges CSV and Last.fm tags into
+    the dual-source vote map and derives sonic DNA. No I/O.
+    """
+    manager = GenreManager.get_instance()
 
     # New Dual-Source Vote System Logic
     csv_genres = []
     if fallback_genres:
         for item in fallback_genres:
             csv_genres.extend([g.strip() for g in item.split(",") if g.strip()])
-            
-    # 1. Fetch both Last.fm and CSV data unconditionally
-    lastfm_genres = get_artist_genres(artist_name)
     
     # 2. Get electronic canonical subsets
     csv_electronic = get_electronic_genres(csv_genres)
@@ -269,163 +397,287 @@ def categorize_artist(artist_name, fallback_genres=None, filter_electronic=True,
         "sonic_dna": VibeClassifier.get_artist_vibe_from_votes(vote_counts_only)
     }
 
-def _categorize_worker(args):
-    artist_name, fallback_genres, filter_electronic, existing_data = args
-    return categorize_artist(artist_name, fallback_genres, filter_electronic, existing_data)
+async def lookup_existing_artists_async(slugs, supabase_client, progress=None):
+    """
+    Hydrated rows for the name_slugs already in Supabase, keyed by slug. Lookups go through
+    the client's ArtistLookupBatcher, so concurrent callers (ingest workers, refine threads,
+    festival scraping) share in_() batches and overlapping slugs are fetched once.
+    """
+    batcher = get_lookup_batcher(supabase_client)
+    existing_map = {}
+    errors = []
+
+    async def lookup_one(slug):
+        try:
+            row = await batcher.lookup_async(slug)
+            if row:
+                existing_map[slug] = _hydrate_existing_artist(row)
+        except Exception as e:
+            errors.append(e)
+        if progress:
+            progress("looked_up", 1)
+
+    await asyncio.gather(*(lookup_one(slug) for slug in slugs))
+    if errors:
+        print(f"⚠️ Warning: Bulk lookup failed for {len(errors)} artists: {errors[0]}")
+    return existing_map
+
+async def bulk_categorize_artists_async(artist_requests, supabase_client=None, max_concurrency=None, progress=None, fetch_missing=True):
+    """
+    Categorizes many artists at once. `progress`, if given, is called as
+    progress(phase, n) with phase "looked_up" (checked against Supabase) or
+    "fetched" (had to go to Last.fm). With fetch_missing=False nothing goes to
+    Last.fm: artists not in Supabase are left out of the result, and provisional
+    rows come back as stored.
+    """
+    if max_concurrency is None:
+        max_concurrency = lastfm_limiter.max_concurrency
 
-def bulk_categorize_artists(artist_requests, supabase_client=None, max_workers=10):
     existing_map = {}
     if supabase_client:
         all_slugs = [name.lower().replace(" ", "-") for name, _, _ in artist_requests]
         print(f"🔍 Checking Supabase for {len(all_slugs)} existing artists...")
-        
-        for i in range(0, len(all_slugs), 500):
-            batch_slugs = all_slugs[i:i+500]
-            try:
-                res = supabase_client.table("artists").select("*, artist_genres(vote_count, genres(slug))").in_("name_slug", batch_slugs).execute()
-                if res.data:
-                    for row in res.data:
-                        ag_list = row.get("artist_genres") or []
-                        row['genres'] = [ag['genres']['slug'] for ag in ag_list if ag.get('genres') and ag['genres'].get('slug')]
-                        
-                        gv = {}
-                        for ag in ag_list:
-                            g = ag.get('genres')
-                            if g and g.get('slug'):
-                                gv[g['slug']] = ag.get('vote_count', 5)
-                        row['genre_votes'] = gv
-                        
-                        existing_map[row["name_slug"]] = row
-            except Exception as e:
-                print(f"⚠️ Warning: Bulk lookup failed: {e}")
+        existing_map = await lookup_existing_artists_async(all_slugs, supabase_client, progress)
 
-    worker_requests = []
-    for name, fallback, filter_e in artist_requests:
-        slug = name.lower().replace(" ", "-")
-        existing_info = existing_map.get(slug)
-        worker_requests.append((name, fallback, filter_e, existing_info))
-
-    print(f"🧵 Parallel processing {len(worker_requests)} artists...")
+    print(f"🧵 Parallel processing {len(artist_requests)} artists...")
     
+    # Caps in-flight categorizations; the shared limiter still paces the actual Last.fm calls
+    sem = asyncio.Semaphore(max_concurrency)
     results = {}
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_artist = {executor.submit(_categorize_worker, req): req[0] for req in worker_requests}
-        for future in concurrent.futures.as_completed(future_to_artist):
-            artist_name = future_to_artist[future]
-            try:
-                categorized = future.result()
-                if categorized:
-                    results[artist_name] = categorized
-            except Exception as e:
-                print(f"❌ Error processing {artist_name}: {e}")
+    async with httpx.AsyncClient(timeout=LASTFM_TIMEOUT) as http:
+        async def run_one(name, fallback, filter_e):
+            existing_info = existing_map.get(name.lower().replace(" ", "-"))
+            # Provisional rows go back to Last.fm; until it has tags, the stored profile is kept
+            refetch = fetch_missing and is_provisional(existing_info)
+            if not existing_info and not fetch_missing:
+                return
+            async with sem:
+                try:
+                    categorized = None
+                    if refetch:
+                        fetched = await categorize_artist_async(name, fallback, filter_e, http=http)
+                        categorized = merge_refined_profile(fetched, existing_info, filter_e)
+                    if categorized is None:
+                        categorized = await categorize_artist_async(name, fallback, filter_e, existing_info, http=http)
+                    if categorized:
+                        results[name] = categorized
+                except Exception as e:
+                    print(f"❌ Error processing {name}: {e}")
+            if progress and (refetch or not existing_info):
+                progress("fetched", 1)
+
+        await asyncio.gather(*(run_one(*req) for req in artist_requests))
                 
     return results
 
-def sync_artists_to_supabase(artist_dict, supabase_client, user_id=None):
+def bulk_categorize_artists(artist_requests, supabase_client=None, max_workers=None, progress=None, fetch_missing=True):
+    """Blocking wrapper around bulk_categorize_artists_async."""
+    return asyncio.run(bulk_categorize_artists_async(artist_requests, supabase_client, max_workers, progress, fetch_missing))
+
+def _canonical_genre_votes(item, manager):
+    """{genre_id: votes} for an artist dict, as it will be written to artist_genres."""
+    # Read the vote map from the origin item. If empty or legacy, just fall back to standard genre list.
+    genre_votes_map = item.get("genre_votes", {})
+    raw_genres = item.get("genres", [])
+    votes_by_id = {}
+
+    # If we dynamically computed genre_votes (the new way)
+    if genre_votes_map and isinstance(genre_votes_map, dict):
+        for raw, votes in genre_votes_map.items():
+            genre_id = manager.get_canonical_id(raw)
+            if genre_id and genre_id not in votes_by_id:
+                votes_by_id[genre_id] = votes
+    # Legacy fallback: if we only have the flat list
+    elif raw_genres and isinstance(raw_genres, list):
+        for raw in raw_genres:
+            genre_id = manager.get_canonical_id(raw)
+            if genre_id and genre_id not in votes_by_id:
+                votes_by_id[genre_id] = 5
+    return votes_by_id
+
+def artist_content_hash(name, sonic_dna, genre_votes_by_id, dna_source=None):
+    """Stable hash of everything the sync writes for an artist; equal hashes mean nothing to write."""
+    content = {
+        "name": name,
+        "sonic_dna": sonic_dna or {},
+        "genres": sorted([str(genre_id), votes] for genre_id, votes in genre_votes_by_id.items()),
+    }
+    # Only hashed when set, so rows synced before dna_source existed keep their hash
+    if dna_source:
+        content["dna_source"] = dna_source
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+async def sync_artists_to_supabase_async(artist_dict, supabase_client, user_id=None, update_dna=True):
+    """
+    Writes categorized artists, their artist_genres rows and (with user_id) the
+    user's library. With update_dna, the changed play counts are folded into the
+    user's DNA aggregate incrementally (VibeClassifier.apply_user_dna_delta).
+    Aggregates holding an artist whose content changed are invalidated, so those
+    users get a full rebuild instead of a drifting delta.
+    Existing artists whose content_hash (name, DNA and genre votes) is unchanged
+    are not rewritten. Returns {"inserted", "updated", "skipped"} artist counts.
+    """
     if not artist_dict:
         print("⚠️ No artists found to sync.")
-        return
+        return {"inserted": 0, "updated": 0, "skipped": 0}
 
     print(f"🚀 Syncing {len(artist_dict)} artists to Supabase...")
     manager = GenreManager.get_instance()
+    db_sem = asyncio.Semaphore(DB_CONCURRENCY)
     
-    slugs_to_process = []
+    # Single slug-keyed index over the input; every later lookup goes through it
+    slugged_items = [(item['name'].lower().replace(" ", "-"), item) for item in artist_dict.values()]
+    items_by_slug = {}
+    for name_slug, item in slugged_items:
+        items_by_slug.setdefault(name_slug, item)
+
+    slugs_to_process = list(items_by_slug.keys())
     artist_metadata_map = {}
+    genre_votes_by_slug = {}
     
-    for item in artist_dict.values():
-        name_slug = item['name'].lower().replace(" ", "-")
-        slugs_to_process.append(name_slug)
+    for name_slug, item in items_by_slug.items():
+        genre_votes_by_slug[name_slug] = _canonical_genre_votes(item, manager)
         artist_metadata_map[name_slug] = {
             "name": item['name'],
             "name_slug": name_slug,
-            "sonic_dna": item.get('sonic_dna', {})
+            "sonic_dna": item.get('sonic_dna', {}),
+            "content_hash": artist_content_hash(item['name'], item.get('sonic_dna', {}), genre_votes_by_slug[name_slug], item.get('dna_source'))
         }
+        if item.get('dna_source'):
+            artist_metadata_map[name_slug]["dna_source"] = item['dna_source']
+    # PostgREST bulk writes need the same keys in every row
+    if any("dna_source" in payload for payload in artist_metadata_map.values()):
+        for payload in artist_metadata_map.values():
+            payload.setdefault("dna_source", None)
 
     existing_slug_to_id = {}
+    existing_hashes = {}
+    # Falls back to full upserts if the artists table has no content_hash column yet
+    hashes_supported = True
+    # Slugs whose lookup failed: unknown whether they exist, so they aren't written this run
+    unresolved_slugs = set()
     batch_size = 100
-    for i in range(0, len(slugs_to_process), batch_size):
-        batch_slugs = slugs_to_process[i:i+batch_size]
+
+    async def fetch_ids(batch_slugs):
+        nonlocal hashes_supported
         try:
-            res = supabase_client.table("artists").select("id, name_slug").in_("name_slug", batch_slugs).execute()
-            if res.data:
-                for row in res.data:
-                    existing_slug_to_id[row["name_slug"]] = row["id"]
+            async with db_sem:
+                res = None
+                if hashes_supported:
+                    try:
+                        res = await _execute(supabase_client.table("artists").select("id, name_slug, content_hash").in_("name_slug", batch_slugs))
+                    except Exception as e:
+                        # Anything but a missing column is a real failure for this batch
+                        if not is_missing_column_error(e):
+                            raise
+                        hashes_supported = False
+                if res is None:
+                    res = await _execute(supabase_client.table("artists").select("id, name_slug").in_("name_slug", batch_slugs))
+            for row in res.data or []:
+                existing_slug_to_id[row["name_slug"]] = row["id"]
+                existing_hashes[row["name_slug"]] = row.get("content_hash")
         except Exception as e:
             print(f"❌ Error fetching bulk slugs: {e}")
+            unresolved_slugs.update(batch_slugs)
+
+    await asyncio.gather(*(fetch_ids(slugs_to_process[i:i+batch_size]) for i in range(0, len(slugs_to_process), batch_size)))
 
     inserts = []
     updates = []
+    skipped = 0
     
     for slug, payload in artist_metadata_map.items():
+        if not hashes_supported:
+            payload.pop("content_hash", None)
+        if slug in unresolved_slugs:
+            continue
         if slug in existing_slug_to_id:
+            if hashes_supported and existing_hashes.get(slug) == payload["content_hash"]:
+                skipped += 1
+                continue
             payload["id"] = existing_slug_to_id[slug]
             updates.append(payload)
         else:
             inserts.append(payload)
+
+    write_batch_size = 500
+    written_slugs = []
             
     try:
+        dna_source_supported = True
+
+        async def write_artists(op, batch):
+            nonlocal dna_source_supported
+            async with db_sem:
+                if dna_source_supported:
+                    try:
+                        return await _execute(getattr(supabase_client.table("artists"), op)(batch))
+                    except Exception as e:
+                        # Schemas without artists.dna_source: write the rest of the row
+                        if not is_missing_column_error(e) or "dna_source" not in batch[0]:
+                            raise
+                        dna_source_supported = False
+                batch = [{k: v for k, v in p.items() if k != "dna_source"} for p in batch]
+                return await _execute(getattr(supabase_client.table("artists"), op)(batch))
+
+        async def insert_artists(batch):
+            res = await write_artists("insert", batch)
+            for row in res.data or []:
+                existing_slug_to_id[row["name_slug"]] = row["id"]
+
+        async def upsert_artists(batch):
+            await write_artists("upsert", batch)
+
         if inserts:
-            res = supabase_client.table("artists").insert(inserts).execute()
-            if res.data:
-                for row in res.data:
-                    existing_slug_to_id[row["name_slug"]] = row["id"]
+            await asyncio.gather(*(insert_artists(inserts[i:i+write_batch_size]) for i in range(0, len(inserts), write_batch_size)))
         
         if updates:
-            supabase_client.table("artists").upsert(updates).execute()
+            await asyncio.gather(*(upsert_artists(updates[i:i+write_batch_size]) for i in range(0, len(updates), write_batch_size)))
+
+        written_slugs = [p["name_slug"] for p in inserts + updates]
+        print(f"📊 Artists: {len(inserts)} inserted, {len(updates)} updated, {skipped} unchanged (skipped)")
+        if unresolved_slugs:
+            print(f"⚠️ {len(unresolved_slugs)} artists not written: their lookup failed.")
+
+        # Rewritten artists contribute differently now; aggregates that folded them in are stale
+        if updates:
+            await asyncio.to_thread(VibeClassifier.mark_user_aggregates_stale, [p["id"] for p in updates], supabase_client)
 
+        # Unchanged artists already have these genre votes stored
         artist_genres_payloads = []
-        for name_slug, item in artist_metadata_map.items():
+        for name_slug in written_slugs:
             artist_id = existing_slug_to_id.get(name_slug)
             if not artist_id: continue
-            
-            orig_item = next((v for v in artist_dict.values() if v['name'].lower().replace(" ", "-") == name_slug), {})
-            # Read the vote map from the origin item. If empty or legacy, just fall back to standard genre list.
-            genre_votes_map = orig_item.get("genre_votes", {})
-            raw_genres = orig_item.get("genres", [])
-
-            seen_slugs = set()
-            
-            # If we dynamically computed genre_votes (the new way)
-            if genre_votes_map and isinstance(genre_votes_map, dict):
-                for raw, votes in genre_votes_map.items():
-                    genre_id = manager.get_canonical_id(raw)
-                    if genre_id and genre_id not in seen_slugs:
-                        seen_slugs.add(genre_id)
-                        artist_genres_payloads.append({
-                            "artist_id": artist_id,
-                            "genre_id": genre_id,
-                            "vote_count": votes
-                        })
-            # Legacy fallback: if we only have the flat list
-            elif raw_genres and isinstance(raw_genres, list):
-                for raw in raw_genres:
-                    genre_id = manager.get_canonical_id(raw)
-                    if genre_id and genre_id not in seen_slugs:
-                        seen_slugs.add(genre_id)
-                        artist_genres_payloads.append({
-                            "artist_id": artist_id,
-                            "genre_id": genre_id,
-                            "vote_count": 5
-                        })
+            for genre_id, votes in genre_votes_by_slug[name_slug].items():
+                artist_genres_payloads.append({
+                    "artist_id": artist_id,
+                    "genre_id": genre_id,
+                    "vote_count": votes
+                })
 
         if artist_genres_payloads:
             try:
                 processed_artist_ids = list(set(p['artist_id'] for p in artist_genres_payloads))
                 existing_mappings = []
-                for i in range(0, len(processed_artist_ids), 500):
-                    batch_ids = processed_artist_ids[i:i+500]
-                    res = supabase_client.table("artist_genres").select("artist_id, genre_id").in_("artist_id", batch_ids).execute()
-                    if res.data:
-                        existing_mappings.extend(res.data)
+
+                async def fetch_mappings(batch_ids):
+                    async with db_sem:
+                        res = await _execute(supabase_client.table("artist_genres").select("artist_id, genre_id").in_("artist_id", batch_ids))
+                    existing_mappings.extend(res.data or [])
+
+                await asyncio.gather(*(fetch_mappings(processed_artist_ids[i:i+500]) for i in range(0, len(processed_artist_ids), 500)))
                 
                 existing_set = set((m['artist_id'], m['genre_id']) for m in existing_mappings)
                 to_insert = [p for p in artist_genres_payloads if (p['artist_id'], p['genre_id']) not in existing_set]
                 
                 if to_insert:
                     ag_batch_size = 500
-                    for i in range(0, len(to_insert), ag_batch_size):
-                        batch = to_insert[i:i+ag_batch_size]
-                        supabase_client.table("artist_genres").insert(batch).execute()
+
+                    async def insert_mappings(batch):
+                        async with db_sem:
+                            await _execute(supabase_client.table("artist_genres").insert(batch))
+
+                    await asyncio.gather(*(insert_mappings(to_insert[i:i+ag_batch_size]) for i in range(0, len(to_insert), ag_batch_size)))
                         
             except Exception as e:
                 print(f"❌ Error syncing artist_genres: {e}")
@@ -435,10 +687,10 @@ def sync_artists_to_supabase(artist_dict, supabase_client, user_id=None):
 
     if user_id:
         library_data_agg = {}
-        for item in artist_dict.values():
+        library_profiles = {}
+        for name_slug, item in slugged_items:
             if 'count' not in item: continue
             
-            name_slug = item['name'].lower().replace(" ", "-")
             artist_id = existing_slug_to_id.get(name_slug)
             
             if artist_id:
@@ -450,15 +702,47 @@ def sync_artists_to_supabase(artist_dict, supabase_client, user_id=None):
                         "artist_id": artist_id,
                         "count": item.get('count', 1)
                     }
+                    library_profiles[artist_id] = {
+                        "dna": item.get('sonic_dna'),
+                        "genres_votes": item.get('genre_votes') or {g: 5 for g in item.get('genres', [])}
+                    }
         
         library_inserts = list(library_data_agg.values())
-        
+
+        # Previous play counts, so only the difference is folded into the user's DNA aggregate
+        previous_counts = {}
+
+        async def fetch_previous_counts(batch_ids):
+            async with db_sem:
+                res = await _execute(supabase_client.table("user_lib").select("artist_id, count").eq("user_id", user_id).in_("artist_id", batch_ids))
+            for row in res.data or []:
+                previous_counts[row["artist_id"]] = row.get("count", 0)
+
+        library_written = False
+        dna_snapshot = None
         if library_inserts:
             try:
-                supabase_client.table("user_lib").upsert(library_inserts, on_conflict="user_id,artist_id").execute()
+                if update_dna:
+                    # Taken before the library write, so a concurrent DNA update is detected
+                    dna_snapshot = await asyncio.to_thread(VibeClassifier.read_user_aggregate, user_id, supabase_client)
+                library_ids = list(library_data_agg.keys())
+                await asyncio.gather(*(fetch_previous_counts(library_ids[i:i+500]) for i in range(0, len(library_ids), 500)))
+                await _execute(supabase_client.table("user_lib").upsert(library_inserts, on_conflict="user_id,artist_id"))
+                library_written = True
             except Exception as e:
                 print(f"❌ Error inserting user library batch: {e}")
                 
-        VibeClassifier.update_user_dna(user_id)
+        if update_dna and library_written:
+            dna_changes = [
+                {**library_profiles[artist_id], "delta": row["count"] - previous_counts.get(artist_id, 0)}
+                for artist_id, row in library_data_agg.items()
+            ]
+            # VibeClassifier makes blocking calls, so it runs on a worker thread
+            await asyncio.to_thread(VibeClassifier.apply_user_dna_delta, user_id, dna_changes, supabase_client, dna_snapshot)
         
     print(f"✨ Finished Syncing {len(artist_dict)} artists to Supabase!")
+    return {"inserted": len(inserts), "updated": len(updates), "skipped": skipped}
+
+def sync_artists_to_supabase(artist_dict, supabase_client, user_id=None, update_dna=True):
+    """Blocking wrapper around sync_artists_to_supabase_async."""
+    return asyncio.run(sync_artists_to_supabase_async(artist_dict, supabase_client, user_id, update_dna))
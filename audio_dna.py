@@ -0,0 +1,225 @@
+import threading
+import numpy as np
+from scipy import sparse
+
+from csv_ingest import StreamingArtistIngest, iter_csv_columns, liked_song_artists, ARTIST_COLUMN, GENRES_COLUMN, CSV_CHUNK_SIZE
+from artists_categorize import (
+    PROVISIONAL_DNA_SOURCE, build_artist_profile, bulk_categorize_artists, is_provisional,
+    merge_refined_profile, sync_artists_to_supabase,
+)
+from classifier import VibeClassifier
+
+# Same order as VibeClassifier.CATEGORIES
+CATEGORIES = ['intensity', 'euphoria', 'space', 'pulse', 'chaos', 'swing', 'bass']
+
+# Spotify export columns, and how each is squashed onto 0..1 before mapping
+AUDIO_FEATURES = ['Danceability', 'Energy', 'Loudness', 'Valence', 'Tempo', 'Acousticness', 'Instrumentalness', 'Liveness']
+LOUDNESS_RANGE = (-60.0, 0.0)   # dB
+TEMPO_RANGE = (60.0, 200.0)     # BPM
+
+# axis = clip(bias + weights . features, 0, 1) * 10
+# Columns follow AUDIO_FEATURES. Negative weights + bias encode "low X" (e.g. space ~ 1 - energy).
+#                           dance  energy  loud  valence tempo acoust instr  live
+FEATURE_WEIGHTS = np.array([
+    [0.00,  0.50,  0.30,  0.00,  0.20, 0.00,  0.00,  0.00],   # intensity
+    [0.20,  0.20,  0.00,  0.60,  0.00, 0.00,  0.00,  0.00],   # euphoria
+    [0.00, -0.20,  0.00,  0.00,  0.00, 0.25,  0.35,  0.20],   # space
+    [0.50,  0.20,  0.00,  0.00,  0.30, 0.00,  0.00,  0.00],   # pulse
+    [0.00,  0.40,  0.00, -0.30,  0.20, 0.00,  0.00,  0.10],   # chaos
+    [0.60,  0.00,  0.00,  0.20,  0.00, 0.20,  0.00,  0.00],   # swing
+    [0.30,  0.30,  0.40,  0.00,  0.00, 0.00,  0.00,  0.00],   # bass
+])
+FEATURE_BIAS = np.array([0.0, 0.0, 0.2, 0.0, 0.3, 0.0, 0.0])
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def normalize_features(features):
+    """N x len(AUDIO_FEATURES) raw values -> 0..1 (loudness and tempo rescaled, the rest clipped)."""
+    out = np.array(features, dtype=np.float64, copy=True)
+    loud = AUDIO_FEATURES.index('Loudness')
+    tempo = AUDIO_FEATURES.index('Tempo')
+    out[:, loud] = (out[:, loud] - LOUDNESS_RANGE[0]) / (LOUDNESS_RANGE[1] - LOUDNESS_RANGE[0])
+    out[:, tempo] = (out[:, tempo] - TEMPO_RANGE[0]) / (TEMPO_RANGE[1] - TEMPO_RANGE[0])
+    return np.clip(out, 0.0, 1.0)
+
+
+def features_to_dna(features):
+    """Vectorized feature -> DNA mapping for an N x F matrix of normalized features. Returns N x 7 on 0..10."""
+    return np.clip(FEATURE_BIAS + features @ FEATURE_WEIGHTS.T, 0.0, 1.0) * 10.0
+
+
+class ArtistAudioFeatures:
+    """
+    Collects audio features track by track (e.g. from the streaming CSV pass) and turns
+    them into per-artist provisional DNA in one go. Tracks become rows of a tracks x
+    features array and a sparse tracks x artists incidence matrix, so per-artist means
+    are a single sparse product. Tracks with missing features are ignored.
+    """
+
+    def __init__(self, key=None):
+        self.key = key or (lambda name: name.lower().strip())
+        self.artist_index = {}   # dedupe key -> incidence column
+        self.tracks = []         # per column: tracks credited
+        self._rows, self._cols = [], []
+        self._features = []
+
+    def add(self, features, artist_names):
+        """One track: its raw AUDIO_FEATURES values and the artists credited on it."""
+        track_no = len(self._features)
+        self._features.append([_to_float(v) for v in features])
+        for name in artist_names:
+            norm_name = self.key(name)
+            col = self.artist_index.get(norm_name)
+            if col is None:
+                col = len(self.tracks)
+                self.artist_index[norm_name] = col
+                self.tracks.append(0)
+            self.tracks[col] += 1
+            self._rows.append(track_no)
+            self._cols.append(col)
+
+    def dna(self):
+        """{dedupe key: sonic_dna} for every artist with at least one usable track."""
+        if not self.tracks:
+            return {}
+        features = np.asarray(self._features, dtype=np.float64).reshape(len(self._features), len(AUDIO_FEATURES))
+        valid = ~np.isnan(features).any(axis=1)
+        features = normalize_features(np.where(valid[:, None], features, 0.0))
+
+        incidence = sparse.csr_matrix((np.ones(len(self._rows)), (self._rows, self._cols)), shape=(len(self._features), len(self.tracks)))
+        incidence = sparse.diags(valid.astype(np.float64)) @ incidence
+        track_counts = np.asarray(incidence.sum(axis=0)).ravel()
+        sums = np.asarray(incidence.T @ features)
+        has_audio = track_counts > 0
+        means = np.zeros_like(sums)
+        means[has_audio] = sums[has_audio] / track_counts[has_audio, None]
+        dna = features_to_dna(means)
+
+        return {
+            norm_name: {cat: round(float(v), 2) for cat, v in zip(CATEGORIES, dna[col])}
+            for norm_name, col in self.artist_index.items() if has_audio[col]
+        }
+
+
+def _refine_in_background(provisional, pending, supabase_client, user_id, filter_electronic, chunk_size=None):
+    """
+    Replaces provisional audio DNA with Last.fm-based profiles, `chunk_size` artists at
+    a time so refined artists land in Supabase as they come in. Supabase is skipped on
+    purpose: it would just hand back the provisional rows we wrote a moment ago. Where
+    Last.fm has no tags the artist stays provisional (dna_source "audio") and is picked
+    up again by the next categorization or refine_provisional_artists(). Syncing the
+    refined artists invalidates the stored DNA aggregate of everyone holding them, so
+    the user's DNA is rebuilt in full once, after the last chunk.
+    """
+    chunk_size = chunk_size or CSV_CHUNK_SIZE
+    refined = 0
+    for i in range(0, len(pending), chunk_size):
+        chunk = pending[i:i + chunk_size]
+        try:
+            fetched = bulk_categorize_artists([(name, provisional[name]['csv_genres'], filter_electronic) for name in chunk])
+        except Exception as e:
+            print(f"❌ Last.fm refinement failed; {len(pending) - i} artists stay provisional: {e}")
+            break
+
+        changed = {}
+        for name, profile in fetched.items():
+            old = provisional[name]
+            profile = merge_refined_profile(profile, old, filter_electronic)
+            if profile is None:
+                continue
+            profile['count'] = old['count']
+            changed[name] = profile
+
+        if changed:
+            sync_artists_to_supabase(changed, supabase_client, update_dna=False)
+        refined += len(changed)
+    print(f"🎧 Refined {refined} of {len(pending)} provisional artists with Last.fm tags.")
+    if refined and user_id:
+        VibeClassifier.update_user_dna(user_id, supabase_client)
+
+
+def refine_provisional_artists(supabase_client, page_size=500):
+    """
+    Sweeps every artist still marked provisional (e.g. after a failed or interrupted
+    refine) back through Last.fm. bulk_categorize_artists re-fetches provisional rows
+    on its own; artists that now have tags are written, which also invalidates the DNA
+    aggregates of users holding them. Returns the number of artists refined.
+    """
+    refined = 0
+    last_id = None
+    while True:
+        query = supabase_client.table("artists").select("id, name").eq("dna_source", PROVISIONAL_DNA_SOURCE).order("id").limit(page_size)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        page = query.execute().data or []
+        if not page:
+            break
+        results = bulk_categorize_artists([(row["name"], [], False) for row in page], supabase_client)
+        done = {name: profile for name, profile in results.items() if not is_provisional(profile)}
+        if done:
+            sync_artists_to_supabase(done, supabase_client, update_dna=False)
+        refined += len(done)
+        last_id = page[-1]["id"]
+        if len(page) < page_size:
+            break
+    print(f"🎧 {refined} provisional artists refined with Last.fm tags.")
+    return refined
+
+
+def ingest_with_audio_dna(path, supabase_client, user_id=None, filter_electronic=False, background=True):
+    """
+    Two-phase liked-songs ingest. The export is streamed once through
+    StreamingArtistIngest, which resolves artists already in Supabase chunk by chunk
+    without touching Last.fm, while the same pass collects audio features. Artists not
+    in Supabase (or still provisional there) get a provisional profile from CSV genres
+    plus audio-feature DNA, and the whole library is synced right away so the user has
+    a usable DNA without waiting on Last.fm. Those artists are then re-categorized from
+    Last.fm on a background thread (or inline with background=False). Returns the
+    refinement thread, or None.
+    """
+    audio = ArtistAudioFeatures()
+    ingest = StreamingArtistIngest(supabase_client, filter_electronic=filter_electronic, key=audio.key, fetch_missing=False)
+
+    def extract(row):
+        pairs = liked_song_artists(row[0], row[1])
+        audio.add(row[2:], [name for name, _ in pairs])
+        return pairs
+
+    known = ingest.run(iter_csv_columns(path, [ARTIST_COLUMN, GENRES_COLUMN] + AUDIO_FEATURES), extract)
+    if not ingest.first_seen:
+        return None
+    audio_dna = audio.dna()
+
+    provisional = {}
+    pending = []
+    for norm_name, (name, genres) in ingest.first_seen.items():
+        artist = known.get(name)
+        if artist is None:
+            artist = build_artist_profile(name, genres, [], filter_electronic)
+            if norm_name in audio_dna and (artist['genre_votes'] or not filter_electronic):
+                artist['sonic_dna'] = audio_dna[norm_name]
+            artist['dna_source'] = PROVISIONAL_DNA_SOURCE
+        if is_provisional(artist):
+            pending.append(name)
+            artist['csv_genres'] = genres
+        artist['count'] = ingest.counts[norm_name]
+        provisional[name] = artist
+
+    print(f"🎚️ {len(provisional)} artists: {len(provisional) - len(pending)} known, {len(pending)} provisional.")
+    sync_artists_to_supabase(provisional, supabase_client, user_id=user_id)
+
+    if not pending:
+        return None
+    args = (provisional, pending, supabase_client, user_id, filter_electronic)
+    if not background:
+        _refine_in_background(*args)
+        return None
+    thread = threading.Thread(target=_refine_in_background, args=args, name="audio-dna-refine")
+    thread.start()
+    return thread
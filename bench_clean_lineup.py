@@ -0,0 +1,112 @@
+import csv
+import glob
+import os
+import re
+import sys
+import time
+
+# Importing artists_categorize builds the GenreManager from a client; the cleaner needs
+# no genres, so run against the in-memory Supabase stand-in instead of a real project
+os.environ.setdefault("SUPABASE_LOCAL_DB", ":memory:")
+
+from artists_categorize import ArtistCleaner
+
+# Microbenchmark for ArtistCleaner.clean_lineup over the FestivalCSV/ corpus.
+# Compares against the previous per-name re.search/re.split implementation and
+# checks both produce the same output for every lineup.
+# Usage: python bench_clean_lineup.py [repeats]   (default: 20)
+
+
+def legacy_clean_lineup(artists_list):
+    cleaned_artists = set()
+    tba_flag = False
+    split_pattern = r'\s+&\s+|\s+x\s+|\s+b2b\s+|\s+X\s+|\s+B2B\s+'
+    for artist_name in artists_list:
+        if not artist_name: continue
+        upper_name = artist_name.upper()
+        if "TBA" in upper_name or "TBD" in upper_name or artist_name.count("?") >= 3:
+            tba_flag = True
+            continue
+        match = re.search(r'\((.*?)\)', artist_name)
+        if match:
+            inner_content = match.group(1)
+            if re.search(split_pattern, inner_content):
+                for sa in re.split(split_pattern, inner_content):
+                    if sa.strip(): cleaned_artists.add(sa.strip())
+            else:
+                base_name = re.sub(r'\s*\(.*?\)\s*', '', artist_name).strip()
+                if base_name:
+                    if re.search(split_pattern, base_name):
+                        for sa in re.split(split_pattern, base_name):
+                            if sa.strip(): cleaned_artists.add(sa.strip())
+                    else:
+                        cleaned_artists.add(base_name)
+        else:
+            if re.search(split_pattern, artist_name):
+                for sa in re.split(split_pattern, artist_name):
+                    if sa.strip(): cleaned_artists.add(sa.strip())
+            else:
+                cleaned_artists.add(artist_name.strip())
+    return list(cleaned_artists), tba_flag
+
+
+# Names that exercise every branch, on top of the corpus
+EDGE_CASES = [
+    "SUBJOHNICS (John Summit & Sub Focus)", "Goldie (UK)", "Chris Lake b2b Fisher (DJ Set)",
+    "Special Guest TBA", "tbd", "???", "A ? B ? C ?", "Dom Dolla x John Summit", "A  X  B",
+    "(Live)", "  ", "Artist (feat. B x C) & D", "Multiple (one) (two) & Three", "Line\nBreak (x)",
+]
+
+
+def load_lineups():
+    """Per-row lineups (as festival_aggregator reads them) plus one whole lineup per festival."""
+    lineups = []
+    for path in sorted(glob.glob(os.path.join("FestivalCSV", "*.csv"))):
+        festival = []
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                names = [n.strip() for n in (row.get("Artist Name(s)") or "").split(";")]
+                lineups.append(names)
+                festival.extend(names)
+        lineups.append(festival)
+    lineups.append(EDGE_CASES)
+    lineups.extend([name] for name in EDGE_CASES)
+    return lineups
+
+
+def timed(fn, lineups, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        out = [fn(lineup) for lineup in lineups]
+    return time.perf_counter() - start, out
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    lineups = load_lineups()
+    names = sum(len(l) for l in lineups)
+    print(f"{len(lineups)} lineups, {names} names, x{repeats}")
+
+    legacy_time, legacy_out = timed(legacy_clean_lineup, lineups, repeats)
+    ArtistCleaner.clean_name.cache_clear()
+    cold_time, cold_out = timed(ArtistCleaner.clean_lineup, lineups, 1)
+    warm_time, warm_out = timed(ArtistCleaner.clean_lineup, lineups, repeats)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        batch_out = ArtistCleaner.clean_lineups(lineups)
+    batch_time = time.perf_counter() - start
+
+    # Same names, in the same order, and same TBA flag for every lineup
+    for out in (cold_out, warm_out, batch_out):
+        mismatches = [i for i, (a, b) in enumerate(zip(legacy_out, out)) if a != b]
+        assert not mismatches, f"output differs for lineups {mismatches[:5]}"
+
+    print(f"{'variant':<12}{'total s':>10}{'us/name':>10}{'speedup':>10}")
+    for label, secs, n in (("legacy", legacy_time, repeats), ("cold", cold_time, 1), ("warm", warm_time, repeats), ("batch", batch_time, repeats)):
+        per_name = secs / (names * n) * 1e6
+        print(f"{label:<12}{secs:>10.3f}{per_name:>10.2f}{legacy_time / repeats / (secs / n):>9.1f}x")
+    print("✅ Output identical for all lineups.")
+
+
+if __name__ == "__main__":
+    main()
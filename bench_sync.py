@@ -0,0 +1,86 @@
+import random
+import sys
+import time
+
+from local_supabase import LocalSupabaseClient
+from classifier import GenreManager, CATEGORIES
+
+# Benchmark for sync_artists_to_supabase against the in-memory Supabase stand-in.
+# Usage: python bench_sync.py [sizes...]   (default: 1000 10000 50000)
+
+N_GENRES = 400
+EXISTING_RATIO = 0.5
+
+
+def make_genres(rng):
+    return [{
+        "id": i + 1,
+        "slug": f"genre-{i}",
+        "aliases": [f"genre {i}"],
+        "sonic_dna": {c: round(rng.uniform(0, 10), 2) for c in CATEGORIES},
+        "non-electronic": i % 10 == 0,
+    } for i in range(N_GENRES)]
+
+
+def make_artists(n, rng):
+    artist_dict = {}
+    for i in range(n):
+        name = f"Bench Artist {i}"
+        votes = {f"genre-{g}": rng.randint(1, 100) for g in rng.sample(range(N_GENRES), rng.randint(1, 8))}
+        artist_dict[name] = {
+            "name": name,
+            "genres": sorted(votes, key=votes.get, reverse=True),
+            "genre_votes": votes,
+            "sonic_dna": {c: round(rng.uniform(0, 10), 2) for c in CATEGORIES},
+            "count": rng.randint(1, 40),
+        }
+    return artist_dict
+
+
+def seed_existing(client, artist_dict, rng):
+    rows = []
+    for item in artist_dict.values():
+        if rng.random() < EXISTING_RATIO:
+            rows.append({"name": item["name"], "name_slug": item["name"].lower().replace(" ", "-"), "sonic_dna": {}})
+    if rows:
+        client.table("artists").insert(rows).execute()
+    return len(rows)
+
+
+def timed_sync(client, artist_dict):
+    client.reset_stats()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    summary = sync_artists_to_supabase(artist_dict, client, user_id=None)
+    return time.perf_counter() - wall0, time.process_time() - cpu0, summary
+
+
+def report(label, n, existing, wall, cpu, summary, stats):
+    print(f"| {label:<6} | {n:>7} | {existing:>8} | {wall:>8.2f}s | {cpu:>8.2f}s | {stats['round_trips']:>11} | {stats['rows_sent']:>9} | {stats['rows_received']:>9} | {summary['skipped']:>7} |")
+
+
+def run(n, genres):
+    rng = random.Random(n)
+    client = LocalSupabaseClient(tables={"genres": genres})
+    artist_dict = make_artists(n, rng)
+    existing = seed_existing(client, artist_dict, rng)
+
+    wall, cpu, summary = timed_sync(client, artist_dict)
+    report("first", n, existing, wall, cpu, summary, client.stats)
+
+    # Same artists again: nothing changed, so every row should be skipped
+    wall, cpu, summary = timed_sync(client, artist_dict)
+    report("resync", n, n, wall, cpu, summary, client.stats)
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [1000, 10000, 50000]
+    genres = make_genres(random.Random(0))
+
+    # Point the genre singleton at the stand-in before artists_categorize initializes it
+    GenreManager._instance = GenreManager(LocalSupabaseClient(tables={"genres": genres}))
+    from artists_categorize import sync_artists_to_supabase
+
+    print("| run    | artists | existing |      wall |       cpu | round trips | rows sent | rows recv | skipped |")
+    print("|--------|---------|----------|-----------|-----------|-------------|-----------|-----------|---------|")
+    for n in sizes:
+        run(n, genres)
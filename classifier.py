@@ -1,74 +1,336 @@
 import os
-from dotenv import load_dotenv
-from supabase import create_client, Client
+import json
+import time
+import uuid
+import queue
+import hashlib
+import numpy as np
+from functools import lru_cache
+from scipy import sparse
+from supabase import Client
+from db_client import get_client, is_missing_column_error
 
 import threading
 
+# The 7 sonic DNA axes, in array column order
+CATEGORIES = ['intensity', 'euphoria', 'space', 'pulse', 'chaos', 'swing', 'bass']
+
+RECALC_CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "recalculate_artist_dna.json")
+
+GENRE_SNAPSHOT_PATH = os.environ.get("GENRE_SNAPSHOT_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "genres_snapshot.npz")
+GENRE_SNAPSHOT_FORMAT = 1
+GENRE_PAGE_SIZE = int(os.environ.get("GENRE_PAGE_SIZE", 1000))
+# A snapshot older than this is still used, but a rebuild is started in the background
+GENRE_SNAPSHOT_MAX_AGE = float(os.environ.get("GENRE_SNAPSHOT_MAX_AGE", 86400))
+GENRE_REFRESH_INTERVAL = float(os.environ.get("GENRE_REFRESH_INTERVAL", 300))
+# Distinct raw tags remembered by get_canonical_slug, per catalog instance
+GENRE_SLUG_CACHE_SIZE = int(os.environ.get("GENRE_SLUG_CACHE_SIZE", 65536))
+
+# users.dna_version changes on every DNA write; writers compare-and-set on it and retry
+DNA_WRITE_ATTEMPTS = int(os.environ.get("DNA_WRITE_ATTEMPTS", 5))
+# Expected version meaning "write unconditionally" (schemas without dna_version, last retry)
+UNCHECKED = object()
+
+
+def snapshot_source():
+    """What the snapshot was built from; a snapshot of another database is never loaded."""
+    local_path = os.environ.get("SUPABASE_LOCAL_DB")
+    if local_path:
+        # An in-memory stand-in starts empty every run, so there is nothing to snapshot
+        return None if local_path == ":memory:" else f"local:{os.path.abspath(local_path)}"
+    return os.environ.get("SUPABASE_URL") or ""
+
+
+def fetch_genre_rows(supabase_client, page_size=None):
+    """Every genres row, paged by id so the PostgREST row cap never truncates the catalog."""
+    page_size = page_size or GENRE_PAGE_SIZE
+    rows = []
+    last_id = None
+    while True:
+        query = supabase_client.table("genres").select("id, slug, aliases, sonic_dna, non-electronic").order("id").limit(page_size)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        page = query.execute().data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        last_id = page[-1]["id"]
+
+
+def build_genre_snapshot(rows):
+    """
+    Packs genres rows into the flat arrays GenreManager works from. Aliases become two
+    parallel arrays (alias -> genre index). `version` is a hash of the content, so a
+    refresh can tell whether anything actually changed.
+    """
+    alias_to_slug = {}
+    slug_to_index = {}
+    slugs = []
+    genre_ids = []
+    dna_rows = []
+    has_dna = []
+    electronic = []
+
+    for row in rows:
+        slug = row.get("slug")
+        if not slug: continue
+
+        idx = slug_to_index.get(slug)
+        if idx is None:
+            idx = len(slugs)
+            slug_to_index[slug] = idx
+            slugs.append(slug)
+            genre_ids.append(-1)
+            dna_rows.append([0.0] * len(CATEGORIES))
+            has_dna.append(False)
+            electronic.append(False)
+
+        genre_ids[idx] = row.get("id") if row.get("id") is not None else -1
+
+        dna = row.get("sonic_dna")
+        # Only count as 'proper' DNA if it is a dict and has our 7 axes
+        if dna and isinstance(dna, dict) and any(cat in dna for cat in CATEGORIES):
+            dna_rows[idx] = [float(dna.get(cat, 0.0) or 0.0) for cat in CATEGORIES]
+            has_dna[idx] = True
+
+        # A genre is electronic if "non-electronic" is NOT True
+        electronic[idx] = not row.get("non-electronic", False)
+
+        # Map identity
+        alias_to_slug[slug] = slug
+        aliases = row.get("aliases") or []
+        for alias in aliases:
+            alias_to_slug[alias.lower().strip()] = slug
+
+    snapshot = {
+        "format": np.int64(GENRE_SNAPSHOT_FORMAT),
+        "slugs": np.asarray(slugs, dtype=str),
+        "genre_ids": np.asarray(genre_ids, dtype=np.int64),
+        "dna": np.asarray(dna_rows, dtype=np.float64).reshape(len(slugs), len(CATEGORIES)),
+        "has_dna": np.asarray(has_dna, dtype=bool),
+        "electronic": np.asarray(electronic, dtype=bool),
+        "alias_keys": np.asarray(list(alias_to_slug.keys()), dtype=str),
+        "alias_index": np.asarray([slug_to_index[slug] for slug in alias_to_slug.values()], dtype=np.int64),
+    }
+    digest = hashlib.sha1()
+    for key in ("slugs", "genre_ids", "dna", "has_dna", "electronic", "alias_keys", "alias_index"):
+        digest.update(key.encode("utf-8"))
+        digest.update(np.ascontiguousarray(snapshot[key]).tobytes())
+    snapshot["version"] = np.asarray(digest.hexdigest())
+    return snapshot
+
+
+def save_genre_snapshot(snapshot, path=None, source=None):
+    """Writes the snapshot next to its final path and renames it in, so readers never see half a file."""
+    path = path or GENRE_SNAPSHOT_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, source=np.asarray(source or ""), built_at=np.float64(time.time()), **snapshot)
+    os.replace(tmp_path, path)
+
+
+def load_genre_snapshot(path=None, source=None):
+    """(snapshot, built_at) from disk, or (None, None) if it's missing, unreadable, or for another source."""
+    path = path or GENRE_SNAPSHOT_PATH
+    if not os.path.exists(path):
+        return None, None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            snapshot = {key: data[key] for key in data.files}
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable genre snapshot {path}: {e}")
+        return None, None
+    if int(snapshot.pop("format", -1)) != GENRE_SNAPSHOT_FORMAT or str(snapshot.pop("source", "")) != (source or ""):
+        return None, None
+    return snapshot, float(snapshot.pop("built_at"))
+
+
 class GenreManager:
+    """
+    In-memory genre catalog. Every genre gets a compact integer index; DNA lives in a
+    contiguous G x 7 array and the electronic flags in a boolean array, so vibe math
+    is a NumPy dot product instead of a walk over JSON dicts. The array stays float64:
+    it is tiny, and float32 would shift rounded DNA values by 0.01 at rounding ties.
+
+    The catalog is loaded from a versioned snapshot file when one exists, and rebuilt by
+    paging through `genres` when it doesn't. refresh() swaps in a new instance atomically;
+    readers holding the old one keep a consistent view until they next call get_instance().
+    """
     _instance = None
     _lock = threading.Lock()
+    _refresh_lock = threading.Lock()
+    _refresher = None
+    _stop_refresh = None
     
     @classmethod
-    def get_instance(cls):
+    def get_instance(cls, supabase_client=None):
+        if cls._instance is not None:
+            return cls._instance
+        stale = False
         with cls._lock:
             if cls._instance is None:
                 print("🧬 Initializing GenreManager Singleton...")
-                cls._instance = cls()
-        return cls._instance
-        
-    def __init__(self):
-        load_dotenv()
-        url = os.environ.get("SUPABASE_URL")
-        key = os.environ.get("SUPABASE_KEY")
-        supabase: Client = create_client(url, key)
-        
-        # Load all genres into memory
-        res = supabase.table("genres").select("id, slug, aliases, sonic_dna, non-electronic").execute()
-        self.slug_to_dna = {}
-        self.slug_to_electronic = {}
-        self.alias_to_slug = {}
-        self.slug_to_id = {}
+                source = snapshot_source()
+                snapshot, built_at = load_genre_snapshot(source=source) if source is not None else (None, None)
+                if snapshot is not None:
+                    cls._instance = cls(snapshot=snapshot)
+                    stale = time.time() - built_at > GENRE_SNAPSHOT_MAX_AGE
+                else:
+                    cls._instance = cls(supabase_client)
+                    cls._save(cls._instance)
+            instance = cls._instance
+        if stale:
+            threading.Thread(target=cls.refresh, args=(supabase_client,), name="genre-refresh", daemon=True).start()
+        return instance
+
+    @classmethod
+    def _save(cls, instance):
+        source = snapshot_source()
+        if source is None:
+            return
+        try:
+            save_genre_snapshot(instance.snapshot, source=source)
+        except OSError as e:
+            print(f"⚠️ Could not write genre snapshot: {e}")
+
+    @classmethod
+    def refresh(cls, supabase_client=None):
+        """
+        Re-reads the genres table and, if its content changed, writes a new snapshot and
+        swaps in a new instance. Returns True when the catalog changed.
+        """
+        with cls._refresh_lock:
+            try:
+                fresh = cls(supabase_client)
+            except Exception as e:
+                print(f"⚠️ Genre refresh failed, keeping the current catalog: {e}")
+                return False
+            cls._save(fresh)
+            with cls._lock:
+                current = cls._instance
+                if current is not None and current.version == fresh.version:
+                    return False
+                cls._instance = fresh
+            print(f"🧬 Genre catalog reloaded ({len(fresh.slugs)} genres, version {fresh.version[:8]}).")
+            return True
+
+    @classmethod
+    def start_auto_refresh(cls, interval=None, supabase_client=None):
+        """Background thread that calls refresh() every `interval` seconds (e.g. for the API)."""
+        with cls._lock:
+            if cls._refresher is not None and cls._refresher.is_alive():
+                return
+            stop = threading.Event()
+            interval = interval or GENRE_REFRESH_INTERVAL
+
+            def loop():
+                while not stop.wait(interval):
+                    cls.refresh(supabase_client)
+
+            cls._stop_refresh = stop
+            cls._refresher = threading.Thread(target=loop, name="genre-auto-refresh", daemon=True)
+            cls._refresher.start()
+
+    @classmethod
+    def stop_auto_refresh(cls):
+        with cls._lock:
+            if cls._stop_refresh is not None:
+                cls._stop_refresh.set()
+            cls._refresher = None
+            cls._stop_refresh = None
         
-        for row in res.data:
-            slug = row.get("slug")
-            if not slug: continue
-            
-            self.slug_to_id[slug] = row.get("id")
-            
-            dna = row.get("sonic_dna")
-            # Only count as 'proper' DNA if it is a dict and has our 7 axes
-            if dna and isinstance(dna, dict):
-                # We define categories here to avoid circular dependencies with VibeClassifier
-                cats = ['intensity', 'euphoria', 'space', 'pulse', 'chaos', 'swing', 'bass']
-                if any(cat in dna for cat in cats):
-                    self.slug_to_dna[slug] = dna
-                
-            # A genre is electronic if "non-electronic" is NOT True
-            self.slug_to_electronic[slug] = not row.get("non-electronic", False)
-            
-            # Map identity
-            self.alias_to_slug[slug] = slug
-            aliases = row.get("aliases") or []
-            for alias in aliases:
-                self.alias_to_slug[alias.lower().strip()] = slug
-                
-    def get_canonical_slug(self, raw_genre):
+    def __init__(self, supabase_client=None, snapshot=None):
+        if snapshot is None:
+            if supabase_client is None:
+                supabase_client = get_client()
+            snapshot = build_genre_snapshot(fetch_genre_rows(supabase_client))
+
+        self.snapshot = snapshot
+        self.version = str(snapshot["version"])
+        self.slugs = snapshot["slugs"].tolist()
+        self.slug_to_index = {slug: idx for idx, slug in enumerate(self.slugs)}
+        self.genre_ids = [gid if gid >= 0 else None for gid in snapshot["genre_ids"].tolist()]
+        self.alias_to_slug = dict(zip(snapshot["alias_keys"].tolist(), (self.slugs[idx] for idx in snapshot["alias_index"].tolist())))
+
+        self.dna = snapshot["dna"]
+        self.has_dna = snapshot["has_dna"]
+        self.electronic = snapshot["electronic"]
+
+        # Each distinct raw tag is normalized once per catalog; a reloaded catalog starts a fresh cache
+        self._slug_cache = lru_cache(maxsize=GENRE_SLUG_CACHE_SIZE)(self._normalize_slug)
+
+    def _normalize_slug(self, raw_genre):
         """Funnel alias or raw string into canonical slug."""
         cleaned = raw_genre.lower().strip()
         mapped = self.alias_to_slug.get(cleaned, cleaned)
         mapped = mapped.replace(" ", "-")
         return self.alias_to_slug.get(mapped, mapped)
+
+    def get_canonical_slug(self, raw_genre):
+        """Funnel alias or raw string into canonical slug. Memoized per instance (see __init__)."""
+        return self._slug_cache(raw_genre)
+
+    def slug_cache_stats(self):
+        """Hit/miss counters and size of the get_canonical_slug cache."""
+        info = self._slug_cache.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+    def get_index(self, raw_genre):
+        """Integer genre index for a raw tag or alias, or None if it isn't in the catalog."""
+        return self.slug_to_index.get(self.get_canonical_slug(raw_genre))
+
+    def canonicalize_many(self, tags):
+        """
+        Integer genre indices (rows of self.dna / columns of vote matrices) for many raw
+        tags at once, as an int64 array with -1 where a tag isn't in the catalog.
+        """
+        canonical = self._slug_cache
+        lookup = self.slug_to_index.get
+        return np.fromiter((lookup(canonical(tag), -1) for tag in tags), dtype=np.int64)
         
     def get_canonical_id(self, raw_genre):
-        slug = self.get_canonical_slug(raw_genre)
-        return self.slug_to_id.get(slug)
+        idx = self.get_index(raw_genre)
+        return self.genre_ids[idx] if idx is not None else None
         
     def is_electronic(self, raw_genre):
-        slug = self.get_canonical_slug(raw_genre)
-        # If it's in the explicit map, use its electronic flag
-        if slug in self.slug_to_electronic:
-            return self.slug_to_electronic[slug]
-        return False
+        idx = self.get_index(raw_genre)
+        # If it's in the catalog, use its electronic flag
+        return bool(self.electronic[idx]) if idx is not None else False
+
+    def has_sonic_dna(self, raw_genre):
+        idx = self.get_index(raw_genre)
+        return idx is not None and bool(self.has_dna[idx])
+
+    def vibe_from_votes(self, indices, weights):
+        """
+        Vote-weighted average DNA over genre indices (duplicates simply add up).
+        Genres without DNA are ignored. Returns a float64 vector of len(CATEGORIES), or None.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        if indices.size == 0:
+            return None
+        mask = self.has_dna[indices]
+        weights = weights[mask]
+        total_weight = weights.sum()
+        if not mask.any() or total_weight == 0:
+            return None
+        return (weights @ self.dna[indices[mask]]) / total_weight
+
+    def vibes_from_vote_matrix(self, votes):
+        """
+        Batch form of vibe_from_votes for an (artists x G) scipy.sparse vote matrix.
+        Returns (dna N x 7, valid N bool); rows with no DNA-bearing votes are invalid.
+        """
+        votes = votes.tocsr().astype(np.float64)
+        dna_votes = votes @ sparse.diags(self.has_dna.astype(np.float64))
+        totals = np.asarray(dna_votes.sum(axis=1)).ravel()
+        sums = dna_votes @ self.dna
+        valid = totals != 0
+        out = np.zeros_like(sums)
+        out[valid] = sums[valid] / totals[valid, None]
+        return out, valid
 
 class VibeClassifier:
     """
@@ -76,7 +338,7 @@ class VibeClassifier:
     Axes: [Intensity, Euphoria, Space, Pulse, Chaos, Swing, Bass]
     """
     
-    CATEGORIES = ['intensity', 'euphoria', 'space', 'pulse', 'chaos', 'swing', 'bass']
+    CATEGORIES = CATEGORIES
 
     @classmethod
     def get_artist_vibe_from_votes(cls, genre_votes: dict):
@@ -85,36 +347,16 @@ class VibeClassifier:
         and returns the averaged Hexagon coordinates, weighted directly by their votes.
         """
         manager = GenreManager.get_instance()
-        vectors = []
-        weights = []
         
-        # In case there are duplicates mapping to the same canonical slug, aggregate their votes
-        aggregated_votes = {}
-        for raw, votes in genre_votes.items():
-            slug = manager.get_canonical_slug(raw)
-            if slug in manager.slug_to_dna:
-                aggregated_votes[slug] = aggregated_votes.get(slug, 0) + votes
-                
-        for slug, votes in aggregated_votes.items():
-            vectors.append(manager.slug_to_dna[slug])
-            weights.append(votes)
+        # Duplicates mapping to the same canonical genre simply add up in the dot product
+        indices = manager.canonicalize_many(genre_votes.keys())
+        weights = np.fromiter(genre_votes.values(), dtype=np.float64, count=len(genre_votes))
+        known = indices >= 0
                 
-        if not vectors:
+        vibe = manager.vibe_from_votes(indices[known], weights[known])
+        if vibe is None:
             return None
-            
-        total_weight = sum(weights)
-        if total_weight == 0:
-            return None
-            
-        avg_vibe = {}
-        for category in cls.CATEGORIES:
-            weighted_sum = sum(
-                (v.get(category, 0.0) if isinstance(v, dict) else 0.0) * w 
-                for v, w in zip(vectors, weights)
-            )
-            avg_vibe[category] = weighted_sum / total_weight
-            
-        return {k: round(v, 2) for k, v in avg_vibe.items()}
+        return cls._vibe_to_dict(vibe)
 
     @classmethod
     def get_artist_vibe(cls, genres):
@@ -124,144 +366,355 @@ class VibeClassifier:
         """
         manager = GenreManager.get_instance()
         
-        active_slugs = []
+        # Only use genres that actually have a sonic_dna mapped in the DB
+        active = []
         for g in genres:
-            slug = manager.get_canonical_slug(g)
-            # Only use genres that actually have a sonic_dna mapped in the DB
-            # and verify it is a valid dictionary
-            if slug in manager.slug_to_dna and slug not in active_slugs:
-                active_slugs.append(slug)
+            idx = manager.get_index(g)
+            if idx is not None and manager.has_dna[idx] and idx not in active:
+                active.append(idx)
         
-        if not active_slugs:
+        if not active:
             return None
-            
-        vectors = [manager.slug_to_dna[slug] for slug in active_slugs]
         
         # Calculate weights based on order (first match gets more weight)
-        weights = [1.0 / (i + 1) for i in range(len(vectors))]
-        total_weight = sum(weights)
-        
-        if total_weight == 0:
+        weights = [1.0 / (i + 1) for i in range(len(active))]
+        vibe = manager.vibe_from_votes(active, weights)
+        if vibe is None:
             return None
-        
-        avg_vibe = {}
-        for category in cls.CATEGORIES:
-            # Defensive check: ensure v is a dict and has the category
-            weighted_sum = sum(
-                (v.get(category, 0.0) if isinstance(v, dict) else 0.0) * w 
-                for v, w in zip(vectors, weights)
-            )
-            avg_vibe[category] = weighted_sum / total_weight
-        
-        return {k: round(v, 2) for k, v in avg_vibe.items()}
+        return cls._vibe_to_dict(vibe)
 
     @classmethod
-    def update_user_dna(cls, user_id):
-        load_dotenv()
-        url = os.environ.get("SUPABASE_URL")
-        key = os.environ.get("SUPABASE_KEY")
-        supabase: Client = create_client(url, key)
-        print(f"Fetching sonic DNA and play counts for {user_id}...")
-        
-        response = supabase.table("user_lib").select("count, artists(name, sonic_dna, artist_genres(vote_count, genres(slug)))").eq("user_id", user_id).execute()
-        artist_data_list = []
-        full_artist_info_list = [] # For subgenre extraction
-        
-        for row in response.data:
-            play_count = row.get("count", 1)
-            artist_info = row.get('artists')
-            if not artist_info:
-                continue
-                
-            dna = artist_info.get("sonic_dna")
-            name = artist_info.get("name", "Unknown Artist")
-            
-            # Extract genres and votes from junction table format
-            genres_with_votes = {}
-            ag_list = artist_info.get("artist_genres") or []
-            for ag in ag_list:
-                g = ag.get("genres")
-                vote_count = ag.get("vote_count", 5)
-                if g and g.get("slug"):
-                    genres_with_votes[g["slug"]] = vote_count
-            
-            full_artist_info_list.append({
-                'name': name,
-                'genres_votes': genres_with_votes,
-                'count': play_count
-            })
-            
-            if dna and isinstance(dna, dict):
-                if all(cat in dna for cat in cls.CATEGORIES):
-                    artist_data_list.append({
-                        'name': name,
-                        'dna': dna,
-                        'count': play_count
-                    })
-        
-        user_dna = cls.calculate_user_dna(artist_data_list)
-        user_subgenres = cls.extract_top_subgenres(full_artist_info_list)
-        
-        print(f"📡 Syncing {len(user_subgenres)} subgenres to user profile...")
+    def _vibe_to_dict(cls, vibe):
+        return {cat: round(float(v), 2) for cat, v in zip(cls.CATEGORIES, vibe)}
+
+    @classmethod
+    def read_user_aggregate(cls, user_id, supabase_client=None):
+        """
+        (dna_aggregate, dna_version) as currently stored. Pass it to _save_user_dna as the
+        expected version to make a read-modify-write atomic. On schemas without the
+        dna_version column the version is UNCHECKED.
+        """
+        if supabase_client is None:
+            supabase_client = get_client()
         try:
-            supabase.table("users").update({
-                "sonic_dna": user_dna,
-                "subgenres": user_subgenres
-            }).eq("id", user_id).execute()
+            res = supabase_client.table("users").select("dna_aggregate, dna_version").eq("id", user_id).execute()
+            if not res.data:
+                # No users row: there is nothing to compare-and-set against
+                return None, UNCHECKED
+            return res.data[0].get("dna_aggregate"), res.data[0].get("dna_version")
         except Exception as e:
-            print(f"❌ Error updating user DNA in database: {e}")
-            raise e
-        
+            if not is_missing_column_error(e):
+                print(f"⚠️ Could not read DNA aggregate for {user_id}: {e}")
+                return None, UNCHECKED
+        try:
+            res = supabase_client.table("users").select("dna_aggregate").eq("id", user_id).execute()
+            return (res.data[0].get("dna_aggregate") if res.data else None), UNCHECKED
+        except Exception as e:
+            print(f"⚠️ Could not read DNA aggregate for {user_id}: {e}")
+            return None, UNCHECKED
+
+    @classmethod
+    def update_user_dna(cls, user_id, supabase_client=None):
+        if supabase_client is None:
+            supabase_client = get_client()
+        supabase: Client = supabase_client
+        from artist_store import ArtistDNAStore
+        store = ArtistDNAStore.get_instance(supabase)
+
+        for attempt in range(DNA_WRITE_ATTEMPTS):
+            # The version is read before the library, so a library change that lands
+            # in between makes the write below fail and the rebuild start over
+            _, version = cls.read_user_aggregate(user_id, supabase)
+            print(f"Fetching sonic DNA and play counts for {user_id}...")
+
+            response = supabase.table("user_lib").select("artist_id, count").eq("user_id", user_id).execute()
+            library = [row for row in response.data or [] if row.get("artist_id") is not None]
+            artist_ids = [row["artist_id"] for row in library]
+
+            # Play-count-weighted gather-and-sum over the columnar artist store
+            store.refresh(artist_ids)
+            result = store.aggregate(artist_ids, [row.get("count", 1) for row in library])
+
+            user_dna = result["sonic_dna"]
+            subgenre_weights = result["subgenre_weights"]
+            user_subgenres = cls.normalize_subgenres(subgenre_weights)
+
+            # Running totals so later library changes can be applied incrementally
+            aggregate = {
+                "dna_sum": result["dna_sum"],
+                "dna_plays": int(result["dna_plays"]),
+                "subgenre_weights": subgenre_weights
+            }
+
+            print(f"📡 Syncing {len(user_subgenres)} subgenres to user profile...")
+            # The last attempt writes regardless: a rebuild is correct as of its own read
+            expected = UNCHECKED if attempt == DNA_WRITE_ATTEMPTS - 1 else version
+            if cls._save_user_dna(supabase, user_id, user_dna, user_subgenres, aggregate, expected):
+                break
+            print(f"🔁 DNA for {user_id} changed during the rebuild. Retrying...")
+
         print(f"✅ Successfully updated DNA for {user_id}.")
-        return artist_data_list
+        return result
 
     @classmethod
-    def recalculate_all_artist_dna(cls):
-        load_dotenv()
-        url = os.environ.get("SUPABASE_URL")
-        key = os.environ.get("SUPABASE_KEY")
-        supabase: Client = create_client(url, key)
-        
-        print("🔄 Fetching all artists from database...")
-        response = supabase.table("artists").select("id, name, name_slug, artist_genres(vote_count, genres(slug))").execute()
-        artists = response.data
-        
-        if not artists:
-            print("❌ No artists found in database.")
-            return
+    def _save_user_dna(cls, supabase, user_id, user_dna, user_subgenres, aggregate, expected_version=UNCHECKED):
+        """
+        Writes the profile and aggregate with a fresh dna_version. With an expected version
+        (from read_user_aggregate) the write only happens if nobody else wrote since;
+        returns False when it lost that race.
+        """
+        payload = {
+            "sonic_dna": user_dna,
+            "subgenres": user_subgenres,
+            "dna_aggregate": aggregate
+        }
+        query = supabase.table("users")
+        if expected_version is UNCHECKED:
+            query = query.update(payload).eq("id", user_id)
+        else:
+            query = query.update({**payload, "dna_version": uuid.uuid4().hex}).eq("id", user_id)
+            if expected_version is None:
+                query = query.is_("dna_version", "null")
+            else:
+                query = query.eq("dna_version", expected_version)
+        try:
+            res = query.execute()
+            return expected_version is UNCHECKED or bool(res.data)
+        except Exception as e:
+            if not is_missing_column_error(e):
+                print(f"❌ Error updating user DNA in database: {e}")
+                raise
+            # Older schemas have no dna_aggregate column; keep the profile itself working
+            print(f"⚠️ Could not store DNA aggregate ({e}). Saving profile only...")
+            try:
+                supabase.table("users").update({
+                    "sonic_dna": user_dna,
+                    "subgenres": user_subgenres
+                }).eq("id", user_id).execute()
+                return True
+            except Exception as e:
+                print(f"❌ Error updating user DNA in database: {e}")
+                raise e
 
-        print(f"🧪 Recalculating DNA for {len(artists)} artists using database mappings...")
-        updates = []
-        
-        for artist in artists:
-            ag_list = artist.get("artist_genres") or []
-            genre_votes = {}
-            for ag in ag_list:
-                g = ag.get("genres")
-                vote_count = ag.get("vote_count", 5)
-                if g and g.get("slug"):
-                    genre_votes[g["slug"]] = vote_count
-                    
-            if not genre_votes:
+    @classmethod
+    def apply_user_dna_delta(cls, user_id, changes, supabase_client=None, snapshot=None):
+        """
+        Incrementally updates a user's sonic_dna and subgenres from library changes,
+        without re-reading their whole user_lib.
+        `changes` is a list of {'dna': {...} or None, 'genres_votes': {...}, 'delta': int},
+        where delta is the change in play count (negative for removals).
+        `snapshot` is read_user_aggregate() taken before the library rows were written; the
+        delta is compare-and-set against it, and if anyone else wrote the user's DNA in the
+        meantime (another ingest, a refine thread) this falls back to a full rebuild, which
+        sees every library change. Also rebuilds when no aggregate has been stored yet.
+        """
+        if supabase_client is None:
+            supabase_client = get_client()
+        supabase: Client = supabase_client
+
+        aggregate, version = snapshot if snapshot is not None else cls.read_user_aggregate(user_id, supabase)
+
+        if not aggregate:
+            print(f"🔁 No DNA aggregate for {user_id} yet. Running full rebuild...")
+            return cls.update_user_dna(user_id, supabase)
+
+        dna_sum = {cat: float(aggregate.get("dna_sum", {}).get(cat, 0.0)) for cat in cls.CATEGORIES}
+        dna_plays = aggregate.get("dna_plays", 0)
+        weights = dict(aggregate.get("subgenre_weights") or {})
+
+        for change in changes:
+            delta = change.get('delta', 0)
+            if not delta:
                 continue
-                
-            new_dna = cls.get_artist_vibe_from_votes(genre_votes)
-            if new_dna:
-                updates.append({
-                    "id": artist['id'], 
-                    "name": artist['name'],
-                    "name_slug": artist['name_slug'],
-                    "sonic_dna": new_dna
-                })
-        
-        if updates:
-            print(f"🚀 Syncing {len(updates)} updates to Supabase in batches...")
-            for i in range(0, len(updates), 500):
-                batch = updates[i:i+500]
-                supabase.table("artists").upsert(batch).execute()
-        
-        print(f"✅ Successfully updated DNA for {len(updates)} artists.")
-        return len(updates)
+            dna = change.get('dna')
+            if dna and isinstance(dna, dict) and all(cat in dna for cat in cls.CATEGORIES):
+                for cat in cls.CATEGORIES:
+                    dna_sum[cat] += float(dna.get(cat, 0.0)) * delta
+                dna_plays += delta
+            for sub, share in cls.subgenre_shares(change.get('genres_votes') or {}).items():
+                weights[sub] = weights.get(sub, 0.0) + share * delta
+
+        # Removals can leave float dust behind; drop anything that has effectively hit zero
+        weights = {sub: w for sub, w in weights.items() if w > 1e-9}
+        if dna_plays <= 0:
+            dna_plays = 0
+            dna_sum = {cat: 0.0 for cat in cls.CATEGORIES}
+
+        if dna_plays:
+            user_dna = {cat: round(dna_sum[cat] / dna_plays, 2) for cat in cls.CATEGORIES}
+        else:
+            user_dna = {cat: 0.0 for cat in cls.CATEGORIES}
+        user_subgenres = cls.normalize_subgenres(weights)
+
+        aggregate = {"dna_sum": dna_sum, "dna_plays": dna_plays, "subgenre_weights": weights}
+        if not cls._save_user_dna(supabase, user_id, user_dna, user_subgenres, aggregate, version):
+            print(f"🔁 DNA for {user_id} was updated concurrently. Running full rebuild...")
+            return cls.update_user_dna(user_id, supabase)
+        print(f"✅ Applied {len(changes)} library changes to DNA for {user_id}.")
+        return user_dna
+
+    @classmethod
+    def mark_user_aggregates_stale(cls, artist_ids, supabase_client=None):
+        """
+        Drops the stored DNA aggregate of every user whose library holds one of `artist_ids`.
+        Call it whenever those artists' DNA or genre votes are rewritten: the aggregate
+        only knows the contribution each artist made when it was folded in, so it can't be
+        patched. The next apply_user_dna_delta for those users does a full rebuild instead.
+        """
+        if supabase_client is None:
+            supabase_client = get_client()
+        supabase: Client = supabase_client
+
+        artist_ids = list(dict.fromkeys(artist_ids))
+        user_ids = set()
+        try:
+            for i in range(0, len(artist_ids), 500):
+                res = supabase.table("user_lib").select("user_id").in_("artist_id", artist_ids[i:i+500]).execute()
+                user_ids.update(row["user_id"] for row in res.data or [])
+            user_ids = list(user_ids)
+            # A new dna_version also fails any in-flight compare-and-set on these users
+            stale = {"dna_aggregate": None, "dna_version": uuid.uuid4().hex}
+            for i in range(0, len(user_ids), 500):
+                try:
+                    supabase.table("users").update(stale).in_("id", user_ids[i:i+500]).execute()
+                except Exception as e:
+                    if not is_missing_column_error(e):
+                        raise
+                    stale = {"dna_aggregate": None}
+                    supabase.table("users").update(stale).in_("id", user_ids[i:i+500]).execute()
+        except Exception as e:
+            print(f"⚠️ Could not invalidate DNA aggregates for {len(artist_ids)} changed artists: {e}")
+            return 0
+        if user_ids:
+            print(f"🔁 {len(user_ids)} user DNA aggregate(s) will be rebuilt after artist changes.")
+        return len(user_ids)
+
+    @classmethod
+    def recalculate_all_artist_dna(cls, page_size=500, max_inflight=2, resume=True, checkpoint_path=None, supabase_client=None):
+        """
+        Streams every artist through get_artist_vibe_from_votes and writes back changed DNA.
+        Pages are read with keyset pagination (id > last_id) so the PostgREST row cap never
+        truncates the run. A writer thread upserts page N while page N+1 is fetched, with at
+        most `max_inflight` pages buffered. Artists whose DNA didn't change are skipped. The
+        last fully written id is checkpointed, so an interrupted run resumes where it stopped.
+        """
+        if supabase_client is None:
+            supabase_client = get_client()
+        supabase: Client = supabase_client
+
+        checkpoint_path = checkpoint_path or RECALC_CHECKPOINT_PATH
+        last_id = None
+        if resume and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                last_id = json.load(f).get("last_id")
+            print(f"⏯️ Resuming artist DNA recompute after id {last_id}...")
+
+        write_queue = queue.Queue(maxsize=max_inflight)
+        stats = {"scanned": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        writer_error = []
+
+        def writer():
+            while True:
+                item = write_queue.get()
+                if item is None:
+                    return
+                page_last_id, updates = item
+                try:
+                    if updates:
+                        supabase.table("artists").upsert(updates).execute()
+                        cls.mark_user_aggregates_stale([u["id"] for u in updates], supabase)
+                    os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+                    with open(checkpoint_path, "w") as f:
+                        json.dump({"last_id": page_last_id}, f)
+                except Exception as e:
+                    writer_error.append(e)
+                    # Keep draining so the reader never blocks on a full queue
+                    while write_queue.get() is not None:
+                        pass
+                    return
+
+        writer_thread = threading.Thread(target=writer, daemon=True)
+        writer_thread.start()
+
+        manager = GenreManager.get_instance()
+        print("🔄 Streaming artists from database...")
+        try:
+            while not writer_error:
+                query = supabase.table("artists").select("id, name, name_slug, sonic_dna, artist_genres(vote_count, genres(slug))").order("id").limit(page_size)
+                if last_id is not None:
+                    query = query.gt("id", last_id)
+                artists = query.execute().data or []
+                if not artists:
+                    break
+
+                # Pack the page's genre votes into a sparse (artists x genres) matrix and
+                # recompute every artist's DNA in one product
+                rows, cols, vals = [], [], []
+                for i, artist in enumerate(artists):
+                    ag_list = artist.get("artist_genres") or []
+                    genre_votes = {}
+                    for ag in ag_list:
+                        g = ag.get("genres")
+                        vote_count = ag.get("vote_count", 5)
+                        if g and g.get("slug"):
+                            genre_votes[g["slug"]] = vote_count
+                    for slug, votes in genre_votes.items():
+                        idx = manager.get_index(slug)
+                        if idx is not None:
+                            rows.append(i)
+                            cols.append(idx)
+                            vals.append(votes)
+
+                votes = sparse.csr_matrix((vals, (rows, cols)), shape=(len(artists), len(manager.slugs)))
+                page_dna, valid = manager.vibes_from_vote_matrix(votes)
+
+                updates = []
+                for i, artist in enumerate(artists):
+                    stats["scanned"] += 1
+                    if not valid[i]:
+                        stats["skipped"] += 1
+                        continue
+                        
+                    new_dna = cls._vibe_to_dict(page_dna[i])
+                    if cls._same_dna(artist.get("sonic_dna"), new_dna):
+                        stats["unchanged"] += 1
+                        continue
+
+                    updates.append({
+                        "id": artist['id'], 
+                        "name": artist['name'],
+                        "name_slug": artist['name_slug'],
+                        "sonic_dna": new_dna
+                    })
+
+                stats["updated"] += len(updates)
+                last_id = artists[-1]["id"]
+                write_queue.put((last_id, updates))
+                print(f"   ↳ Scanned {stats['scanned']} artists, {stats['updated']} changed so far...")
+
+                if len(artists) < page_size:
+                    break
+        finally:
+            write_queue.put(None)
+            writer_thread.join()
+
+        if writer_error:
+            print(f"❌ Artist DNA recompute stopped at a failed write: {writer_error[0]}. Rerun to resume.")
+            raise writer_error[0]
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        print(f"✅ Successfully updated DNA for {stats['updated']} artists ({stats['unchanged']} unchanged, {stats['skipped']} without mapped genres).")
+        return stats["updated"]
+
+    @classmethod
+    def _same_dna(cls, old_dna, new_dna):
+        if not old_dna or not isinstance(old_dna, dict):
+            return False
+        try:
+            return all(float(old_dna.get(cat, -1)) == float(new_dna.get(cat, -2)) for cat in cls.CATEGORIES)
+        except (TypeError, ValueError):
+            return False
 
     @classmethod
     def calculate_dna(cls, artist_data_list):
@@ -287,56 +740,65 @@ class VibeClassifier:
         return cls.calculate_dna(artist_data_list)
 
     @classmethod
-    def extract_top_subgenres(cls, artist_info_list):
+    def subgenre_shares(cls, genres_votes):
         """
-        Aggregates subgenres from artist info (name, genres, count).
-        Weights subgenres based on artist frequency.
-        Returns a normalized dict of subgenres.
+        Splits one play of an artist across their electronic subgenres,
+        proportionally to votes. Returns {slug: share} summing to 1, or {}.
         """
         manager = GenreManager.get_instance()
-        subgenre_weights = {}
-        
-        for artist in artist_info_list:
-            genres_votes = artist.get('genres_votes', {})
-            count = artist.get('count', 1)
-            
-            mapped_subgenres = {}
-            for raw, votes in genres_votes.items():
-                slug = manager.get_canonical_slug(raw)
-                
-                # Hard filter overly generic genres (electronic, rave)
-                if slug in ["electronic", "rave"]:
-                    continue
-
-                # Include all electronic subgenres in the distribution, 
-                # even if we don't have DNA coordinates for them yet.
-                if manager.is_electronic(slug):
-                    if slug not in mapped_subgenres:
-                        mapped_subgenres[slug] = votes
-                    else:
-                        mapped_subgenres[slug] += votes
+        mapped_subgenres = {}
+        for raw, votes in genres_votes.items():
+            slug = manager.get_canonical_slug(raw)
             
-            if not mapped_subgenres:
-                continue
-                
-            total_artist_weight = sum(mapped_subgenres.values())
-            if total_artist_weight == 0:
+            # Hard filter overly generic genres (electronic, rave)
+            if slug in ["electronic", "rave"]:
                 continue
+
+            # Include all electronic subgenres in the distribution, 
+            # even if we don't have DNA coordinates for them yet.
+            if manager.is_electronic(slug):
+                if slug not in mapped_subgenres:
+                    mapped_subgenres[slug] = votes
+                else:
+                    mapped_subgenres[slug] += votes
+        
+        if not mapped_subgenres:
+            return {}
             
-            for sub, w in mapped_subgenres.items():
-                contribution = (w / total_artist_weight) * count
-                subgenre_weights[sub] = subgenre_weights.get(sub, 0.0) + contribution
+        total_artist_weight = sum(mapped_subgenres.values())
+        if total_artist_weight == 0:
+            return {}
         
+        return {sub: w / total_artist_weight for sub, w in mapped_subgenres.items()}
+
+    @classmethod
+    def accumulate_subgenre_weights(cls, artist_info_list):
+        """Unnormalized {slug: weight} across artists, each weighted by play count."""
+        subgenre_weights = {}
+        for artist in artist_info_list:
+            count = artist.get('count', 1)
+            for sub, share in cls.subgenre_shares(artist.get('genres_votes', {})).items():
+                contribution = share * count
+                subgenre_weights[sub] = subgenre_weights.get(sub, 0.0) + contribution
+        return subgenre_weights
+
+    @classmethod
+    def normalize_subgenres(cls, subgenre_weights):
+        """Sorts subgenre weights descending and scales them so the top one is 1.0."""
         if not subgenre_weights:
             return {}
             
         sorted_subgenres = sorted(subgenre_weights.items(), key=lambda x: x[1], reverse=True)
-        top_subgenres = sorted_subgenres
-        
-        if not top_subgenres:
+        max_weight = sorted_subgenres[0][1]
+        if max_weight <= 0:
             return {}
-            
-        max_weight = top_subgenres[0][1]
-        normalized_vector = {sub: round(w / max_weight, 3) for sub, w in top_subgenres}
-        
-        return normalized_vector
\ No newline at end of file
+        return {sub: round(w / max_weight, 3) for sub, w in sorted_subgenres}
+
+    @classmethod
+    def extract_top_subgenres(cls, artist_info_list):
+        """
+        Aggregates subgenres from artist info (name, genres, count).
+        Weights subgenres based on artist frequency.
+        Returns a normalized dict of subgenres.
+        """
+        return cls.normalize_subgenres(cls.accumulate_subgenre_weights(artist_info_list))
@@ -1,13 +1,13 @@
 import os
 import math
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import Client
+from db_client import get_client
+from festival_cache import FestivalCatalogCache
 
 # 1. Setup Connection
 load_dotenv()
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
+supabase: Client = get_client()
 
 def get_user_artists(user_id="demo_user"):
     """Fetches identifying artist names and play counts from user_lib."""
@@ -34,9 +34,12 @@ def get_user_data(user_id="demo_user"):
 def get_all_festivals():
     """Fetches all festivals including lineup, sonic_dna, subgenres, and coordinates."""
     print("Fetching festivals...")
-    response = supabase.table("festivals").select("name, event_artists(artists(name)), sonic_dna, subgenres, lat, lng, location, start_date, end_date, size, type, tba, state, country").execute()
+    response = supabase.table("festivals").select("id, name, event_artists(artists(name)), sonic_dna, subgenres, lat, lng, location, start_date, end_date, size, type, tba, state, country").execute()
     return response.data
 
+# Parsed catalog stays in memory until festivalscrape / festival_aggregator change it
+festival_cache = FestivalCatalogCache(supabase, get_all_festivals)
+
 def cosine_similarity(vec1, vec2):
     """
     Calculates cosine similarity between two sparse subgenre vectors (JSONB dicts).
@@ -93,86 +96,30 @@ def calculate_hybrid_score(user_data, festival_data):
     hybrid_score = (0.7 * s_score) + (0.3 * a_score)
     return round(hybrid_score * 100, 2)
 
-def run_matching_engine(user_id="demo_user"):
+def run_matching_engine(user_id="demo_user", limit=None, date_from=None, date_to=None,
+                        lat=None, lng=None, radius_km=None, country=None, after=None, fields=None):
+    """
+    Best-first festival matches for a user. Optional filters (date window, radius around
+    lat/lng, country) narrow the catalog through FestivalMatrix's indexes before anything
+    is scored; `limit` keeps only the top matches, so only those are built.
+    `after` and `fields` page and project the results (see FestivalMatrix.score).
+    """
     user_artists_map = get_user_artists(user_id)
     user_data = get_user_data(user_id)
-    festivals = get_all_festivals()
     
     if not user_artists_map or not user_data:
         print("Missing user data. Make sure DNA and Subgenres are synced!")
         return []
 
-    match_scores = []
-
-    for fest in festivals:
-        fest_name = fest.get('name', 'Unknown Festival')
-        event_artists = fest.get('event_artists', [])
-        raw_lineup = []
-        if event_artists:
-            for ea in event_artists:
-                if ea.get('artists') and ea['artists'].get('name'):
-                    raw_lineup.append(ea['artists']['name'])
-        
-        lineup_set = set([artist.lower().strip() for artist in raw_lineup])
-        if len(lineup_set) == 0:
-            continue
-            
-        # 1. Hybrid Vibe/Culture Score
-        synergy_percentage = calculate_hybrid_score(user_data, fest)
-            
-        # 2. Artist Overlap Score (Logarithmic)
-        overlap = set(user_artists_map.keys()) & lineup_set
-        artist_score_sum = 0
-        for artist in overlap:
-            count = user_artists_map[artist]
-            score = math.log(count + 1, 1.75)
-            artist_score_sum += score
-
-        # 3. Final Scoring with Saturation
-        artist_perc = (len(overlap) / len(lineup_set)) * 100
-        
-        if len(overlap) <= 2:
-            sat_mult = 1.0
-        elif len(overlap) <= 9:
-            sat_mult = 1.5
-        else:
-            sat_mult = 2.0
-            
-        base_artist_score = artist_score_sum * sat_mult
-        
-        # Scaling: Synergy acts as the final "multiplier" filter
-        total_score = base_artist_score * (synergy_percentage / 100)
-        
-        sorted_overlap = sorted(list(overlap), key=lambda x: user_artists_map.get(x, 0), reverse=True)
-        other_artists = lineup_set - overlap
-        sorted_other = sorted(list(other_artists))
-        
+    # Whole catalog is scored at once: DNA, subgenres and lineups are packed into matrices
+    matrix = festival_cache.get_matrix()
+    rows = matrix.candidates(date_from=date_from, date_to=date_to, lat=lat, lng=lng, radius_km=radius_km, country=country)
+    return matrix.score(user_artists_map, user_data, k=limit, rows=rows, after=after, fields=fields)
 
-        match_scores.append({
-            'festival': fest_name,
-            'total_match': total_score,
-            'artist_score': base_artist_score,
-            'artist_perc': artist_perc,
-            'synergy_match': synergy_percentage,
-            'matched_count': len(overlap),
-            'total_artists': len(lineup_set),
-            'shared_artists': [name.title() for name in sorted_overlap],
-            'other_artists': [name.title() for name in sorted_other],
-            'lat': fest.get('lat'),
-            'lng': fest.get('lng'),
-            'location': fest.get('location'),
-            'start_date': fest.get('start_date'),
-            'size': fest.get('size'),
-            'type': fest.get('type'),
-            'fest_subgenres': fest.get('subgenres'),
-            'tba': fest.get('tba'),
-            'end_date': fest.get('end_date'),
-            'state': fest.get('state'),
-            'country': fest.get('country')
-        })
-        
-    match_scores.sort(key=lambda x: x['total_match'], reverse=True)
-    return match_scores
+def get_festival_lineup(festival_id, user_id=None):
+    """A festival's lineup split into the user's artists and the rest; None if unknown."""
+    user_artists_map = get_user_artists(user_id) if user_id else {}
+    return festival_cache.get_matrix().lineup(festival_id, user_artists_map)
 
 # --- RUN THE SCRIPT ---
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+import os
+import csv
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from artists_categorize import bulk_categorize_artists
+
+load_dotenv()
+
+# Unique artists per categorization chunk, and how many chunks may be in flight while parsing continues
+CSV_CHUNK_SIZE = int(os.environ.get("CSV_CHUNK_SIZE", 200))
+CSV_MAX_INFLIGHT = int(os.environ.get("CSV_MAX_INFLIGHT", 2))
+
+ARTIST_COLUMN = "Artist Name(s)"
+GENRES_COLUMN = "Genres"
+
+
+def iter_csv_columns(path, columns):
+    """
+    Streams a CSV yielding only the requested columns, as a tuple per row.
+    Missing columns come back as "". Handles the BOM Spotify exports start with.
+    """
+    with open(path, mode='r', encoding='utf-8-sig', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return
+        positions = {name.strip(): i for i, name in enumerate(header)}
+        indices = [positions.get(col) for col in columns]
+        for row in reader:
+            yield tuple(row[i] if i is not None and i < len(row) else "" for i in indices)
+
+
+def liked_song_artists(artists_raw, genres_raw):
+    """(name, csv genres) pairs for one liked-songs row, in app.add_playlist's format."""
+    csv_genres_list = []
+    if genres_raw:
+        csv_genres_list = [g.strip().lower().replace(" ", "-") for g in genres_raw.split(',') if g.strip()]
+    return [(a.strip(), csv_genres_list) for a in artists_raw.split(';') if a.strip()]
+
+
+class StreamingArtistIngest:
+    """
+    Streams a CSV into categorization. Only the needed columns are kept, artists are
+    deduped on the fly, and every `chunk_size` new artists are handed to
+    bulk_categorize_artists on a worker while parsing continues. At most `max_inflight`
+    chunks are pending, so a huge export never has more than that buffered ahead of
+    Last.fm. Per-artist occurrence counts are final once run() returns. With
+    fetch_missing=False only artists already in Supabase are categorized; the rest are
+    left to the caller (see `first_seen`).
+    """
+
+    def __init__(self, supabase_client, filter_electronic=False, chunk_size=None, max_inflight=None, key=None, fetch_missing=True):
+        self.supabase = supabase_client
+        self.filter_electronic = filter_electronic
+        self.fetch_missing = fetch_missing
+        self.chunk_size = chunk_size or CSV_CHUNK_SIZE
+        self.max_inflight = max_inflight or CSV_MAX_INFLIGHT
+        self.key = key or (lambda name: name.lower().strip())
+
+        self.counts = {}      # dedupe key -> occurrences
+        self.first_seen = {}  # dedupe key -> (name, fallback genres) as first read
+        self.results = {}     # artist name -> categorized dict
+        self.rows_read = 0
+        self._lock = threading.Lock()
+
+    def _categorize_chunk(self, chunk):
+        categorized = bulk_categorize_artists(chunk, self.supabase, fetch_missing=self.fetch_missing)
+        with self._lock:
+            self.results.update(categorized)
+
+    def run(self, rows, extract):
+        """
+        `rows` is any iterable of parsed rows (see iter_csv_columns); `extract(row)` returns
+        the row's (name, fallback genres) pairs. Returns the categorized artists by name.
+        """
+        slots = threading.BoundedSemaphore(self.max_inflight)
+        futures = []
+        pending = []
+
+        def submit(chunk):
+            slots.acquire()
+            future = executor.submit(self._categorize_chunk, chunk)
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+
+        with ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix="csv-ingest") as executor:
+            for row in rows:
+                self.rows_read += 1
+                for name, genres in extract(row):
+                    norm_name = self.key(name)
+                    if norm_name in self.counts:
+                        self.counts[norm_name] += 1
+                        continue
+                    self.counts[norm_name] = 1
+                    self.first_seen[norm_name] = (name, genres)
+                    pending.append((name, genres, self.filter_electronic))
+                    if len(pending) >= self.chunk_size:
+                        submit(pending)
+                        pending = []
+            if pending:
+                submit(pending)
+
+            # Surface worker errors
+            for future in futures:
+                future.result()
+
+        print(f"📄 Parsed {self.rows_read} rows into {len(self.counts)} unique artists ({len(futures)} chunks).")
+        return self.results
+
+    def count_for(self, name):
+        return self.counts.get(self.key(name), 0)
@@ -0,0 +1,103 @@
+import os
+import threading
+import httpx
+from dotenv import load_dotenv
+from supabase import create_client as create_supabase_client
+
+load_dotenv()
+
+# Pool limits for the shared keep-alive HTTP transport
+POOL_MAX_CONNECTIONS = int(os.environ.get("SUPABASE_POOL_MAX_CONNECTIONS", 20))
+POOL_MAX_KEEPALIVE = int(os.environ.get("SUPABASE_POOL_MAX_KEEPALIVE", 10))
+POOL_KEEPALIVE_EXPIRY = float(os.environ.get("SUPABASE_POOL_KEEPALIVE_EXPIRY", 30))
+HTTP_TIMEOUT = float(os.environ.get("SUPABASE_HTTP_TIMEOUT", 30))
+
+# PostgREST/Postgres codes for a column the schema doesn't have (read / write)
+MISSING_COLUMN_CODES = {"42703", "PGRST204"}
+
+_client = None
+_http = None
+_lock = threading.Lock()
+
+
+def _create_http_client():
+    return httpx.Client(
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def create_client(url=None, key=None, http_client=None):
+    """
+    Drop-in for supabase.create_client. When SUPABASE_LOCAL_DB is set (a SQLite
+    path, or ":memory:"), returns the shared LocalSupabaseClient for that path
+    instead, so benchmarks and load tests run the real code paths offline.
+    `http_client` is an httpx.Client for the PostgREST/auth/storage calls.
+    """
+    local_path = os.environ.get("SUPABASE_LOCAL_DB")
+    if local_path:
+        from local_supabase import get_local_client
+        return get_local_client(local_path)
+
+    url = url or os.environ.get("SUPABASE_URL")
+    key = key or os.environ.get("SUPABASE_KEY")
+    if http_client is None:
+        return create_supabase_client(url, key)
+
+    try:
+        from supabase import ClientOptions
+        options = ClientOptions(httpx_client=http_client)
+    except TypeError:
+        # supabase-py before httpx_client support: fall back to its own transport
+        print("⚠️ supabase-py can't take a shared httpx client; using a per-client transport.")
+        return create_supabase_client(url, key)
+    return create_supabase_client(url, key, options=options)
+
+
+def is_missing_column_error(error):
+    """
+    True when a PostgREST error says the column doesn't exist, i.e. an older schema.
+    Network errors, timeouts and 5xx responses are not, and should not switch a caller
+    onto its legacy-schema fallback.
+    """
+    return str(getattr(error, "code", None)) in MISSING_COLUMN_CODES
+
+
+def get_client():
+    """
+    The process-wide Supabase client. Built once, on a pooled keep-alive httpx
+    transport, so repeated syncs and API requests reuse connections instead of
+    paying a TLS handshake each time. Safe to share across worker threads.
+    """
+    global _client, _http
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is None:
+            http = None if os.environ.get("SUPABASE_LOCAL_DB") else _create_http_client()
+            client = create_client(http_client=http)
+            # The PostgREST sub-client is created lazily; build it here, under the lock
+            getattr(client, "postgrest", None)
+            _http = http
+            _client = client
+    return _client
+
+
+def close_client():
+    """
+    Closes the shared transport and its artist lookup batcher (e.g. on API shutdown).
+    The next get_client() starts fresh.
+    """
+    global _client, _http
+    with _lock:
+        if _client is not None:
+            from lookup_batcher import close_lookup_batcher
+            close_lookup_batcher(_client)
+        if _http is not None:
+            _http.close()
+        _client = None
+        _http = None
@@ -1,9 +1,11 @@
 import os
-import csv
 import glob
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-from supabase import create_client, Client
-from artists_categorize import categorize_artist, bulk_categorize_artists, sync_artists_to_supabase, ArtistCleaner
+from supabase import Client
+from db_client import get_client, is_missing_column_error
+from artists_categorize import sync_artists_to_supabase, ArtistCleaner
+from csv_ingest import StreamingArtistIngest, iter_csv_columns, ARTIST_COLUMN
 
 load_dotenv()
 
@@ -15,7 +17,18 @@ if not url or not key:
     print("Error: Supabase URL or Key is missing from .env")
     exit(1)
 
-supabase: Client = create_client(url, key)
+supabase: Client = get_client()
+
+def lineup_row_artists(row):
+    """Cleaned (name, no fallback genres) pairs from one lineup CSV row."""
+    artists_str = row[0]
+    if not artists_str:
+        return []
+    # 1. Split by semicolon to separate collaborations
+    collaborators = [name.strip() for name in artists_str.split(';')]
+    # 2. Use shared cleaner to handle &, x, b2b, and sub-groupings
+    cleaned_names, _ = ArtistCleaner.clean_lineup(collaborators)
+    return [(name, []) for name in cleaned_names]
 
 def aggregate_csv_festivals():
     # Find all CSV files in the FestivalCSV folder
@@ -30,33 +43,15 @@ def aggregate_csv_festivals():
         filename = os.path.basename(filepath)
         festival_name = filename.replace('.csv', '').replace('_', ' ')
         
-        unique_artists_counts = {} # name -> count
-        
-        with open(filepath, mode='r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            
-            for row in reader:
-                # The column with artist names is usually 'Artist Name(s)'
-                artists_str = row.get('Artist Name(s)', '')
-                if artists_str:
-                    # 1. Split by semicolon to separate collaborations
-                    collaborators = [name.strip() for name in artists_str.split(';')]
-                    # 2. Use shared cleaner to handle &, x, b2b, and sub-groupings
-                    cleaned_names, _ = ArtistCleaner.clean_lineup(collaborators)
-                    for name in cleaned_names:
-                        unique_artists_counts[name] = unique_artists_counts.get(name, 0) + 1
-        
-        artists_list = list(unique_artists_counts.keys())
-        print(f"\n[{festival_name}] Found {len(artists_list)} unique artists ({sum(unique_artists_counts.values())} total entries).")
-        
-        # Phase 1: Categorize all artists (Using optimized bulk lookup)
-        print(f"[{festival_name}] Categorizing artists...")
-        
-        # Prepare requests: (name, fallback_genres, filter_electronic)
+        # Phase 1: Stream the lineup CSV and categorize artists in chunks as they're found
         # We set filter_electronic=False for festival lineups
-        requests = [(name, [], False) for name in artists_list]
+        print(f"\n[{festival_name}] Categorizing artists...")
+        ingest = StreamingArtistIngest(supabase, filter_electronic=False, key=lambda name: name)
+        festival_artists_dict = ingest.run(iter_csv_columns(filepath, [ARTIST_COLUMN]), lineup_row_artists)
+        unique_artists_counts = ingest.counts # name -> count
         
-        festival_artists_dict = bulk_categorize_artists(requests, supabase)
+        artists_list = list(unique_artists_counts.keys())
+        print(f"[{festival_name}] Found {len(artists_list)} unique artists ({sum(unique_artists_counts.values())} total entries).")
                 
         # Phase 2: Sync to artists database
         print(f"[{festival_name}] Syncing {len(festival_artists_dict)} artists to Supabase 'artists' table...")
@@ -65,29 +60,23 @@ def aggregate_csv_festivals():
         # Phase 3: Calculate Festival DNA and Subgenre Vector
         print(f"[{festival_name}] Calculating aggregate Sonic DNA & Subgenres...")
         from classifier import VibeClassifier
-        
-        artist_dna_list = []
-        artist_info_list = [] # For subgenre extraction
-        
-        for name, artist_data in festival_artists_dict.items():
-            dna = artist_data.get('sonic_dna')
-            genres = artist_data.get('genres', [])
-            count = unique_artists_counts.get(name, 1)
-            
-            if dna and any(val > 0 for val in dna.values()):
-                artist_dna_list.append({
-                    'dna': dna,
-                    'count': count
-                })
-            
-            artist_info_list.append({
-                'name': name,
-                'genres': genres,
-                'count': count
-            })
-        
-        festival_dna = VibeClassifier.calculate_dna(artist_dna_list)
-        festival_subgenres = VibeClassifier.extract_top_subgenres(artist_info_list, limit=25)
+        from artist_store import ArtistDNAStore
+
+        # Gather-and-sum over the columnar artist store, weighted by lineup occurrences
+        store = ArtistDNAStore.get_instance(supabase)
+        slug_to_id = store.refresh_slugs(name.lower().replace(" ", "-") for name in festival_artists_dict)
+        lineup_ids, lineup_counts = [], []
+        for name in festival_artists_dict:
+            artist_id = slug_to_id.get(name.lower().replace(" ", "-"))
+            if artist_id is not None:
+                lineup_ids.append(artist_id)
+                lineup_counts.append(unique_artists_counts.get(name, 1))
+        result = store.aggregate(lineup_ids, lineup_counts, require_positive=True)
+
+        festival_dna = result['sonic_dna']
+        festival_subgenres = VibeClassifier.normalize_subgenres(result['subgenre_weights'])
+        if festival_subgenres and len(festival_subgenres) > 25:
+            festival_subgenres = dict(list(festival_subgenres.items())[:25])
         
         print(f"[{festival_name}] Calculated DNA: {festival_dna}")
         print(f"[{festival_name}] Calculated Subgenres: {len(festival_subgenres)} keys")
@@ -98,12 +87,21 @@ def aggregate_csv_festivals():
             "name": festival_name,
             "lineup": artists_list,
             "sonic_dna": festival_dna,
-            "subgenres": festival_subgenres
+            "subgenres": festival_subgenres,
+            # Bumps the catalog watermark the API's festival cache watches
+            "updated_at": datetime.now(timezone.utc).isoformat()
         }
         
         try:
             # Insert since there is no unique constraint on the 'name' column
-            response = supabase.table("festivals").insert(payload).execute()
+            try:
+                response = supabase.table("festivals").insert(payload).execute()
+            except Exception as e:
+                # Schemas without festivals.updated_at: write the rest of the row
+                if not is_missing_column_error(e):
+                    raise
+                payload.pop("updated_at")
+                response = supabase.table("festivals").insert(payload).execute()
         except Exception as e:
             print(f"Failed to upload {festival_name}: {e}")
 
@@ -0,0 +1,88 @@
+import os
+import time
+import threading
+from dotenv import load_dotenv
+
+from festival_matrix import FestivalMatrix
+
+load_dotenv()
+
+
+class FestivalCatalogCache:
+    """
+    Keeps the parsed festival catalog (a FestivalMatrix) in process memory.
+    The expensive festivals + event_artists join only reruns when the catalog
+    watermark changes: the newest festivals.updated_at plus the row count
+    (so deletes are noticed too). The watermark itself is checked at most once
+    per `check_interval` seconds, so most requests pay for scoring only.
+    """
+
+    def __init__(self, supabase_client, loader, check_interval=None, fallback_ttl=None):
+        self.supabase = supabase_client
+        self.loader = loader
+        self.check_interval = float(check_interval if check_interval is not None else os.environ.get("FESTIVAL_CACHE_CHECK_SECONDS", 30))
+        # Used when the watermark can't be read (e.g. no updated_at column yet)
+        self.fallback_ttl = float(fallback_ttl if fallback_ttl is not None else os.environ.get("FESTIVAL_CACHE_TTL_SECONDS", 300))
+
+        self.matrix = None
+        self.watermark = None
+        self.built_at = 0.0
+        self.last_check = 0.0
+
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+
+    def _fetch_watermark(self):
+        try:
+            latest = self.supabase.table("festivals").select("updated_at").order("updated_at", desc=True).limit(1).execute()
+            counted = self.supabase.table("festivals").select("id", count="exact").limit(1).execute()
+            latest_ts = latest.data[0].get("updated_at") if latest.data else None
+            return (latest_ts, counted.count)
+        except Exception as e:
+            print(f"⚠️ Could not read festival catalog watermark: {e}")
+            return None
+
+    def _is_fresh(self, watermark, now):
+        if self.matrix is None:
+            return False
+        if watermark is None:
+            return now - self.built_at < self.fallback_ttl
+        return watermark == self.watermark
+
+    def get_matrix(self):
+        now = time.time()
+        with self._lock:
+            if self.matrix is not None and now - self.last_check < self.check_interval:
+                return self.matrix
+
+        watermark = self._fetch_watermark()
+        with self._lock:
+            self.last_check = now
+            if self._is_fresh(watermark, now):
+                return self.matrix
+            stale = self.matrix
+
+        # Only one thread rebuilds; everyone else keeps serving the previous catalog meanwhile
+        if not self._rebuild_lock.acquire(blocking=stale is None):
+            return stale
+        try:
+            with self._lock:
+                if self.matrix is not stale:
+                    return self.matrix
+            print("🎪 Festival catalog changed. Rebuilding matrix...")
+            matrix = FestivalMatrix(self.loader())
+            with self._lock:
+                self.matrix = matrix
+                self.watermark = watermark
+                self.built_at = time.time()
+            print(f"✅ Cached {len(matrix)} festivals.")
+            return matrix
+        finally:
+            self._rebuild_lock.release()
+
+    def invalidate(self):
+        with self._lock:
+            self.watermark = None
+            self.built_at = 0.0
+            self.last_check = 0.0
+            self.matrix = None
@@ -0,0 +1,375 @@
+import math
+import numpy as np
+from scipy import sparse
+
+# Same order as VibeClassifier.CATEGORIES (kept local so this module has no DB imports)
+CATEGORIES = ['intensity', 'euphoria', 'space', 'pulse', 'chaos', 'swing', 'bass']
+
+# Festivals without DNA get this distance, matching calculate_hybrid_score
+MISSING_DNA_DISTANCE = 10.0
+
+# Spatial grid for radius prefiltering: cells are GRID_CELL_DEGREES on a side
+GRID_CELL_DEGREES = 1.0
+GRID_COLUMNS = int(round(360 / GRID_CELL_DEGREES))
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Everything a match dict can carry; the two lineup lists are by far the largest
+MATCH_FIELDS = (
+    'id', 'festival', 'total_match', 'artist_score', 'artist_perc', 'synergy_match',
+    'matched_count', 'total_artists', 'shared_artists', 'other_artists',
+    'lat', 'lng', 'location', 'start_date', 'size', 'type', 'fest_subgenres',
+    'tba', 'end_date', 'state', 'country',
+)
+LINEUP_FIELDS = ('shared_artists', 'other_artists')
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_day(value):
+    """'YYYY-MM-DD...' (or a date) -> numpy day, NaT if missing or unparseable."""
+    if value is None or value == "":
+        return np.datetime64("NaT", "D")
+    try:
+        return np.datetime64(str(value)[:10], "D")
+    except ValueError:
+        return np.datetime64("NaT", "D")
+
+
+def _grid_cell(lat, lng):
+    row = np.floor((np.asarray(lat) + 90) / GRID_CELL_DEGREES).astype(np.int64)
+    col = np.floor(((np.asarray(lng) + 180) % 360) / GRID_CELL_DEGREES).astype(np.int64) % GRID_COLUMNS
+    return row, col
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km; vectorized over array arguments."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class FestivalMatrix:
+    """
+    Packs the festival catalog into arrays so one user can be scored against
+    every festival with a handful of matrix ops:
+      - dna:      N x 7 dense sonic DNA
+      - subs:     N x G sparse subgenre weights over the genre vocabulary
+      - lineups:  N x A CSR artist-incidence matrix over the lineup vocabulary
+    Produces the same total_match / synergy_match / artist_score values as the
+    per-festival loop it replaces.
+
+    candidates() narrows the catalog before scoring, using a lat/lng grid index
+    (radius), start dates sorted once at build time (date window) and a country
+    index, so a filtered request only scores the festivals it can return.
+    """
+
+    def __init__(self, festivals):
+        self.festivals = []
+        self.artist_names = []
+        self.artist_index = {}
+        self.genre_index = {}
+
+        lineup_rows, lineup_cols = [], []
+        sub_rows, sub_cols, sub_vals = [], [], []
+        dna_rows = []
+        has_dna = []
+
+        for fest in festivals:
+            lineup_set = set()
+            for ea in fest.get('event_artists') or []:
+                if ea.get('artists') and ea['artists'].get('name'):
+                    lineup_set.add(ea['artists']['name'].lower().strip())
+            if not lineup_set:
+                continue
+
+            row = len(self.festivals)
+            meta = {k: v for k, v in fest.items() if k != 'event_artists'}
+            self.festivals.append(meta)
+
+            for name in lineup_set:
+                col = self.artist_index.get(name)
+                if col is None:
+                    col = len(self.artist_names)
+                    self.artist_index[name] = col
+                    self.artist_names.append(name)
+                lineup_rows.append(row)
+                lineup_cols.append(col)
+
+            for slug, weight in (fest.get('subgenres') or {}).items():
+                col = self.genre_index.setdefault(slug, len(self.genre_index))
+                sub_rows.append(row)
+                sub_cols.append(col)
+                sub_vals.append(float(weight))
+
+            fest_dna = fest.get('sonic_dna')
+            has_dna.append(bool(fest_dna))
+            dna_rows.append([float(fest_dna.get(cat, 0)) for cat in CATEGORIES] if fest_dna else [0.0] * len(CATEGORIES))
+
+        n = len(self.festivals)
+        self.lineups = sparse.csr_matrix(
+            (np.ones(len(lineup_rows)), (lineup_rows, lineup_cols)),
+            shape=(n, len(self.artist_names))
+        )
+        self.lineup_sizes = np.diff(self.lineups.indptr)
+
+        self.subs = sparse.csr_matrix(
+            (np.asarray(sub_vals, dtype=np.float64), (sub_rows, sub_cols)),
+            shape=(n, len(self.genre_index))
+        )
+        self.sub_norms = np.sqrt(np.asarray(self.subs.multiply(self.subs).sum(axis=1)).ravel())
+
+        self.dna = np.asarray(dna_rows, dtype=np.float64).reshape(n, len(CATEGORIES))
+        self.has_dna = np.asarray(has_dna, dtype=bool)
+        self.id_index = {str(f['id']): row for row, f in enumerate(self.festivals) if f.get('id') is not None}
+
+        self._build_filter_indexes()
+
+    def _build_filter_indexes(self):
+        fests = self.festivals
+        self.lat = np.array([_to_float(f.get('lat')) for f in fests], dtype=np.float64)
+        self.lng = np.array([_to_float(f.get('lng')) for f in fests], dtype=np.float64)
+        self.start = np.array([_to_day(f.get('start_date')) for f in fests], dtype="datetime64[D]")
+        end = np.array([_to_day(f.get('end_date')) for f in fests], dtype="datetime64[D]")
+        # One-day festivals often have no end date
+        self.end = np.where(np.isnat(end), self.start, end)
+
+        # Grid cell -> festival rows
+        self.grid = {}
+        located = np.flatnonzero(~np.isnan(self.lat) & ~np.isnan(self.lng))
+        cell_rows, cell_cols = _grid_cell(self.lat[located], self.lng[located])
+        for row, cell in zip(located.tolist(), zip(cell_rows.tolist(), cell_cols.tolist())):
+            self.grid.setdefault(cell, []).append(row)
+        self.grid = {cell: np.asarray(rows, dtype=np.int64) for cell, rows in self.grid.items()}
+
+        # Festivals with a start date, ordered by it
+        dated = np.flatnonzero(~np.isnat(self.start))
+        self.date_order = dated[np.argsort(self.start[dated], kind='stable')]
+        self.sorted_starts = self.start[self.date_order]
+
+        self.country_index = {}
+        for row, fest in enumerate(fests):
+            country = (fest.get('country') or "").strip().lower()
+            if country:
+                self.country_index.setdefault(country, []).append(row)
+        self.country_index = {c: np.asarray(rows, dtype=np.int64) for c, rows in self.country_index.items()}
+
+    def _rows_within(self, lat, lng, radius_km):
+        """Festival rows within radius_km of (lat, lng): grid cells first, then exact distance."""
+        lat_span = radius_km / KM_PER_DEGREE
+        lat_lo, lat_hi = max(lat - lat_span, -90.0), min(lat + lat_span, 90.0)
+        row_lo, _ = _grid_cell(lat_lo, 0.0)
+        row_hi, _ = _grid_cell(lat_hi, 0.0)
+        widest = math.cos(math.radians(max(abs(lat_lo), abs(lat_hi))))
+        if widest <= 1e-6 or lat_span / widest >= 180:
+            cols = range(GRID_COLUMNS)
+        else:
+            lng_span = lat_span / widest
+            _, col_lo = _grid_cell(0.0, lng - lng_span)
+            n_cols = int(math.ceil(2 * lng_span / GRID_CELL_DEGREES)) + 1
+            cols = [(int(col_lo) + i) % GRID_COLUMNS for i in range(min(n_cols, GRID_COLUMNS))]
+
+        found = [self.grid[(r, c)] for r in range(int(row_lo), int(row_hi) + 1) for c in cols if (r, c) in self.grid]
+        if not found:
+            return np.array([], dtype=np.int64)
+        rows = np.concatenate(found)
+        return rows[haversine_km(lat, lng, self.lat[rows], self.lng[rows]) <= radius_km]
+
+    def _rows_in_window(self, date_from, date_to):
+        """Festival rows overlapping [date_from, date_to]; either end may be None (open)."""
+        hi = len(self.date_order) if date_to is None else np.searchsorted(self.sorted_starts, _to_day(date_to), side='right')
+        rows = self.date_order[:hi]
+        if date_from is not None:
+            rows = rows[self.end[rows] >= _to_day(date_from)]
+        return rows
+
+    def candidates(self, date_from=None, date_to=None, lat=None, lng=None, radius_km=None, country=None):
+        """
+        Festival rows passing every given filter, in catalog order, or None when no
+        filter is set. Festivals missing the field a filter needs are excluded by it.
+        """
+        selected = None
+
+        def narrow(rows):
+            nonlocal selected
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+
+        if country:
+            narrow(self.country_index.get(country.strip().lower(), np.array([], dtype=np.int64)))
+        if lat is not None and lng is not None and radius_km is not None:
+            narrow(self._rows_within(float(lat), float(lng), float(radius_km)))
+        if date_from is not None or date_to is not None:
+            narrow(self._rows_in_window(date_from, date_to))
+        return None if selected is None else np.sort(selected)
+
+    def __len__(self):
+        return len(self.festivals)
+
+    def synergy_scores(self, user_data, rows=None):
+        """
+        Vectorized calculate_hybrid_score against every festival, or just `rows`
+        (percent, rounded to 2dp).
+        """
+        subs, sub_norms, fest_dna, has_dna = self.subs, self.sub_norms, self.dna, self.has_dna
+        if rows is not None:
+            subs, sub_norms, fest_dna, has_dna = subs[rows], sub_norms[rows], fest_dna[rows], has_dna[rows]
+        n = subs.shape[0]
+        user_subs = user_data.get('subgenres') or {}
+        user_dna = user_data.get('sonic_dna') or {}
+
+        # 1. Subgenre cosine similarity. Genres the catalog never uses still count toward the user's magnitude.
+        s_score = np.zeros(n)
+        user_norm = math.sqrt(sum(v ** 2 for v in user_subs.values())) if user_subs else 0.0
+        if user_norm > 0 and subs.shape[1]:
+            u_vec = np.zeros(subs.shape[1])
+            for slug, weight in user_subs.items():
+                col = self.genre_index.get(slug)
+                if col is not None:
+                    u_vec[col] = weight
+            dots = subs @ u_vec
+            valid = sub_norms > 0
+            s_score[valid] = dots[valid] / (user_norm * sub_norms[valid])
+
+        # 2. Vibe fit: exponential decay of the Euclidean DNA distance
+        if user_dna:
+            u_dna = np.array([float(user_dna.get(cat, 0)) for cat in CATEGORIES])
+            dist = np.sqrt(((fest_dna - u_dna) ** 2).sum(axis=1))
+            dist = np.where(has_dna, dist, MISSING_DNA_DISTANCE)
+        else:
+            dist = np.full(n, MISSING_DNA_DISTANCE)
+        a_score = np.exp(-0.15 * dist)
+
+        hybrid = (0.7 * s_score + 0.3 * a_score) * 100
+        # Python's round() so values match the scalar engine exactly
+        return np.array([round(float(h), 2) for h in hybrid])
+
+    def _user_vectors(self, user_artists_map):
+        n_artists = len(self.artist_names)
+        indicator = np.zeros(n_artists)
+        log_weights = np.zeros(n_artists)
+        for name, count in user_artists_map.items():
+            col = self.artist_index.get(name)
+            if col is not None:
+                indicator[col] = 1.0
+                log_weights[col] = math.log(count + 1, 1.75)
+        return indicator, log_weights
+
+    def score(self, user_artists_map, user_data, k=None, rows=None, after=None, fields=None):
+        """
+        Scores one user against all festivals, or only the candidate `rows` (see candidates()).
+        `user_artists_map` is {lowercased name: play count}.
+        Returns the top `k` (all if None) match dicts, best first.
+        `after` is a (total_match, festival id) keyset cursor: only matches ranked below
+        that festival are returned. `fields` limits each dict to those MATCH_FIELDS; the
+        lineup lists are only built when asked for.
+        """
+        if rows is None:
+            rows = np.arange(len(self.festivals))
+        if not len(rows):
+            return []
+
+        indicator, log_weights = self._user_vectors(user_artists_map)
+
+        lineups = self.lineups if len(rows) == len(self.festivals) else self.lineups[rows]
+        overlap = lineups @ indicator
+        artist_score_sum = lineups @ log_weights
+        sat_mult = np.where(overlap <= 2, 1.0, np.where(overlap <= 9, 1.5, 2.0))
+        base_artist_score = artist_score_sum * sat_mult
+
+        synergy = self.synergy_scores(user_data, None if len(rows) == len(self.festivals) else rows)
+        total = base_artist_score * (synergy / 100)
+
+        if after is None:
+            order = self._top_k(total, k)
+        else:
+            after_total, after_id = after
+            after_row = self.id_index.get(str(after_id), -1)
+            remaining = np.flatnonzero((total < after_total) | ((total == after_total) & (rows > after_row)))
+            order = remaining[self._top_k(total[remaining], k)]
+
+        fields = MATCH_FIELDS if fields is None else tuple(fields)
+        return [
+            self._build_match(rows[i], total[i], base_artist_score[i], synergy[i], int(overlap[i]), user_artists_map, indicator, fields)
+            for i in order
+        ]
+
+    @staticmethod
+    def _top_k(total, k):
+        # Stable descending order so ties keep catalog order, like list.sort(reverse=True)
+        if k is None or k >= len(total):
+            return np.argsort(-total, kind='stable')
+        if k <= 0:
+            return np.array([], dtype=np.int64)
+        candidates = np.argpartition(-total, k - 1)[:k]
+        # Any festival tied with the k-th score is a candidate too, so ties still resolve by catalog order
+        threshold = total[candidates].min()
+        candidates = np.flatnonzero(total >= threshold)
+        return candidates[np.argsort(-total[candidates], kind='stable')][:k]
+
+    def _split_lineup(self, i, user_artists_map, indicator):
+        cols = self.lineups.indices[self.lineups.indptr[i]:self.lineups.indptr[i + 1]]
+        in_library = indicator[cols] > 0
+        names = self.artist_names
+        shared = [names[c] for c in cols[in_library].tolist()]
+        others = sorted(names[c] for c in cols[~in_library].tolist())
+        shared.sort(key=lambda name: (-user_artists_map.get(name, 0), name))
+        return [name.title() for name in shared], [name.title() for name in others]
+
+    def lineup(self, festival_id, user_artists_map=None):
+        """
+        One festival's lineup split into the user's artists (most played first) and the
+        rest (alphabetical), as in a match dict. None if the festival isn't in the catalog.
+        """
+        i = self.id_index.get(str(festival_id))
+        if i is None:
+            return None
+        user_artists_map = user_artists_map or {}
+        indicator, _ = self._user_vectors(user_artists_map)
+        shared, others = self._split_lineup(i, user_artists_map, indicator)
+        return {
+            'id': self.festivals[i].get('id'),
+            'festival': self.festivals[i].get('name', 'Unknown Festival'),
+            'matched_count': len(shared),
+            'total_artists': int(self.lineup_sizes[i]),
+            'shared_artists': shared,
+            'other_artists': others,
+        }
+
+    def _build_match(self, i, total_match, artist_score, synergy, matched, user_artists_map, indicator, fields=MATCH_FIELDS):
+        fest = self.festivals[i]
+        shared = others = None
+        if any(f in fields for f in LINEUP_FIELDS):
+            shared, others = self._split_lineup(i, user_artists_map, indicator)
+        total_artists = int(self.lineup_sizes[i])
+
+        match = {
+            'id': fest.get('id'),
+            'festival': fest.get('name', 'Unknown Festival'),
+            'total_match': float(total_match),
+            'artist_score': float(artist_score),
+            'artist_perc': (matched / total_artists) * 100,
+            'synergy_match': float(synergy),
+            'matched_count': matched,
+            'total_artists': total_artists,
+            'shared_artists': shared,
+            'other_artists': others,
+            'lat': fest.get('lat'),
+            'lng': fest.get('lng'),
+            'location': fest.get('location'),
+            'start_date': fest.get('start_date'),
+            'size': fest.get('size'),
+            'type': fest.get('type'),
+            'fest_subgenres': fest.get('subgenres'),
+            'tba': fest.get('tba'),
+            'end_date': fest.get('end_date'),
+            'state': fest.get('state'),
+            'country': fest.get('country')
+        }
+        if fields is MATCH_FIELDS:
+            return match
+        return {f: match[f] for f in fields}
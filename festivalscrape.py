@@ -1,13 +1,17 @@
 import os
-import time
-import requests
 import re
-from datetime import datetime
+import json
+import hashlib
+import argparse
+import requests
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import Client
+from db_client import get_client, is_missing_column_error
 
 from artists_categorize import bulk_categorize_artists, sync_artists_to_supabase, ArtistCleaner
 from classifier import VibeClassifier
+from artist_store import ArtistDNAStore
 
 load_dotenv()
 
@@ -18,7 +22,7 @@ if not url or not key:
     print("Error: Supabase URL or Key is missing from .env")
     exit(1)
 
-supabase: Client = create_client(url, key)
+supabase: Client = get_client()
 EDMTRAIN_API_KEY = os.environ.get("EDMTRAIN_API_KEY")
 
 def fetch_edmtrain_festivals():
@@ -41,7 +45,314 @@ def fetch_edmtrain_festivals():
         print(f"⚠️ Request failed: {e}")
         return []
 
-def aggregate_edmtrain_festivals():
+RECONCILE_SLUG_BATCH = 500
+RECONCILE_EVENT_BATCH = 100
+RECONCILE_PAGE_SIZE = 1000
+RECONCILE_INSERT_BATCH = 1000
+
+def fetch_artist_ids_by_slug(slugs):
+    """Resolves artist slugs to ids in large in_() batches. Returns (slug -> id, failed slugs)."""
+    slug_to_id = {}
+    failed = set()
+    unique_slugs = list(dict.fromkeys(slugs))
+    for i in range(0, len(unique_slugs), RECONCILE_SLUG_BATCH):
+        batch_slugs = unique_slugs[i:i+RECONCILE_SLUG_BATCH]
+        try:
+            res = supabase.table("artists").select("id, name_slug").in_("name_slug", batch_slugs).execute()
+            for row in res.data or []:
+                slug_to_id[row['name_slug']] = row['id']
+        except Exception as e:
+            failed.update(batch_slugs)
+            print(f"❌ Error fetching bulk artist UUIDs: {e}")
+    return slug_to_id, failed
+
+def fetch_event_artists(festival_ids):
+    """Current (event_id, artist_id) pairs for the given festivals, paged past the PostgREST row cap."""
+    pairs = set()
+    festival_ids = list(festival_ids)
+    for i in range(0, len(festival_ids), RECONCILE_EVENT_BATCH):
+        batch_ids = festival_ids[i:i+RECONCILE_EVENT_BATCH]
+        offset = 0
+        while True:
+            res = (supabase.table("event_artists").select("event_id, artist_id")
+                   .in_("event_id", batch_ids).order("event_id").order("artist_id")
+                   .range(offset, offset + RECONCILE_PAGE_SIZE - 1).execute())
+            rows = res.data or []
+            pairs.update((row['event_id'], row['artist_id']) for row in rows)
+            if len(rows) < RECONCILE_PAGE_SIZE:
+                break
+            offset += RECONCILE_PAGE_SIZE
+    return pairs
+
+def reconcile_event_artists(lineup_slugs):
+    """
+    Makes event_artists match the lineups seen in this run, for all festivals at once:
+    one bulk id lookup, one paged read of the current rows, then batched inserts and
+    per-festival deletes for artists who dropped off a lineup. Festivals whose artist
+    ids couldn't all be resolved only get inserts, never deletes.
+    """
+    if not lineup_slugs:
+        return
+
+    print(f"\n🔗 Reconciling event_artists for {len(lineup_slugs)} festivals...")
+    all_slugs = [slug for slugs in lineup_slugs.values() for slug in slugs]
+    slug_to_id, failed_slugs = fetch_artist_ids_by_slug(all_slugs)
+
+    desired = set()
+    incomplete = set()
+    for festival_id, slugs in lineup_slugs.items():
+        for slug in slugs:
+            artist_id = slug_to_id.get(slug)
+            if artist_id:
+                desired.add((festival_id, artist_id))
+            elif slug in failed_slugs:
+                incomplete.add(festival_id)
+
+    try:
+        current = fetch_event_artists(lineup_slugs.keys())
+    except Exception as e:
+        print(f"❌ Database error reading event_artists: {e}")
+        return
+
+    to_insert = sorted(desired - current, key=str)
+    to_delete = {}
+    for festival_id, artist_id in current - desired:
+        if festival_id not in incomplete:
+            to_delete.setdefault(festival_id, []).append(artist_id)
+
+    inserted = 0
+    for i in range(0, len(to_insert), RECONCILE_INSERT_BATCH):
+        batch = [{"event_id": fid, "artist_id": aid} for fid, aid in to_insert[i:i+RECONCILE_INSERT_BATCH]]
+        try:
+            supabase.table("event_artists").insert(batch).execute()
+            inserted += len(batch)
+        except Exception as e:
+            print(f"❌ Database error inserting event_artists: {e}")
+
+    deleted = 0
+    for festival_id, artist_ids in to_delete.items():
+        for i in range(0, len(artist_ids), RECONCILE_SLUG_BATCH):
+            batch_ids = artist_ids[i:i+RECONCILE_SLUG_BATCH]
+            try:
+                supabase.table("event_artists").delete().eq("event_id", festival_id).in_("artist_id", batch_ids).execute()
+                deleted += len(batch_ids)
+            except Exception as e:
+                print(f"❌ Database error pruning event_artists for festival {festival_id}: {e}")
+
+    print(f"   ↳ ✅ event_artists: {inserted} added, {deleted} removed, {len(desired & current)} unchanged.")
+
+FESTIVAL_WRITE_BATCH = 200
+
+def prepare_festival(festival_name, fest_data, cleaned=None):
+    """
+    Cleans one grouped festival's lineup and builds its festivals row payload.
+    `cleaned` is a precomputed ArtistCleaner.clean_lineup result for the lineup.
+    """
+    venue = fest_data['venue']
+    location_str = venue.get('location')
+    if not location_str:
+        parts = [venue.get('city'), venue.get('state'), venue.get('country')]
+        location_str = ", ".join([p for p in parts if p])
+        
+    # Analyze lineup & compute explicit TBA requirements
+    cleaned_lineup, name_triggered_tba = cleaned or ArtistCleaner.clean_lineup(fest_data['artistList'])
+    
+    start_date_obj = datetime.strptime(fest_data['start_date'], "%Y-%m-%d").date()
+    end_date_obj = datetime.strptime(fest_data['end_date'], "%Y-%m-%d").date()
+    days_length = (end_date_obj - start_date_obj).days + 1
+    artist_count = len(cleaned_lineup)
+    
+    is_tba = name_triggered_tba
+    if days_length == 1 and artist_count < 8:
+        is_tba = True
+    elif days_length == 2 and artist_count < 20:
+        is_tba = True
+    elif days_length >= 3 and artist_count < 33:
+        is_tba = True
+        
+    fest_payload = {
+        "name": festival_name,
+        "start_date": fest_data['start_date'],
+        "end_date": fest_data['end_date'],
+        "lat": venue.get('latitude'),
+        "lng": venue.get('longitude'),
+        "location": location_str,
+        "state": venue.get('state'),
+        "city": venue.get('city'),
+        "country": venue.get('country'),
+        # "tba": is_tba # <--- Add 'tba' as boolean column to festivals table!
+    }
+    return {'payload': fest_payload, 'lineup': cleaned_lineup, 'is_tba': is_tba}
+
+def artist_slug(name):
+    return name.lower().replace(" ", "-")
+
+def event_fingerprint(fest):
+    """Hash of what EDMTrain told us about a festival: name, date range, venue and sorted cleaned lineup."""
+    payload = fest['payload']
+    content = {
+        "name": payload['name'],
+        "start_date": payload['start_date'],
+        "end_date": payload['end_date'],
+        "venue": [payload.get(k) for k in ("lat", "lng", "location", "city", "state", "country")],
+        "lineup": sorted(fest['lineup']),
+    }
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def fetch_artist_states(slugs):
+    """slug -> short state string of the stored artist (content hash + DNA), for change detection."""
+    states = {}
+    unique_slugs = list(dict.fromkeys(slugs))
+    columns = "name_slug, content_hash, sonic_dna"
+    for i in range(0, len(unique_slugs), RECONCILE_SLUG_BATCH):
+        batch_slugs = unique_slugs[i:i+RECONCILE_SLUG_BATCH]
+        try:
+            res = supabase.table("artists").select(columns).in_("name_slug", batch_slugs).execute()
+        except Exception as e:
+            if not is_missing_column_error(e):
+                raise
+            # No content_hash column yet; DNA alone still catches recomputes
+            columns = "name_slug, sonic_dna"
+            res = supabase.table("artists").select(columns).in_("name_slug", batch_slugs).execute()
+        for row in res.data or []:
+            states[row['name_slug']] = f"{row.get('content_hash')}|{json.dumps(row.get('sonic_dna'), sort_keys=True)}"
+    return states
+
+def lineup_fingerprint(lineup, artist_states):
+    """Hash over the stored state of every artist in a lineup; changes when any member's DNA does."""
+    parts = sorted(f"{slug}={artist_states.get(slug, '?')}" for slug in (artist_slug(name) for name in lineup))
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+def plan_refresh(prepared, existing, artist_states, force=False):
+    """
+    Splits festivals into (changed, unchanged) by comparing stored fingerprints
+    ("<event hash>:<lineup artists hash>") with this run's. Each changed festival
+    gets a 'reason'.
+    """
+    changed, unchanged = [], []
+    for fest in prepared:
+        fest['event_fp'] = event_fingerprint(fest)
+        row = existing.get(fest['payload']['name'])
+        stored = (row or {}).get('fingerprint') or ""
+        stored_event, _, stored_lineup = stored.partition(":")
+
+        if force:
+            fest['reason'] = "forced"
+        elif not row:
+            fest['reason'] = "new festival"
+        elif stored_event != fest['event_fp']:
+            fest['reason'] = "event or lineup changed"
+        elif stored_lineup != lineup_fingerprint(fest['lineup'], artist_states):
+            fest['reason'] = "artist DNA changed"
+        else:
+            unchanged.append(fest)
+            continue
+        changed.append(fest)
+    return changed, unchanged
+
+def compute_festival_vibes(lineups):
+    """
+    Festival sonic DNA and top 25 subgenres for many lineups (lists of artist names) at
+    once: one weighted gather-and-sum over the columnar artist store.
+    """
+    store = ArtistDNAStore.get_instance(supabase)
+    slug_to_id = store.refresh_slugs(artist_slug(name) for lineup in lineups for name in lineup)
+    groups = []
+    for lineup in lineups:
+        slugs = (artist_slug(name) for name in lineup)
+        groups.append(([slug_to_id[slug] for slug in slugs if slug in slug_to_id], None))
+
+    vibes = []
+    for result in store.aggregate_many(groups, require_positive=True):
+        festival_subgenres = VibeClassifier.normalize_subgenres(result['subgenre_weights'])
+        if festival_subgenres and len(festival_subgenres) > 25:
+            festival_subgenres = dict(list(festival_subgenres.items())[:25])
+        vibes.append((result['sonic_dna'], festival_subgenres))
+    return vibes
+
+def fetch_existing_festivals(names):
+    """
+    Existing festival rows by name, with their stored fingerprint. Returns
+    (rows by name, fingerprints_supported); the flag is False when the festivals
+    table has no fingerprint column yet. Read errors propagate: a festival missing
+    here would be inserted again as a duplicate.
+    """
+    existing = {}
+    fingerprints_supported = True
+    for i in range(0, len(names), RECONCILE_SLUG_BATCH):
+        batch_names = names[i:i+RECONCILE_SLUG_BATCH]
+        res = None
+        if fingerprints_supported:
+            try:
+                res = supabase.table("festivals").select("id, name, start_date, end_date, fingerprint").in_("name", batch_names).execute()
+            except Exception as e:
+                if not is_missing_column_error(e):
+                    raise
+                fingerprints_supported = False
+        if res is None:
+            res = supabase.table("festivals").select("id, name, start_date, end_date").in_("name", batch_names).execute()
+        for row in res.data or []:
+            existing.setdefault(row['name'], row)
+    return existing, fingerprints_supported
+
+def write_festivals(payloads, existing):
+    """
+    Writes festival rows in bulk: existing festivals (matched by name) keep their id and
+    widen their date range, new ones are inserted. Returns {festival name: id}.
+    """
+    festival_ids = {}
+    groups = {}
+    for payload in payloads:
+        row = existing.get(payload['name'])
+        if row:
+            payload['id'] = row['id']
+            festival_ids[payload['name']] = row['id']
+            if row.get('start_date'): payload['start_date'] = min(row['start_date'], payload['start_date'])
+            if row.get('end_date'): payload['end_date'] = max(row['end_date'], payload['end_date'])
+        # Bulk writes need identical keys per request, so group by column set
+        groups.setdefault(tuple(sorted(payload.keys())), []).append(payload)
+
+    for columns, group in groups.items():
+        for i in range(0, len(group), FESTIVAL_WRITE_BATCH):
+            batch = group[i:i+FESTIVAL_WRITE_BATCH]
+            try:
+                if "id" in columns:
+                    supabase.table("festivals").upsert(batch).execute()
+                else:
+                    res = supabase.table("festivals").insert(batch).execute()
+                    for row in res.data or []:
+                        festival_ids[row['name']] = row['id']
+            except Exception as e:
+                print(f"❌ Database error writing {len(batch)} festivals: {e}")
+
+    updated = sum(1 for p in payloads if 'id' in p)
+    print(f"🎪 Wrote {len(payloads)} festivals ({updated} updated, {len(payloads) - updated} new).")
+    return festival_ids
+
+def stamp_festivals(festival_ids):
+    """
+    Sets updated_at on the given festivals, which moves the catalog watermark the API's
+    festival cache watches. Runs last, once rows and event_artists are both final, so a
+    cache rebuilt off the new watermark never sees half-written lineups.
+    """
+    festival_ids = list(festival_ids)
+    now = datetime.now(timezone.utc).isoformat()
+    for i in range(0, len(festival_ids), RECONCILE_SLUG_BATCH):
+        batch_ids = festival_ids[i:i+RECONCILE_SLUG_BATCH]
+        try:
+            supabase.table("festivals").update({"updated_at": now}).in_("id", batch_ids).execute()
+        except Exception as e:
+            if is_missing_column_error(e):
+                # No updated_at column yet: the cache runs on its TTL instead
+                return
+            print(f"❌ Database error stamping {len(batch_ids)} festivals: {e}")
+
+def aggregate_edmtrain_festivals(dry_run=False, force=False):
+    """
+    Refreshes festivals from EDMTrain. Only festivals whose fingerprint changed (or whose
+    artists' DNA changed) are reprocessed; `force` reprocesses everything. With `dry_run`
+    nothing is written and the planned changes are only reported.
+    """
     events = fetch_edmtrain_festivals()
     if not events:
         return
@@ -87,136 +398,76 @@ def aggregate_edmtrain_festivals():
                 
     print(f"🔄 Grouped into {len(festivals_grouped)} distinct upcoming events.")
     
-    processed_count = 0
-    for festival_name, fest_data in festivals_grouped.items():
-        processed_count += 1
-        print(f"\n[{processed_count}/{len(festivals_grouped)}] 🎪 Processing '{festival_name}'...")
-        
-        venue = fest_data['venue']
-        location_str = venue.get('location')
-        if not location_str:
-            parts = [venue.get('city'), venue.get('state'), venue.get('country')]
-            location_str = ", ".join([p for p in parts if p])
-            
-        # Analyze lineup & compute explicit TBA requirements
-        cleaned_lineup, name_triggered_tba = ArtistCleaner.clean_lineup(fest_data['artistList'])
-        
-        start_date_obj = datetime.strptime(fest_data['start_date'], "%Y-%m-%d").date()
-        end_date_obj = datetime.strptime(fest_data['end_date'], "%Y-%m-%d").date()
-        days_length = (end_date_obj - start_date_obj).days + 1
-        artist_count = len(cleaned_lineup)
-        
-        is_tba = name_triggered_tba
-        if days_length == 1 and artist_count < 8:
-            is_tba = True
-        elif days_length == 2 and artist_count < 20:
-            is_tba = True
-        elif days_length >= 3 and artist_count < 33:
-            is_tba = True
-            
-        fest_payload = {
-            "name": festival_name,
-            "start_date": fest_data['start_date'],
-            "end_date": fest_data['end_date'],
-            "lat": venue.get('latitude'),
-            "lng": venue.get('longitude'),
-            "location": location_str,
-            "state": venue.get('state'),
-            "city": venue.get('city'),
-            "country": venue.get('country')
-            # "tba": is_tba # <--- Add 'tba' as boolean column to festivals table!
-        }
-        
-        festival_id = None
-        try:
-            res = supabase.table("festivals").select("id, start_date, end_date").eq("name", festival_name).execute()
-            if res.data:
-                festival_id = res.data[0]['id']
-                existing_start = res.data[0].get('start_date')
-                existing_end = res.data[0].get('end_date')
-                if existing_start: fest_payload['start_date'] = min(existing_start, fest_payload['start_date'])
-                if existing_end: fest_payload['end_date'] = max(existing_end, fest_payload['end_date'])
-                supabase.table("festivals").update(fest_payload).eq("id", festival_id).execute()
-            else:
-                insert_res = supabase.table("festivals").insert(fest_payload).execute()
-                if insert_res.data:
-                    festival_id = insert_res.data[0]['id']
-        except Exception as e:
-            print(f"❌ Database error linking festival '{festival_name}': {e}")
-            continue
-            
+    # 2. Build festival payloads (pure, no I/O)
+    cleaned = ArtistCleaner.clean_lineups(data['artistList'] for data in festivals_grouped.values())
+    prepared = [prepare_festival(name, data, lineup) for (name, data), lineup in zip(festivals_grouped.items(), cleaned)]
+
+    # 3. Fingerprint diff: skip festivals EDMTrain and our artist data say are unchanged
+    existing, fingerprints_supported = fetch_existing_festivals([fest['payload']['name'] for fest in prepared])
+    all_slugs = [artist_slug(name) for fest in prepared for name in fest['lineup']]
+    artist_states = fetch_artist_states(all_slugs) if fingerprints_supported else {}
+    prepared, unchanged = plan_refresh(prepared, existing, artist_states, force=force or not fingerprints_supported)
+    print(f"🧾 {len(prepared)} festivals to refresh, {len(unchanged)} unchanged.")
+
+    if dry_run:
+        for fest in prepared:
+            print(f"   ↳ would refresh '{fest['payload']['name']}' ({fest['reason']}, {len(fest['lineup'])} artists)")
+        print("🔎 Dry run: nothing written.")
+        return {"changed": [fest['payload']['name'] for fest in prepared], "unchanged": len(unchanged)}
+
+    # 4. Categorize the union of the changed lineups once, then sync those artists once
+    unique_names = list(dict.fromkeys(name for fest in prepared for name in fest['lineup']))
+    print(f"🎧 {len(unique_names)} unique artists across {len(prepared)} festivals.")
+    categorized = {}
+    if unique_names:
+        categorized = bulk_categorize_artists([(name, [], False) for name in unique_names], supabase)
+        if categorized:
+            # We explicitly keep EVERY artist returned by categorization, even if they have NO genres.
+            # This honors existing database mappings (e.g. "Chez" having a DB row but maybe no genres yet).
+            sync_artists_to_supabase(categorized, supabase, user_id=None)
+
+    # 5. Festival DNA + subgenres for every changed festival in one pass over the artist store
+    lineup_festivals = []
+    for fest in prepared:
+        fest['artists'] = {name: categorized[name] for name in fest['lineup'] if name in categorized}
+        if fest['artists']:
+            lineup_festivals.append(fest)
+        else:
+            print(f"   ↳ '{fest['payload']['name']}': No lineup announced yet.")
+
+    vibes = compute_festival_vibes([list(fest['artists'].keys()) for fest in lineup_festivals])
+    for fest, (festival_dna, festival_subgenres) in zip(lineup_festivals, vibes):
+        fest['payload'].update({
+            "lineup": list(fest['artists'].keys()),
+            "sonic_dna": festival_dna,
+            "subgenres": festival_subgenres,
+        })
+    print(f"🧬 Generated Vibe Vectors for {len(lineup_festivals)} festivals.")
+
+    # Fingerprints describe the post-sync artist state, so the next run compares like with like
+    if fingerprints_supported:
+        synced_states = fetch_artist_states(artist_slug(name) for fest in prepared for name in fest['lineup'])
+        for fest in prepared:
+            fest['payload']['fingerprint'] = f"{fest['event_fp']}:{lineup_fingerprint(fest['lineup'], synced_states)}"
+
+    # 6. Bulk festival writes, then event_artists for every festival at once
+    festival_ids = write_festivals([fest['payload'] for fest in prepared], existing)
+    lineup_slugs = {}  # festival_id -> artist slugs in its current lineup
+    for fest in lineup_festivals:
+        festival_id = festival_ids.get(fest['payload']['name'])
         if not festival_id:
-            print(f"⚠️ Could not retrieve or create UUID for {festival_name}. Skipping line-up...")
-            continue
-            
-        if not cleaned_lineup:
-            print(f"   ↳ No lineup announced yet.")
-            continue
-            
-        print(f"   ↳ Found {artist_count} unique artists in lineup. (TBA Status: {is_tba})")
-        time.sleep(1)
-        
-        requests_list = [(name, [], False) for name in cleaned_lineup]
-        festival_artists_dict = bulk_categorize_artists(requests_list, supabase, max_workers=5)
-        
-        if not festival_artists_dict:
+            print(f"⚠️ Could not retrieve or create UUID for {fest['payload']['name']}. Skipping line-up...")
             continue
-            
-        # We explicitly keep EVERY artist returned by categorization, even if they have NO genres. 
-        # This honors existing database mappings (e.g. "Chez" having a DB row but maybe no genres yet).
-        filtered_artists = festival_artists_dict
-                
-        sync_artists_to_supabase(filtered_artists, supabase, user_id=None)
-        
-        slugs = [item['name'].lower().replace(" ", "-") for item in filtered_artists.values()]
-        artist_ids = []
-        batch_size = 100
-        
-        for i in range(0, len(slugs), batch_size):
-            batch_slugs = slugs[i:i+batch_size]
-            try:
-                res = supabase.table("artists").select("id").in_("name_slug", batch_slugs).execute()
-                if res.data:
-                    artist_ids.extend([row['id'] for row in res.data])
-            except Exception as e:
-                print(f"❌ Error fetching bulk artist UUIDs: {e}")
-                
-        if artist_ids:
-            try:
-                res = supabase.table("event_artists").select("artist_id").eq("event_id", festival_id).execute()
-                existing_ev = {row['artist_id'] for row in res.data} if res.data else set()
-                inserts = [{"event_id": festival_id, "artist_id": aid} for aid in artist_ids if aid not in existing_ev]
-                if inserts:
-                    for i in range(0, len(inserts), batch_size):
-                        supabase.table("event_artists").insert(inserts[i:i+batch_size]).execute()
-            except Exception as e:
-                print(f"❌ Database error updating event_artists for {festival_name}: {e}")
-                
-        artist_dna_list = []
-        artist_info_list = []
-        for name, data in filtered_artists.items():
-            dna = data.get('sonic_dna')
-            if dna and any(val > 0 for val in dna.values()):
-                artist_dna_list.append({'dna': dna, 'count': 1})
-            artist_info_list.append({'name': name, 'genres_votes': data.get('genre_votes', {}), 'count': 1})
-            
-        festival_dna = VibeClassifier.calculate_dna(artist_dna_list)
-        festival_subgenres = VibeClassifier.extract_top_subgenres(artist_info_list)
-        
-        if festival_subgenres and len(festival_subgenres) > 25:
-            festival_subgenres = dict(list(festival_subgenres.items())[:25])
-            
-        try:
-            update_payload = {
-                "lineup": list(filtered_artists.keys()), 
-                "sonic_dna": festival_dna,
-                "subgenres": festival_subgenres
-            }
-            supabase.table("festivals").update(update_payload).eq("id", festival_id).execute()
-            print(f"   ↳ ✅ Successfully generated and synced Vibe Vector.")
-        except Exception as e:
-            print(f"   ↳ ❌ Failed to upload DNA for {festival_name}: {e}")
+        lineup_slugs[festival_id] = [artist_slug(item['name']) for item in fest['artists'].values()]
+
+    reconcile_event_artists(lineup_slugs)
+    stamp_festivals(festival_ids.values())
+    return {"changed": [fest['payload']['name'] for fest in prepared], "unchanged": len(unchanged)}
 
 if __name__ == "__main__":
-    aggregate_edmtrain_festivals()
+    parser = argparse.ArgumentParser(description="Refresh upcoming festivals from EDMTrain.")
+    parser.add_argument("--dry-run", action="store_true", help="Report which festivals would be refreshed without writing anything.")
+    parser.add_argument("--force", action="store_true", help="Reprocess every festival, ignoring stored fingerprints.")
+    args = parser.parse_args()
+    aggregate_edmtrain_festivals(dry_run=args.dry_run, force=args.force)
     print("\n🎉 Monthly Festival Aggregation Complete!")
\ No newline at end of file
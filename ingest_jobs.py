@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+from artists_categorize import bulk_categorize_artists, sync_artists_to_supabase
+
+load_dotenv()
+
+DEFAULT_JOBS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "ingest_jobs.sqlite")
+CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", 250))
+# Running jobs touch heartbeat_at this often; a job whose heartbeat is older than
+# STALE_JOB_SECONDS belonged to a worker that died (crash, --reload) and is requeued
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("INGEST_HEARTBEAT_SECONDS", 10))
+STALE_JOB_SECONDS = float(os.environ.get("INGEST_STALE_JOB_SECONDS", 60))
+
+
+class IngestJobQueue:
+    """
+    Local SQLite-backed job queue for playlist ingests.
+    submit() stores the payload and returns a job id immediately; a small pool
+    of worker threads claims queued jobs, categorizes and syncs the artists in
+    chunks, and records per-phase progress that the API can poll.
+    """
+
+    def __init__(self, supabase_client, path=None, num_workers=None, chunk_size=CHUNK_SIZE):
+        self.supabase = supabase_client
+        self.path = path or os.environ.get("INGEST_JOBS_PATH") or DEFAULT_JOBS_PATH
+        self.num_workers = int(num_workers if num_workers is not None else os.environ.get("INGEST_WORKERS", 2))
+        self.chunk_size = chunk_size
+        self.poll_interval = 1.0
+
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn().execute("""
+            CREATE TABLE IF NOT EXISTS ingest_jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                progress TEXT NOT NULL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                heartbeat_at REAL
+            )
+        """)
+        # Queues created before heartbeats existed
+        columns = [row[1] for row in self._conn().execute("PRAGMA table_info(ingest_jobs)")]
+        if "heartbeat_at" not in columns:
+            self._conn().execute("ALTER TABLE ingest_jobs ADD COLUMN heartbeat_at REAL")
+        self._conn().execute("CREATE INDEX IF NOT EXISTS ingest_jobs_status ON ingest_jobs (status, created_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, user_id, artists, filter_electronic=False):
+        """
+        Queues an ingest. `artists` is a list of {"name", "fallback_genres", "count"} dicts.
+        Returns the new job id.
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        progress = {
+            "total": len(artists),
+            "looked_up": 0,
+            "fetched": 0,
+            "written": 0,
+            "dna_recomputed": False,
+            "chunks_done": 0,
+            "chunks_total": (len(artists) + self.chunk_size - 1) // self.chunk_size
+        }
+        payload = {"artists": artists, "filter_electronic": filter_electronic}
+        self._conn().execute(
+            "INSERT INTO ingest_jobs (id, user_id, status, payload, progress, error, created_at, updated_at) "
+            "VALUES (?, ?, 'queued', ?, ?, NULL, ?, ?)",
+            (job_id, user_id, json.dumps(payload), json.dumps(progress), now, now)
+        )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT id, user_id, status, progress, error, created_at, updated_at FROM ingest_jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            "job_id": row[0],
+            "user_id": row[1],
+            "status": row[2],
+            "progress": json.loads(row[3]),
+            "error": row[4],
+            "created_at": row[5],
+            "updated_at": row[6]
+        }
+
+    def _requeue_stale(self):
+        """Puts 'running' jobs whose worker stopped heartbeating back in the queue."""
+        cur = self._conn().execute(
+            "UPDATE ingest_jobs SET status = 'queued' WHERE status = 'running' AND COALESCE(heartbeat_at, updated_at) < ?",
+            (time.time() - STALE_JOB_SECONDS,)
+        )
+        if cur.rowcount:
+            print(f"♻️ Requeued {cur.rowcount} orphaned ingest job(s).")
+
+    def _claim(self):
+        """
+        Atomically moves the oldest queued job to 'running'. Safe across worker threads and
+        processes. Jobs of a user who already has one running wait, so one user's ingests
+        never fold into their DNA aggregate concurrently.
+        """
+        self._requeue_stale()
+        now = time.time()
+        row = self._conn().execute(
+            """
+            UPDATE ingest_jobs SET status = 'running', updated_at = ?, heartbeat_at = ?
+            WHERE id = (
+                SELECT id FROM ingest_jobs AS queued
+                WHERE status = 'queued'
+                  AND NOT EXISTS (SELECT 1 FROM ingest_jobs AS running WHERE running.status = 'running' AND running.user_id = queued.user_id)
+                ORDER BY created_at LIMIT 1
+            )
+              AND status = 'queued'
+            RETURNING id, user_id, payload, progress
+            """,
+            (now, now)
+        ).fetchone()
+        return row
+
+    def _heartbeat(self, job_id, stop):
+        # Chunks can spend minutes on Last.fm between progress flushes
+        while not stop.wait(JOB_HEARTBEAT_SECONDS):
+            self._conn().execute("UPDATE ingest_jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    def _save_progress(self, job_id, progress, status=None, error=None):
+        now = time.time()
+        if status:
+            self._conn().execute(
+                "UPDATE ingest_jobs SET progress = ?, status = ?, error = ?, updated_at = ?, heartbeat_at = ? WHERE id = ?",
+                (json.dumps(progress), status, error, now, now, job_id)
+            )
+        else:
+            self._conn().execute(
+                "UPDATE ingest_jobs SET progress = ?, updated_at = ?, heartbeat_at = ? WHERE id = ?",
+                (json.dumps(progress), now, now, job_id)
+            )
+
+    def _run_job(self, job_id, user_id, payload, progress):
+        artists = payload["artists"]
+        filter_electronic = payload.get("filter_electronic", False)
+        lock = threading.Lock()
+        last_flush = [0.0]
+
+        def on_progress(phase, n):
+            with lock:
+                progress[phase] += n
+                # Per-artist callbacks would hammer SQLite; flush at most twice a second
+                if time.time() - last_flush[0] > 0.5:
+                    last_flush[0] = time.time()
+                    self._save_progress(job_id, progress)
+
+        # A requeued job picks up after the last chunk it finished. Lookup counters go back to
+        # what was recorded with that chunk, since the interrupted one is redone from scratch.
+        resume_from = progress.get("chunks_done", 0) * self.chunk_size
+        checkpoint = progress.get("checkpoint") or {}
+        progress["looked_up"] = checkpoint.get("looked_up", 0)
+        progress["fetched"] = checkpoint.get("fetched", 0)
+        print(f"📥 Job {job_id}: ingesting {len(artists)} artists for user {user_id}...")
+        for i in range(resume_from, len(artists), self.chunk_size):
+            chunk = artists[i:i+self.chunk_size]
+            artist_tuples = [(a["name"], a.get("fallback_genres", []), filter_electronic) for a in chunk]
+            bulk_results = bulk_categorize_artists(artist_tuples, self.supabase, progress=on_progress)
+
+            final_artists = {}
+            for a in chunk:
+                if a["name"] in bulk_results:
+                    categorized = bulk_results[a["name"]]
+                    categorized["count"] = a.get("count", 1)
+                    final_artists[a["name"]] = categorized
+
+            # Each chunk folds only its own play-count changes into the user's DNA aggregate
+            sync_artists_to_supabase(final_artists, self.supabase, user_id=user_id)
+            with lock:
+                progress["written"] += len(final_artists)
+                progress["chunks_done"] += 1
+                progress["checkpoint"] = {"looked_up": progress["looked_up"], "fetched": progress["fetched"]}
+                self._save_progress(job_id, progress)
+
+        progress["dna_recomputed"] = True
+        self._save_progress(job_id, progress, status="done")
+        print(f"✅ Job {job_id} finished.")
+
+    def _worker(self):
+        while not self._stop.is_set():
+            row = self._claim()
+            if not row:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, user_id, payload, progress = row
+            progress = json.loads(progress)
+            stop_heartbeat = threading.Event()
+            heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, stop_heartbeat), daemon=True)
+            heartbeat.start()
+            try:
+                self._run_job(job_id, user_id, json.loads(payload), progress)
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                self._save_progress(job_id, progress, status="failed", error=str(e))
+            finally:
+                stop_heartbeat.set()
+
+    def start(self):
+        # Orphans are also requeued on every claim; this just reports them right away
+        self._requeue_stale()
+        for _ in range(self.num_workers):
+            t = threading.Thread(target=self._worker, daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f"👷 Started {self.num_workers} ingest workers.")
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        for t in self._threads:
+            t.join(timeout=5)
@@ -0,0 +1,469 @@
+import re
+import json
+import sqlite3
+import threading
+from collections import Counter
+
+# child table -> {parent table: foreign key column on the child}
+# Mirrors the Supabase foreign keys that the app's embedded selects rely on.
+DEFAULT_FOREIGN_KEYS = {
+    "artist_genres": {"artists": "artist_id", "genres": "genre_id"},
+    "event_artists": {"festivals": "event_id", "artists": "artist_id"},
+    "user_lib": {"artists": "artist_id", "users": "user_id"},
+}
+
+# SQLite's default host parameter limit is generous, but chunk IN lists anyway
+IN_CHUNK_SIZE = 900
+
+
+class LocalAPIError(Exception):
+    pass
+
+
+class LocalResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _parse_select(columns):
+    """
+    Parses a PostgREST select string into a list of column names and
+    (table, sub_select) tuples, e.g. "count, artists(name, genres(slug))".
+    """
+    items = []
+    depth = 0
+    token = ""
+    for ch in columns + ",":
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            token = token.strip()
+            if token:
+                match = re.match(r"^([\w\-]+)\((.*)\)$", token, re.S)
+                if match:
+                    items.append((match.group(1), _parse_select(match.group(2))))
+                else:
+                    items.append(token)
+            token = ""
+        else:
+            token += ch
+    return items
+
+
+class LocalQuery:
+    """Subset of the supabase-py query builder, evaluated against the SQLite store."""
+
+    def __init__(self, client, table_name):
+        self.client = client
+        self.table_name = table_name
+        self.op = "select"
+        self.columns = "*"
+        self.filters = []
+        self.payload = None
+        self.on_conflict = None
+        self.order_by = []
+        self.row_limit = None
+        self.row_offset = 0
+        self.want_count = False
+
+    # --- Builders ---
+    def select(self, columns="*", count=None):
+        self.op = "select"
+        self.columns = columns
+        self.want_count = count is not None
+        return self
+
+    def insert(self, payload):
+        self.op = "insert"
+        self.payload = payload if isinstance(payload, list) else [payload]
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self.op = "upsert"
+        self.payload = payload if isinstance(payload, list) else [payload]
+        self.on_conflict = on_conflict
+        return self
+
+    def update(self, payload):
+        self.op = "update"
+        self.payload = payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def _filter(self, column, sql_op, value):
+        self.filters.append((column, sql_op, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "=", value)
+
+    def neq(self, column, value):
+        return self._filter(column, "!=", value)
+
+    def gt(self, column, value):
+        return self._filter(column, ">", value)
+
+    def gte(self, column, value):
+        return self._filter(column, ">=", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "<", value)
+
+    def lte(self, column, value):
+        return self._filter(column, "<=", value)
+
+    def is_(self, column, value):
+        # PostgREST "is" filter; only null checks are needed here
+        return self._filter(column, "=", None if value in (None, "null") else value)
+
+    def in_(self, column, values):
+        return self._filter(column, "IN", list(values))
+
+    def order(self, column, desc=False):
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def range(self, start, end):
+        self.row_offset = start
+        self.row_limit = end - start + 1
+        return self
+
+    def execute(self):
+        return self.client._execute(self)
+
+
+class LocalSupabaseClient:
+    """
+    SQLite-backed stand-in for the Supabase client, for offline benchmarks and load
+    tests. Implements the query-builder subset the app uses (select with embedded
+    joins, eq/neq/gt/gte/lt/lte/is_/in_, order, limit/range, insert, upsert(on_conflict),
+    update, delete). Tables and columns are created on first write; dict/list values
+    are stored as JSON. Every execute() counts as one round trip, and rows sent and
+    received are tallied in `stats`.
+    """
+
+    def __init__(self, path=":memory:", tables=None, foreign_keys=None):
+        self.path = path
+        self.foreign_keys = {child: dict(parents) for child, parents in DEFAULT_FOREIGN_KEYS.items()}
+        for child, parents in (foreign_keys or {}).items():
+            self.foreign_keys.setdefault(child, {}).update(parents)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS _columns (tbl TEXT, col TEXT, kind TEXT, PRIMARY KEY (tbl, col))")
+        self._columns = {}
+        self._indexed = set()
+        for row in self._conn.execute("SELECT tbl, col, kind FROM _columns"):
+            self._columns.setdefault(row["tbl"], {})[row["col"]] = row["kind"]
+
+        self.reset_stats()
+        for table_name, rows in (tables or {}).items():
+            with self._lock:
+                self._insert_rows(table_name, rows)
+
+    def table(self, table_name):
+        return LocalQuery(self, table_name)
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"round_trips": 0, "rows_sent": 0, "rows_received": 0}
+            self.calls = Counter()
+
+    # --- Schema ---
+    @staticmethod
+    def _quote(name):
+        return '"' + name.replace('"', '""') + '"'
+
+    @staticmethod
+    def _kind_of(value):
+        if isinstance(value, bool):
+            return "bool"
+        if isinstance(value, (dict, list)):
+            return "json"
+        return "scalar"
+
+    def _ensure_table(self, table_name):
+        if table_name in self._columns:
+            return
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self._quote(table_name)} (_rowid INTEGER PRIMARY KEY AUTOINCREMENT, id)")
+        self._columns[table_name] = {"id": "scalar"}
+        self._conn.execute("INSERT OR IGNORE INTO _columns VALUES (?, 'id', 'scalar')", (table_name,))
+
+    def _ensure_column(self, table_name, column, value=None):
+        self._ensure_table(table_name)
+        cols = self._columns[table_name]
+        if column not in cols:
+            kind = self._kind_of(value) if value is not None else None
+            self._conn.execute(f"ALTER TABLE {self._quote(table_name)} ADD COLUMN {self._quote(column)}")
+            cols[column] = kind
+            self._conn.execute("INSERT INTO _columns VALUES (?, ?, ?)", (table_name, column, kind))
+        elif cols[column] is None and value is not None:
+            cols[column] = self._kind_of(value)
+            self._conn.execute("UPDATE _columns SET kind = ? WHERE tbl = ? AND col = ?", (cols[column], table_name, column))
+
+    def _ensure_index(self, table_name, column):
+        # Columns get an index the first time they're filtered on, like the FK/unique indexes in Postgres
+        self._ensure_column(table_name, column)
+        if (table_name, column) not in self._indexed:
+            index_name = self._quote(f"idx_{table_name}_{column}")
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {self._quote(table_name)} ({self._quote(column)})")
+            self._indexed.add((table_name, column))
+
+    def _encode(self, table_name, column, value):
+        if value is None:
+            return None
+        if self._columns[table_name].get(column) == "json" or isinstance(value, (dict, list)):
+            return json.dumps(value)
+        if isinstance(value, bool):
+            return int(value)
+        return value
+
+    def _decode_row(self, table_name, row):
+        cols = self._columns.get(table_name, {})
+        out = {}
+        for column in row.keys():
+            if column == "_rowid":
+                continue
+            value = row[column]
+            kind = cols.get(column)
+            if value is not None and kind == "json":
+                value = json.loads(value)
+            elif value is not None and kind == "bool":
+                value = bool(value)
+            out[column] = value
+        return out
+
+    # --- SQL helpers ---
+    def _where(self, table_name, filters):
+        clauses, params = [], []
+        for column, sql_op, value in filters:
+            self._ensure_index(table_name, column)
+            quoted = self._quote(column)
+            if sql_op == "IN":
+                if not value:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{quoted} IN ({', '.join('?' * len(value))})")
+                params.extend(self._encode(table_name, column, v) for v in value)
+            elif sql_op == "=" and value is None:
+                clauses.append(f"{quoted} IS NULL")
+            else:
+                clauses.append(f"{quoted} {sql_op} ?")
+                params.append(self._encode(table_name, column, value))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _fetch_in(self, table_name, column, values):
+        """Rows of `table_name` whose `column` is in `values`, chunked under the parameter limit."""
+        values = [v for v in dict.fromkeys(values) if v is not None]
+        if not values or table_name not in self._columns:
+            return []
+        self._ensure_index(table_name, column)
+        rows = []
+        for i in range(0, len(values), IN_CHUNK_SIZE):
+            chunk = values[i:i + IN_CHUNK_SIZE]
+            sql = f"SELECT * FROM {self._quote(table_name)} WHERE {self._quote(column)} IN ({', '.join('?' * len(chunk))}) ORDER BY _rowid"
+            rows.extend(self._decode_row(table_name, r) for r in self._conn.execute(sql, chunk))
+        # Embedded rows travel in the same response, so they count as received
+        self.stats["rows_received"] += len(rows)
+        return rows
+
+    def _insert_rows(self, table_name, rows):
+        self._ensure_table(table_name)
+        inserted = []
+        for payload in rows:
+            for column, value in payload.items():
+                self._ensure_column(table_name, column, value)
+            columns = list(payload.keys())
+            if columns:
+                sql = f"INSERT INTO {self._quote(table_name)} ({', '.join(self._quote(c) for c in columns)}) VALUES ({', '.join('?' * len(columns))})"
+                cur = self._conn.execute(sql, [self._encode(table_name, c, payload[c]) for c in columns])
+            else:
+                cur = self._conn.execute(f"INSERT INTO {self._quote(table_name)} DEFAULT VALUES")
+            rowid = cur.lastrowid
+            if payload.get("id") is None:
+                self._conn.execute(f"UPDATE {self._quote(table_name)} SET id = _rowid WHERE _rowid = ?", (rowid,))
+            inserted.append(rowid)
+        return self._rows_by_rowid(table_name, inserted)
+
+    def _rows_by_rowid(self, table_name, rowids):
+        by_rowid = {}
+        for i in range(0, len(rowids), IN_CHUNK_SIZE):
+            chunk = rowids[i:i + IN_CHUNK_SIZE]
+            sql = f"SELECT * FROM {self._quote(table_name)} WHERE _rowid IN ({', '.join('?' * len(chunk))})"
+            for r in self._conn.execute(sql, chunk):
+                by_rowid[r["_rowid"]] = self._decode_row(table_name, r)
+        return [by_rowid[r] for r in rowids if r in by_rowid]
+
+    # --- Embedding ---
+    def _embed(self, table_name, rows, select_items):
+        """Projects `rows` to `select_items`, resolving embedded tables through the foreign key map."""
+        columns = [c for c in select_items if isinstance(c, str)]
+        embeds = [e for e in select_items if isinstance(e, tuple)]
+
+        resolved = {}
+        for embed_table, sub_items in embeds:
+            many_to_one = self.foreign_keys.get(table_name, {}).get(embed_table)
+            one_to_many = self.foreign_keys.get(embed_table, {}).get(table_name)
+            if many_to_one:
+                targets = self._fetch_in(embed_table, "id", [r.get(many_to_one) for r in rows])
+                targets = self._embed(embed_table, targets, sub_items)
+                by_id = {t["__key"]: t["__row"] for t in targets}
+                resolved[embed_table] = [by_id.get(r.get(many_to_one)) for r in rows]
+            elif one_to_many:
+                children = self._fetch_in(embed_table, one_to_many, [r.get("id") for r in rows])
+                children = self._embed(embed_table, children, sub_items)
+                grouped = {}
+                for child in children:
+                    grouped.setdefault(child["__fk"][one_to_many], []).append(child["__row"])
+                resolved[embed_table] = [grouped.get(r.get("id"), []) for r in rows]
+            else:
+                raise LocalAPIError(f"Could not find a relationship between '{table_name}' and '{embed_table}'")
+
+        out = []
+        for i, row in enumerate(rows):
+            if "*" in columns:
+                projected = dict(row)
+            else:
+                projected = {}
+            for column in columns:
+                if column != "*":
+                    projected[column] = row.get(column)
+            for embed_table, _ in embeds:
+                projected[embed_table] = resolved[embed_table][i]
+            out.append({"__key": row.get("id"), "__fk": row, "__row": projected})
+        return out
+
+    # --- Execution ---
+    def _execute(self, query):
+        table_name = query.table_name
+        with self._lock:
+            self.stats["round_trips"] += 1
+            self.calls[f"{table_name}.{query.op}"] += 1
+            self._ensure_table(table_name)
+
+            if query.op == "select":
+                data, count = self._select(query)
+                return LocalResponse(data, count)
+
+            self.stats["rows_sent"] += len(query.payload) if isinstance(query.payload, list) else 1
+            self._conn.execute("BEGIN")
+            try:
+                if query.op == "insert":
+                    data = self._insert_rows(table_name, query.payload)
+                elif query.op == "upsert":
+                    data = self._upsert(query)
+                elif query.op == "update":
+                    data = self._update(query)
+                elif query.op == "delete":
+                    data = self._delete(query)
+                else:
+                    raise LocalAPIError(f"Unsupported operation {query.op}")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.stats["rows_received"] += len(data)
+            return LocalResponse(data)
+
+    def _select(self, query):
+        table_name = query.table_name
+        where, params = self._where(table_name, query.filters)
+        count = None
+        if query.want_count:
+            count = self._conn.execute(f"SELECT COUNT(*) FROM {self._quote(table_name)}{where}", params).fetchone()[0]
+
+        sql = f"SELECT * FROM {self._quote(table_name)}{where}"
+        if query.order_by:
+            parts = []
+            for column, desc in query.order_by:
+                self._ensure_column(table_name, column)
+                # PostgREST puts NULLs last on ascending, first on descending
+                parts.append(f"{self._quote(column)} IS NULL {'DESC' if not desc else 'ASC'}, {self._quote(column)} {'DESC' if desc else 'ASC'}")
+            sql += " ORDER BY " + ", ".join(parts) + ", _rowid"
+        else:
+            sql += " ORDER BY _rowid"
+        if query.row_limit is not None or query.row_offset:
+            sql += " LIMIT ? OFFSET ?"
+            params = params + [query.row_limit if query.row_limit is not None else -1, query.row_offset]
+
+        rows = [self._decode_row(table_name, r) for r in self._conn.execute(sql, params)]
+        self.stats["rows_received"] += len(rows)
+        data = [e["__row"] for e in self._embed(table_name, rows, _parse_select(query.columns))]
+        return data, count
+
+    def _upsert(self, query):
+        table_name = query.table_name
+        keys = [k.strip() for k in (query.on_conflict or "id").split(",")]
+        for key in keys:
+            self._ensure_index(table_name, key)
+        out = []
+        for payload in query.payload:
+            existing = None
+            if all(payload.get(k) is not None for k in keys):
+                where, params = self._where(table_name, [(k, "=", payload[k]) for k in keys])
+                existing = self._conn.execute(f"SELECT _rowid FROM {self._quote(table_name)}{where}", params).fetchone()
+            if existing is None:
+                out.extend(self._insert_rows(table_name, [payload]))
+                continue
+            for column, value in payload.items():
+                self._ensure_column(table_name, column, value)
+            columns = list(payload.keys())
+            assignments = ", ".join(f"{self._quote(c)} = ?" for c in columns)
+            self._conn.execute(
+                f"UPDATE {self._quote(table_name)} SET {assignments} WHERE _rowid = ?",
+                [self._encode(table_name, c, payload[c]) for c in columns] + [existing["_rowid"]]
+            )
+            out.extend(self._rows_by_rowid(table_name, [existing["_rowid"]]))
+        return out
+
+    def _update(self, query):
+        table_name = query.table_name
+        for column, value in query.payload.items():
+            self._ensure_column(table_name, column, value)
+        where, params = self._where(table_name, query.filters)
+        rowids = [r["_rowid"] for r in self._conn.execute(f"SELECT _rowid FROM {self._quote(table_name)}{where}", params)]
+        if rowids:
+            columns = list(query.payload.keys())
+            assignments = ", ".join(f"{self._quote(c)} = ?" for c in columns)
+            values = [self._encode(table_name, c, query.payload[c]) for c in columns]
+            for i in range(0, len(rowids), IN_CHUNK_SIZE):
+                chunk = rowids[i:i + IN_CHUNK_SIZE]
+                self._conn.execute(
+                    f"UPDATE {self._quote(table_name)} SET {assignments} WHERE _rowid IN ({', '.join('?' * len(chunk))})",
+                    values + chunk
+                )
+        return self._rows_by_rowid(table_name, rowids)
+
+    def _delete(self, query):
+        table_name = query.table_name
+        where, params = self._where(table_name, query.filters)
+        rowids = [r["_rowid"] for r in self._conn.execute(f"SELECT _rowid FROM {self._quote(table_name)}{where}", params)]
+        deleted = self._rows_by_rowid(table_name, rowids)
+        for i in range(0, len(rowids), IN_CHUNK_SIZE):
+            chunk = rowids[i:i + IN_CHUNK_SIZE]
+            self._conn.execute(f"DELETE FROM {self._quote(table_name)} WHERE _rowid IN ({', '.join('?' * len(chunk))})", chunk)
+        return deleted
+
+
+_shared_clients = {}
+_shared_lock = threading.Lock()
+
+def get_local_client(path=":memory:"):
+    """One LocalSupabaseClient per path, so every module in the process sees the same data."""
+    with _shared_lock:
+        if path not in _shared_clients:
+            _shared_clients[path] = LocalSupabaseClient(path)
+        return _shared_clients[path]
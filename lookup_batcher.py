@@ -0,0 +1,152 @@
+import os
+import time
+import asyncio
+import inspect
+import weakref
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARTIST_LOOKUP_SELECT = "*, artist_genres(vote_count, genres(slug))"
+
+LOOKUP_BATCH_SIZE = int(os.environ.get("ARTIST_LOOKUP_BATCH_SIZE", 200))
+LOOKUP_WINDOW_MS = float(os.environ.get("ARTIST_LOOKUP_WINDOW_MS", 20))
+LOOKUP_MAX_INFLIGHT = int(os.environ.get("ARTIST_LOOKUP_MAX_INFLIGHT", 4))
+
+
+class ArtistLookupBatcher:
+    """
+    Coalesces per-artist `artists` lookups into micro-batches. Callers submit a
+    name_slug and get a Future; a flusher thread gathers pending slugs and sends
+    one in_("name_slug", ...) query once `batch_size` slugs are waiting or the
+    oldest has waited `window_ms`. Duplicate slugs in the same window share one
+    lookup. Futures resolve to the raw row (with the artist_genres join) or None.
+
+    The client is only weakly referenced: once it is garbage-collected (or close() is
+    called) the flusher thread exits and the executor shuts down.
+    """
+
+    def __init__(self, supabase_client, batch_size=None, window_ms=None, max_inflight=None):
+        self._client = weakref.ref(supabase_client)
+        self.batch_size = batch_size or LOOKUP_BATCH_SIZE
+        self.window = (window_ms if window_ms is not None else LOOKUP_WINDOW_MS) / 1000.0
+        self.executor = ThreadPoolExecutor(max_workers=max_inflight or LOOKUP_MAX_INFLIGHT, thread_name_prefix="artist-lookup")
+
+        self.pending = {}  # slug -> [futures]
+        self.first_pending_at = None
+        self.stats = {"lookups": 0, "coalesced": 0, "batches": 0, "errors": 0}
+        self.closed = False
+
+        self._cond = threading.Condition()
+        self._flusher = threading.Thread(target=self._flush_loop, name="artist-lookup-flusher", daemon=True)
+        self._flusher.start()
+
+    def submit(self, name_slug):
+        future = Future()
+        with self._cond:
+            if self.closed:
+                raise RuntimeError("ArtistLookupBatcher is closed")
+            self.stats["lookups"] += 1
+            waiters = self.pending.get(name_slug)
+            if waiters is None:
+                self.pending[name_slug] = [future]
+            else:
+                waiters.append(future)
+                self.stats["coalesced"] += 1
+            if self.first_pending_at is None:
+                self.first_pending_at = time.monotonic()
+            self._cond.notify()
+        return future
+
+    def lookup(self, name_slug, timeout=None):
+        """Blocking single-artist lookup through the batcher."""
+        return self.submit(name_slug).result(timeout)
+
+    async def lookup_async(self, name_slug):
+        return await asyncio.wrap_future(self.submit(name_slug))
+
+    def close(self):
+        """Stops the flusher and executor. Lookups still waiting fail with RuntimeError."""
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            pending, self.pending = self.pending, {}
+            self._cond.notify_all()
+        for futures in pending.values():
+            for future in futures:
+                future.set_exception(RuntimeError("ArtistLookupBatcher is closed"))
+        self.executor.shutdown(wait=False)
+
+    def _take_batch(self):
+        slugs = list(self.pending.keys())[:self.batch_size]
+        batch = {slug: self.pending.pop(slug) for slug in slugs}
+        self.first_pending_at = time.monotonic() if self.pending else None
+        return batch
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self.pending and not self.closed:
+                    self._cond.wait()
+                if self.closed:
+                    return
+                # Hold the batch open until it's full or the window closes
+                while len(self.pending) < self.batch_size and not self.closed:
+                    remaining = self.first_pending_at + self.window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self.closed:
+                    return
+                batch = self._take_batch()
+                self.stats["batches"] += 1
+            self.executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        try:
+            supabase = self._client()
+            if supabase is None:
+                raise RuntimeError("Supabase client was garbage-collected")
+            query = supabase.table("artists").select(ARTIST_LOOKUP_SELECT).in_("name_slug", list(batch.keys()))
+            if inspect.iscoroutinefunction(query.execute):
+                res = asyncio.run(query.execute())
+            else:
+                res = query.execute()
+            rows = {row["name_slug"]: row for row in res.data or []}
+        except Exception as e:
+            with self._cond:
+                self.stats["errors"] += 1
+            for futures in batch.values():
+                for future in futures:
+                    future.set_exception(e)
+            return
+
+        for slug, futures in batch.items():
+            row = rows.get(slug)
+            for future in futures:
+                # Each caller gets its own copy, since hydration mutates the row
+                future.set_result(dict(row) if row else None)
+
+
+_batchers = weakref.WeakKeyDictionary()
+_batchers_lock = threading.Lock()
+
+def get_lookup_batcher(supabase_client):
+    """One batcher per client, shared by every caller in the process; it lives as long as the client."""
+    with _batchers_lock:
+        batcher = _batchers.get(supabase_client)
+        if batcher is None or batcher.closed:
+            batcher = ArtistLookupBatcher(supabase_client)
+            _batchers[supabase_client] = batcher
+            weakref.finalize(supabase_client, batcher.close)
+        return batcher
+
+def close_lookup_batcher(supabase_client):
+    """Shuts down the client's batcher, if it has one (e.g. when the client is closed)."""
+    with _batchers_lock:
+        batcher = _batchers.pop(supabase_client, None)
+    if batcher is not None:
+        batcher.close()
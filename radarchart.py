@@ -3,13 +3,11 @@ import pandas as pd
 from classifier import VibeClassifier
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import Client
+from db_client import get_client
 
 load_dotenv()
 
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_KEY")
-
 
 def radarchart(artist_data_list, user_id, scale=True, round_even=True):
     """
@@ -337,8 +335,8 @@ def starchart(artist_data_list, user_id, scale=True, round_even=True):
 
     fig.show()
 
-def fetch_user_dna(user_id):
-    supabase: Client = create_client(url, key)
+def fetch_user_dna(user_id, supabase_client=None):
+    supabase: Client = supabase_client or get_client()
     res = supabase.table("users").select("sonic_dna").eq("id", user_id).execute()
     if res.data and res.data[0].get('sonic_dna'):
         return res.data[0]['sonic_dna']
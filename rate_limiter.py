@@ -0,0 +1,168 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Last.fm error codes that mean "slow down" rather than "bad request"
+# 29: Rate limit exceeded, 16: Temporarily unavailable, 11: Service offline
+LASTFM_THROTTLE_CODES = {"29", "16", "11"}
+
+
+class RateLimiter:
+    """
+    Process-wide token bucket with AIMD concurrency control.
+    Every call grabs a concurrency slot and a token. Successes additively widen
+    the concurrency window and the refill rate; a throttle response halves both
+    and pauses the whole pool, so workers back off together instead of each
+    thread sleeping on its own schedule.
+    """
+
+    def __init__(self, rate, burst, max_concurrency, min_concurrency=1, min_rate=0.5,
+                 base_backoff=2.0, max_backoff=60.0):
+        self.max_rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_concurrency = int(max_concurrency)
+        self.min_concurrency = int(min_concurrency)
+        self.limit = float(max_concurrency)
+
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._backoff = base_backoff
+
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_refill = time.monotonic()
+        self._cond = threading.Condition()
+
+        self.stats = {"calls": 0, "throttled": 0, "waited": 0.0}
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self._last_refill = now
+
+    def acquire(self):
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self._cond.wait(self.paused_until - now)
+                    continue
+                if self.in_flight >= int(self.limit):
+                    self._cond.wait()
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    self.stats["calls"] += 1
+                    self.stats["waited"] += time.monotonic() - started
+                    return
+                self._cond.wait((1 - self.tokens) / self.rate)
+
+    async def acquire_async(self):
+        """Coroutine flavour of acquire(); sleeps on the event loop instead of blocking a thread."""
+        started = time.monotonic()
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                elif self.in_flight >= int(self.limit):
+                    delay = 0.05
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        self.stats["calls"] += 1
+                        self.stats["waited"] += time.monotonic() - started
+                        return
+                    delay = (1 - self.tokens) / self.rate
+            await asyncio.sleep(delay)
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        await self.acquire_async()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def on_success(self):
+        with self._cond:
+            # Additive increase: roughly +1 slot per window of successful calls
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / max(self.limit, 1.0))
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.02)
+            self._backoff = self.base_backoff
+            self._cond.notify_all()
+
+    def on_throttle(self):
+        """Multiplicative decrease plus a pool-wide pause. Returns the pause length in seconds."""
+        with self._cond:
+            now = time.monotonic()
+            self.stats["throttled"] += 1
+            # Requests already in flight will all bounce at once; only the first one shrinks the window
+            if now < self.paused_until:
+                return self.paused_until - now
+            self.limit = max(self.min_concurrency, self.limit / 2)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            pause = self._backoff
+            self._backoff = min(self.max_backoff, self._backoff * 2)
+            self.paused_until = now + pause
+            print(f"🐢 Last.fm throttled us. Pausing pool {pause:.1f}s (concurrency {int(self.limit)}, {self.rate:.1f} req/s).")
+            return pause
+
+
+_lastfm_limiter = None
+_lastfm_limiter_lock = threading.Lock()
+
+
+def get_lastfm_limiter():
+    """Shared limiter every Last.fm call in this process goes through."""
+    global _lastfm_limiter
+    with _lastfm_limiter_lock:
+        if _lastfm_limiter is None:
+            _lastfm_limiter = RateLimiter(
+                rate=float(os.environ.get("LASTFM_RATE_PER_SEC", 5)),
+                burst=float(os.environ.get("LASTFM_BURST", 10)),
+                max_concurrency=int(os.environ.get("LASTFM_MAX_CONCURRENCY", 16)),
+            )
+    return _lastfm_limiter
+
+
+def is_throttle_error(ws_error):
+    """True if a Last.fm error (pylast.WSError or LastFMError) is a rate-limit / temporary-unavailable response."""
+    code = getattr(ws_error, "code", None)
+    if code is None:
+        try:
+            code = ws_error.get_id()
+        except Exception:
+            code = None
+    if str(code) in LASTFM_THROTTLE_CODES:
+        return True
+    err_str = str(ws_error).lower()
+    return "rate limit" in err_str or "temporarily unavailable" in err_str
@@ -0,0 +1,20 @@
+-- Columns the sync, DNA and festival pipelines expect on top of the base schema.
+-- Run once in the Supabase SQL editor. Every statement is safe to re-run.
+-- Until a column exists the code that uses it falls back to the old behaviour
+-- (see README), so nothing breaks before this runs, but nothing speeds up either.
+
+-- Artist sync: skip rewriting artists whose content hasn't changed
+alter table artists add column if not exists content_hash text;
+
+-- Where an artist's DNA came from: 'lastfm', 'csv', or 'audio' (provisional, re-fetched from Last.fm)
+alter table artists add column if not exists dna_source text;
+create index if not exists artists_dna_source_idx on artists (dna_source) where dna_source = 'audio';
+
+-- Incremental user DNA: running totals, and a compare-and-set token rotated on every DNA write
+alter table users add column if not exists dna_aggregate jsonb;
+alter table users add column if not exists dna_version text;
+
+-- Festival refresh: skip unchanged festivals, and the watermark the API's festival cache watches
+alter table festivals add column if not exists fingerprint text;
+alter table festivals add column if not exists updated_at timestamptz not null default now();
+create index if not exists festivals_updated_at_idx on festivals (updated_at desc);
@@ -3,7 +3,7 @@ from dotenv import load_dotenv
 from supabase import create_client
 
 # Import the classifier to access the dictionary
-from classifier import VibeClassifier
+from classifier import VibeClassifier, GenreManager
 
 def main():
     load_dotenv()
@@ -44,5 +44,8 @@ def main():
 
     print(f"🎉 Successfully updated {success_count} genres with Sonic DNA data!")
 
+    # Rebuild the local genre snapshot so the next process sees the new DNA
+    GenreManager.refresh(supabase)
+
 if __name__ == "__main__":
     main()
@@ -2,6 +2,7 @@ import os
 import re
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from classifier import GenreManager
 
 def slugify(text):
     # Standard slugify: lowercase, replace spaces/special chars with hyphens
@@ -99,5 +100,8 @@ def seed_genres():
 
     print("Success: Genres seeded from RYMPULL.md.")
 
+    # Rebuild the local genre snapshot so the next process sees the new genres
+    GenreManager.refresh(supabase)
+
 if __name__ == "__main__":
     seed_genres()
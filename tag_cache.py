@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "lastfm_tags.sqlite")
+
+
+class TagCache:
+    """
+    Persistent Last.fm top-tag cache shared by every process on the box.
+    Backed by SQLite in WAL mode so the scraper, aggregator, CLI and API workers
+    can read and write concurrently. Positive hits and "not found" misses carry
+    their own TTLs, and the table is trimmed back to `max_entries` by last access.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, path=None, ttl_days=None, negative_ttl_days=None, max_entries=None):
+        self.path = path or os.environ.get("LASTFM_CACHE_PATH") or DEFAULT_CACHE_PATH
+        self.ttl = float(ttl_days if ttl_days is not None else os.environ.get("LASTFM_CACHE_TTL_DAYS", 30)) * 86400
+        self.negative_ttl = float(negative_ttl_days if negative_ttl_days is not None else os.environ.get("LASTFM_CACHE_NEGATIVE_TTL_DAYS", 3)) * 86400
+        self.max_entries = int(max_entries if max_entries is not None else os.environ.get("LASTFM_CACHE_MAX_ENTRIES", 50000))
+
+        # Trim roughly every N writes instead of on every set
+        self.evict_every = 200
+        self._writes = 0
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS tag_cache (
+                artist_name TEXT PRIMARY KEY,
+                tags TEXT NOT NULL,
+                found INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS tag_cache_last_access ON tag_cache (last_access)")
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads, so each worker gets its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, artist_name):
+        """Returns the cached tag list (possibly empty for a known miss), or None if absent/stale."""
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT tags, expires_at FROM tag_cache WHERE artist_name = ?", (artist_name,)
+            ).fetchone()
+            if not row:
+                return None
+            tags, expires_at = row
+            if expires_at < now:
+                return None
+            conn.execute("UPDATE tag_cache SET last_access = ? WHERE artist_name = ?", (now, artist_name))
+            return json.loads(tags)
+        except sqlite3.Error as e:
+            print(f"⚠️ Tag cache read failed for '{artist_name}': {e}")
+            return None
+
+    def set(self, artist_name, tags, found=True):
+        """Stores a Last.fm result. `found=False` records a negative ("not found") hit with the shorter TTL."""
+        now = time.time()
+        ttl = self.ttl if found else self.negative_ttl
+        try:
+            self._conn().execute(
+                """
+                INSERT INTO tag_cache (artist_name, tags, found, fetched_at, expires_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(artist_name) DO UPDATE SET
+                    tags = excluded.tags,
+                    found = excluded.found,
+                    fetched_at = excluded.fetched_at,
+                    expires_at = excluded.expires_at,
+                    last_access = excluded.last_access
+                """,
+                (artist_name, json.dumps(tags), 1 if found else 0, now, now + ttl, now)
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️ Tag cache write failed for '{artist_name}': {e}")
+            return
+
+        with self._write_lock:
+            self._writes += 1
+            should_evict = self._writes % self.evict_every == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Drops expired rows, then the least recently used rows above `max_entries`."""
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM tag_cache WHERE expires_at < ?", (now,))
+                (count,) = conn.execute("SELECT COUNT(*) FROM tag_cache").fetchone()
+                overflow = count - self.max_entries
+                if overflow > 0:
+                    conn.execute(
+                        "DELETE FROM tag_cache WHERE artist_name IN "
+                        "(SELECT artist_name FROM tag_cache ORDER BY last_access ASC LIMIT ?)",
+                        (overflow,)
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"⚠️ Tag cache eviction failed: {e}")
+
+    def stats(self):
+        now = time.time()
+        conn = self._conn()
+        total, fresh, negative = conn.execute(
+            "SELECT COUNT(*), SUM(expires_at >= ?), SUM(found = 0) FROM tag_cache", (now,)
+        ).fetchone()
+        return {"entries": total or 0, "fresh": fresh or 0, "negative": negative or 0}
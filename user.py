@@ -1,6 +1,7 @@
 import os
 import uuid
-from supabase import create_client, Client
+from supabase import Client
+from db_client import create_client
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -0,0 +1,157 @@
+import math
+import random
+import time
+from datetime import date, timedelta
+from festival_matrix import FestivalMatrix, CATEGORIES, haversine_km
+
+# Reference: the original per-festival loop from compare.run_matching_engine
+def cosine_similarity(vec1, vec2):
+    if not vec1 or not vec2: return 0.0
+    intersect = set(vec1.keys()) & set(vec2.keys())
+    if not intersect: return 0.0
+    dot_product = sum(vec1[k] * vec2[k] for k in intersect)
+    mag1 = math.sqrt(sum(v**2 for v in vec1.values()))
+    mag2 = math.sqrt(sum(v**2 for v in vec2.values()))
+    if mag1 == 0 or mag2 == 0: return 0.0
+    return dot_product / (mag1 * mag2)
+
+def calculate_hybrid_score(user_data, festival_data):
+    user_dna = user_data.get('sonic_dna', {})
+    fest_dna = festival_data.get('sonic_dna', {})
+    s_score = cosine_similarity(user_data.get('subgenres', {}), festival_data.get('subgenres', {}))
+    if user_dna and fest_dna:
+        dist = math.sqrt(sum((float(user_dna.get(c, 0)) - float(fest_dna.get(c, 0))) ** 2 for c in CATEGORIES))
+    else:
+        dist = 10.0
+    a_score = math.exp(-0.15 * dist)
+    return round(((0.7 * s_score) + (0.3 * a_score)) * 100, 2)
+
+def loop_engine(user_artists_map, user_data, festivals):
+    scores = []
+    for fest in festivals:
+        lineup_set = set(ea['artists']['name'].lower().strip() for ea in fest.get('event_artists', []) if ea.get('artists') and ea['artists'].get('name'))
+        if not lineup_set: continue
+        synergy = calculate_hybrid_score(user_data, fest)
+        overlap = set(user_artists_map.keys()) & lineup_set
+        artist_score_sum = sum(math.log(user_artists_map[a] + 1, 1.75) for a in overlap)
+        sat_mult = 1.0 if len(overlap) <= 2 else (1.5 if len(overlap) <= 9 else 2.0)
+        base = artist_score_sum * sat_mult
+        scores.append({
+            'festival': fest['name'],
+            'total_match': base * (synergy / 100),
+            'artist_score': base,
+            'synergy_match': synergy,
+            'matched_count': len(overlap),
+            'other_count': len(lineup_set - overlap),
+        })
+    scores.sort(key=lambda x: x['total_match'], reverse=True)
+    return scores
+
+def make_catalog(n_fests, n_artists, n_genres, seed=7):
+    rng = random.Random(seed)
+    artists = [f"artist {i}" for i in range(n_artists)]
+    genres = [f"genre-{i}" for i in range(n_genres)]
+    festivals = []
+    for f in range(n_fests):
+        lineup = rng.sample(artists, rng.randint(0, 120))
+        festivals.append({
+            'name': f"Fest {f}",
+            'event_artists': [{'artists': {'name': a.title()}} for a in lineup],
+            'sonic_dna': None if f % 17 == 0 else {c: round(rng.uniform(0, 10), 2) for c in CATEGORIES},
+            'subgenres': {g: round(rng.random(), 3) for g in rng.sample(genres, rng.randint(0, 25))},
+        })
+        if f % 11:
+            festivals[-1].update(lat=round(rng.uniform(-60, 70), 4), lng=round(rng.uniform(-180, 180), 4))
+        if f % 13:
+            start = date(2026, 1, 1) + timedelta(days=rng.randint(0, 364))
+            end = start + timedelta(days=rng.randint(0, 4)) if f % 3 else None
+            festivals[-1].update(start_date=start.isoformat(), end_date=end.isoformat() if end else None)
+        festivals[-1]['country'] = rng.choice(["US", "UK", "Germany", "Belgium", None])
+    user_map = {a: rng.randint(1, 40) for a in rng.sample(artists, 300)}
+    user_data = {
+        'sonic_dna': {c: round(rng.uniform(0, 10), 2) for c in CATEGORIES},
+        'subgenres': {g: round(rng.random(), 3) for g in rng.sample(genres + ["only-user-genre"], 30)},
+    }
+    return festivals, user_map, user_data
+
+def verify():
+    festivals, user_map, user_data = make_catalog(800, 5000, 200)
+
+    t0 = time.perf_counter()
+    expected = loop_engine(user_map, user_data, festivals)
+    t_loop = time.perf_counter() - t0
+
+    matrix = FestivalMatrix(festivals)
+    t0 = time.perf_counter()
+    actual = matrix.score(user_map, user_data)
+    t_vec = time.perf_counter() - t0
+
+    assert len(expected) == len(actual), f"{len(expected)} != {len(actual)}"
+    exp_by_name = {m['festival']: m for m in expected}
+    for m in actual:
+        e = exp_by_name[m['festival']]
+        assert math.isclose(m['total_match'], e['total_match'], rel_tol=1e-9, abs_tol=1e-9), m['festival']
+        assert math.isclose(m['artist_score'], e['artist_score'], rel_tol=1e-9, abs_tol=1e-9), m['festival']
+        assert m['synergy_match'] == e['synergy_match'], (m['festival'], m['synergy_match'], e['synergy_match'])
+        assert m['matched_count'] == e['matched_count']
+        assert len(m['other_artists']) == e['other_count']
+    assert [m['total_match'] for m in actual] == sorted((m['total_match'] for m in actual), reverse=True)
+
+    t0 = time.perf_counter()
+    top = matrix.score(user_map, user_data, k=10)
+    t_top = time.perf_counter() - t0
+    assert [m['festival'] for m in top] == [m['festival'] for m in actual[:10]]
+
+    verify_filters(matrix, festivals, user_map, user_data)
+
+    print(f"Loop engine:       {t_loop * 1000:.1f} ms")
+    print(f"Vectorized engine: {t_vec * 1000:.1f} ms (matrix build excluded)")
+    print(f"Vectorized top-10: {t_top * 1000:.1f} ms")
+    print("✅ Vectorized match engine matches the loop engine!")
+
+def brute_force_filter(festivals, date_from=None, date_to=None, lat=None, lng=None, radius_km=None, country=None):
+    keep = []
+    for fest in festivals:
+        if country and (fest.get('country') or "").lower() != country.lower():
+            continue
+        if radius_km is not None:
+            if fest.get('lat') is None or haversine_km(lat, lng, fest['lat'], fest['lng']) > radius_km:
+                continue
+        if date_from or date_to:
+            if not fest.get('start_date'):
+                continue
+            start = date.fromisoformat(fest['start_date'])
+            end = date.fromisoformat(fest['end_date']) if fest.get('end_date') else start
+            if (date_to and start > date_to) or (date_from and end < date_from):
+                continue
+        keep.append(fest)
+    return keep
+
+def verify_filters(matrix, festivals, user_map, user_data):
+    cases = [
+        dict(country="belgium"),
+        dict(date_from=date(2026, 6, 1), date_to=date(2026, 8, 31)),
+        dict(date_from=date(2026, 12, 1)),
+        dict(date_to=date(2026, 2, 1)),
+        dict(lat=51.5, lng=-0.1, radius_km=2500),
+        dict(lat=10.0, lng=179.5, radius_km=1500),   # across the antimeridian
+        dict(lat=65.0, lng=0.0, radius_km=4000),
+        dict(lat=40.0, lng=-100.0, radius_km=3000, country="US", date_from=date(2026, 3, 1), date_to=date(2026, 10, 1)),
+        dict(lat=0.0, lng=0.0, radius_km=1),
+    ]
+    for case in cases:
+        allowed = brute_force_filter(festivals, **case)
+        expected = loop_engine(user_map, user_data, allowed)
+        actual = matrix.score(user_map, user_data, rows=matrix.candidates(**case))
+        assert [m['festival'] for m in actual] == [m['festival'] for m in expected], case
+        top = matrix.score(user_map, user_data, k=5, rows=matrix.candidates(**case))
+        assert [m['festival'] for m in top] == [m['festival'] for m in expected[:5]], case
+
+    rows = matrix.candidates(lat=51.5, lng=-0.1, radius_km=2500)
+    t0 = time.perf_counter()
+    matrix.score(user_map, user_data, k=10, rows=rows)
+    t_filtered = time.perf_counter() - t0
+    print(f"Filtered top-10:   {t_filtered * 1000:.1f} ms ({len(rows)} of {len(matrix)} festivals scored)")
+
+if __name__ == "__main__":
+    verify()
@@ -1,13 +1,16 @@
 import os
 import sys
-from fastapi import FastAPI, HTTPException
+import base64
+import json
+import asyncio
+from datetime import date
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
 
-import os
-import sys
-
 # Get the absolute path to the DJWYA root directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
@@ -16,14 +19,30 @@ root_dir = os.path.dirname(parent_dir)
 # Add the root directory to sys.path
 sys.path.append(root_dir)
 
-from artists_categorize import bulk_categorize_artists, sync_artists_to_supabase
-from compare import run_matching_engine
-from supabase import create_client, Client
+from compare import run_matching_engine, get_festival_lineup
+from festival_matrix import MATCH_FIELDS
+from ingest_jobs import IngestJobQueue
+from classifier import GenreManager
+from supabase import Client
+from db_client import get_client, close_client
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI()
+# Responses smaller than this aren't worth compressing
+COMPRESS_MIN_BYTES = int(os.environ.get("API_COMPRESS_MIN_BYTES", 1000))
+
+# orjson when installed (match lists are large and mostly floats and strings), the stdlib encoder otherwise
+try:
+    import orjson
+
+    class OrjsonResponse(JSONResponse):
+        def render(self, content):
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    app = FastAPI(default_response_class=OrjsonResponse)
+except ImportError:
+    app = FastAPI()
 
 # Allow CORS so the Next.js app can talk to this API
 app.add_middleware(
@@ -34,9 +53,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
+# Brotli when brotli-asgi is installed (it still serves gzip to clients without br), plain gzip otherwise
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_BYTES, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+
+supabase: Client = get_client()
+
+# Ingests run on background worker threads; the request only enqueues
+job_queue = IngestJobQueue(supabase)
+
+@app.on_event("startup")
+def start_ingest_workers():
+    # Load the genre catalog (from its snapshot) before the first request, and keep it fresh
+    GenreManager.get_instance(supabase)
+    GenreManager.start_auto_refresh(supabase_client=supabase)
+    job_queue.start()
+
+@app.on_event("shutdown")
+def stop_ingest_workers():
+    GenreManager.stop_auto_refresh()
+    job_queue.stop()
+    close_client()
 
 class ArtistRequest(BaseModel):
     name: str
@@ -54,48 +94,103 @@ async def ingest_music_data(payload: IngestRequest):
         if not payload.artists:
             return {"status": "success", "message": "No artists provided."}
 
-        # Format for bulk_categorize_artists: (name, fallback_genres, filter_electronic)
-        artist_tuples = [
-            (artist.name, artist.fallback_genres, payload.filter_electronic)
+        artists = [
+            {"name": artist.name, "fallback_genres": artist.fallback_genres, "count": artist.count}
             for artist in payload.artists
         ]
 
-        print(f"📥 Received ingest request for user {payload.user_id} with {len(artist_tuples)} artists.")
-        print(f"🧵 Fetching genres and categorizing...")
-        
-        # 1. Process Artists
-        bulk_results = bulk_categorize_artists(artist_tuples, supabase)
-
-        # 2. Add counts back into the categorized data
-        final_artists = {}
-        for artist_req in payload.artists:
-            orig_name = artist_req.name
-            if orig_name in bulk_results:
-                categorized = bulk_results[orig_name]
-                categorized["count"] = artist_req.count
-                final_artists[orig_name] = categorized
-
-        print(f"✅ Categorized {len(final_artists)} electronic artists. Syncing to Supabase...")
+        print(f"📥 Received ingest request for user {payload.user_id} with {len(artists)} artists.")
+        job_id = await asyncio.to_thread(job_queue.submit, payload.user_id, artists, payload.filter_electronic)
 
-        # 3. Sync to Supabase
-        sync_artists_to_supabase(final_artists, supabase, user_id=payload.user_id)
-
-        return {"status": "success", "message": f"Successfully processed {len(final_artists)} artists.", "processed_count": len(final_artists)}
+        return {"status": "queued", "job_id": job_id, "message": f"Queued {len(artists)} artists for processing."}
 
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/ingest/{job_id}")
+async def get_ingest_job(job_id: str):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": "success", "data": job}
+
+def encode_cursor(match):
+    """Opaque keyset cursor pointing just past `match`."""
+    return base64.urlsafe_b64encode(json.dumps([match["total_match"], match["id"]]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        total_match, festival_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(total_match), festival_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields):
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in MATCH_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(requested))
+
 @app.get("/api/festivals")
-async def get_festivals(user_id: str):
+async def get_festivals(
+    user_id: str,
+    limit: Optional[int] = Query(None, ge=1, description="Page size; pass next_cursor back as cursor for the next page"),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated match fields to return, e.g. festival,total_match,lat,lng"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0),
+    country: Optional[str] = None,
+):
     try:
         if not user_id:
             raise HTTPException(status_code=400, detail="user_id is required")
-        
-        results = run_matching_engine(user_id)
+        if radius_km is not None and (lat is None or lng is None):
+            raise HTTPException(status_code=400, detail="radius_km requires lat and lng")
+        after = decode_cursor(cursor) if cursor else None
+        projection = parse_fields(fields)
+        # The cursor is built from the last match's score and id, even when they aren't returned
+        engine_fields = None if projection is None else list(dict.fromkeys(projection + ["total_match", "id"]))
+
+        # Matching engine is still blocking; keep it off the event loop.
+        # One extra match tells us whether there is a next page.
+        results = await asyncio.to_thread(
+            run_matching_engine, user_id, limit=limit + 1 if limit else None, date_from=date_from, date_to=date_to,
+            lat=lat, lng=lng, radius_km=radius_km, country=country, after=after, fields=engine_fields,
+        )
         # Results might be empty if user has no data, that's fine
-        return {"status": "success", "data": results or []}
+        results = results or []
+        next_cursor = None
+        if limit and len(results) > limit:
+            results = results[:limit]
+            next_cursor = encode_cursor(results[-1])
+        if projection is not None and len(engine_fields) > len(projection):
+            results = [{f: match[f] for f in projection} for match in results]
+        return {"status": "success", "data": results, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/festivals/{festival_id}/lineup")
+async def get_lineup(festival_id: str, user_id: Optional[str] = None):
+    """Full lineup for one festival, fetched when its card is opened rather than with every match."""
+    try:
+        lineup = await asyncio.to_thread(get_festival_lineup, festival_id, user_id)
+        if lineup is None:
+            raise HTTPException(status_code=404, detail="Festival not found")
+        return {"status": "success", "data": lineup}
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
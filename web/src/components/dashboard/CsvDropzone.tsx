@@ -87,6 +87,25 @@ export function CsvDropzone({ onUploadComplete }: CsvDropzoneProps) {
                         throw new Error(errData.detail || "Failed to process CSV");
                     }
 
+                    // Ingest runs as a background job; poll until it finishes
+                    const { job_id: jobId } = await response.json();
+                    while (jobId) {
+                        await new Promise(resolve => setTimeout(resolve, 2000));
+                        const jobRes = await fetch(`http://localhost:8000/api/ingest/${jobId}`);
+                        if (!jobRes.ok) throw new Error("Lost track of ingest job");
+                        const { data: job } = await jobRes.json();
+                        const p = job.progress;
+
+                        if (job.status === "failed") throw new Error(job.error || "Failed to process CSV");
+                        if (job.status === "done") break;
+
+                        if (p.written >= p.total) {
+                            setStatusText("Recomputing Sonic DNA...");
+                        } else {
+                            setStatusText(`Analyzing Sonic DNA... ${p.written}/${p.total} artists (${p.fetched} fetched from Last.fm)`);
+                        }
+                    }
+
                     setStatusText("Success!");
                     setTimeout(() => {
                         setIsUploading(false);